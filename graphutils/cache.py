@@ -0,0 +1,214 @@
+"""
+Local on-disk caches used to avoid repeated requests to external services.
+
+graphutils cache classes:
+ - SQLiteLRUCache
+ - EmbeddingCache
+ - LLMResponseCache
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteLRUCache:
+    """
+    Size-bounded key/value store backed by a SQLite file.
+
+    Keys are digests of the caller supplied key parts, values are stored as raw blobs. Every read
+    refreshes the last access time of the entry; once the store holds more than `max_entries`
+    entries, the least recently used ones are evicted down to `EVICTION_LOW_WATER` of the bound.
+    Writes only keep a running upper bound of the entry count, the table is counted when that bound
+    exceeds `max_entries`. Entries older than `ttl` seconds are treated as missing and removed on the
+    next eviction. Hits and misses are counted per instance.
+
+    Attributes:
+        path (str): Location of the SQLite file.
+        max_entries (int): Upper bound for the number of stored entries.
+        ttl (Optional[float]): Lifetime of an entry in seconds, None keeps entries until evicted.
+        hits (int): Number of keys served from the cache.
+        misses (int): Number of keys not found in the cache.
+    """
+
+    table = "cache"
+    EVICTION_LOW_WATER = 0.95  # fraction of `max_entries` kept by an eviction, so evictions are rare
+
+    def __init__(self, path, max_entries, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._count = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            f"(key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL, created REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._connection.execute(f"PRAGMA table_info({self.table})")}
+        if "created" not in columns:
+            # stores written before entries had a lifetime
+            self._connection.execute(f"ALTER TABLE {self.table} ADD COLUMN created REAL NOT NULL DEFAULT 0")
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)")
+
+    @property
+    def _connection(self):
+        # sqlite connections must not be shared between threads
+        if getattr(self._local, "connection", None) is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return self._local.connection
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        oldest = time.time() - self.ttl if self.ttl is not None else 0
+        try:
+            # stay well below the sqlite variable limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, value FROM {self.table} "
+                    f"WHERE key IN ({','.join('?' * len(chunk))}) AND created >= ?", [*chunk, oldest]
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Reading from cache {self.path} failed: {e}")
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        now = time.time()
+        try:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, last_used, created) VALUES (?, ?, ?, ?)",
+                [(key, value, now, now) for key, value in items.items()]
+            )
+            with self._lock:
+                if self._count is None:
+                    self._count = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+                else:
+                    # replaced keys are counted too, so this overestimates until the next eviction
+                    self._count += len(items)
+                evict = self._count > self.max_entries
+            if evict:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Writing to cache {self.path} failed: {e}")
+
+    def set(self, key: str, value: bytes):
+        self.set_many({key: value})
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(dict.fromkeys(keys))
+        try:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                self._connection.execute(f"DELETE FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))})",
+                                         chunk)
+        except sqlite3.Error as e:
+            logger.warning(f"Deleting from cache {self.path} failed: {e}")
+
+    def evict(self):
+        """Removes expired entries and the least recently used entries exceeding `max_entries`."""
+        if self.ttl is not None:
+            self._connection.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl,))
+        count = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            keep = int(self.max_entries * self.EVICTION_LOW_WATER)
+            self._connection.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)", (count - keep,)
+            )
+            count = keep
+        with self._lock:
+            self._count = count
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """
+    Content-addressed cache for embedding vectors.
+
+    Entries are keyed by the embedding model and the normalized input text, vectors are stored
+    as packed float32 arrays.
+    """
+
+    table = "embeddings"
+
+    @staticmethod
+    def _encode(vector: List[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(value: bytes) -> List[float]:
+        vector = array("f")
+        vector.frombytes(value)
+        return vector.tolist()
+
+    def get_vectors(self, texts: Iterable[str], model: str) -> Dict[str, List[float]]:
+        keys = {self.make_key(model, text): text for text in texts}
+        return {keys[key]: self._decode(value) for key, value in self.get_many(keys).items()}
+
+    def set_vectors(self, vectors: Dict[str, List[float]], model: str):
+        self.set_many({self.make_key(model, text): self._encode(vector) for text, vector in vectors.items()})
+
+
+class LLMResponseCache(SQLiteLRUCache):
+    """
+    Cache for LLM responses.
+
+    Entries are keyed by the model and the full rendered request, i.e. setup messages, few-shot examples,
+    output schema and prompt, values are the serialized responses. Hits and misses are additionally
+    counted per import stage.
+    """
+
+    table = "llm_responses"
+
+    def __init__(self, path, max_entries, ttl=None):
+        super().__init__(path, max_entries, ttl)
+        self.stages = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def get_response(self, stage: str, key: str) -> Optional[str]:
+        value = self.get(key)
+        with self._lock:
+            self.stages[stage]["hits" if value is not None else "misses"] += 1
+        return value.decode("utf-8") if value is not None else None
+
+    def set_response(self, key: str, response: str):
+        self.set(key, response.encode("utf-8"))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"total": super().stats(), **{stage: dict(counts) for stage, counts in self.stages.items()}}
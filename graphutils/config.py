@@ -3,6 +3,56 @@ EMBEDDING_DIMENSIONS = 1536
 EMBEDDING_MODEL = "text-embedding-ada-002"
 EMBEDDING_FETCHING_PROCESSES = 1 # concurrent requests for fetching embeddings
 EMBEDDING_DB_CHUNK_SIZE = 100 # chunk size for embeddings db ingress
+EMBEDDING_BATCH_SIZE = 2048 # max inputs per embedding request
+EMBEDDING_CACHE_MAX_ENTRIES = 500000 # vectors kept in the local embedding cache
+VECTOR_INDEX_IN_PROCESS = True # answer vector queries from in-process copies of the Neo4j indices
+VECTOR_INDEX_MAX_AGE = 3600 # seconds before an in-process vector index is reloaded from the db
+VECTOR_INDEX_RETRY_INTERVAL = 60 # seconds before a failed in-process vector index build is retried
+VECTOR_INDEX_CANDIDATES = 50 # nearest embeddings considered per vector query
+VECTOR_INDEX_LIMIT = 10 # result rows per vector query
+LEXICAL_MATCH_THRESHOLD = 0.85 # min trigram similarity for ontology matches that skip the vector search
+LEXICAL_INDEX_MAX_AGE = 3600 # seconds before an in-process lexical ontology index is reloaded from the db
+SUBSUMPTION_INDEX_MAX_AGE = 3600 # seconds before an in-process ontology hierarchy closure is reloaded from the db
+SUBSUMPTION_MISS_RELOAD_INTERVAL = 10 # min seconds between reloads of an ontology hierarchy closure triggered by unknown uids
+SUBSUMPTION_PERSIST_DESCENDANTS = False # also store the descendant uids of every ontology node in the graph
+ONTOLOGY_MAPPING_WORKERS = 8 # concurrent ontology lookups per import
+ONTOLOGY_MAPPING_CACHE_MAX_ENTRIES = 200000 # (label, name) -> ontology uid mappings kept across imports
+TABLE_CACHE_MAX_TABLES = 16 # parsed uploads kept in memory per worker
+TABLE_CACHE_MAX_FILES = 200 # uploads and their profiles kept on disk
+TABLE_DOWNLOAD_CHUNK_SIZE = 1 << 20 # bytes per chunk when streaming an upload from the fileserver
+INGESTION_BATCH_SIZE = 1000 # table rows written per parameterized UNWIND transaction
+PROFILE_CHUNK_ROWS = 10000 # rows read per chunk by the column profiler
+PROFILE_SAMPLES = 10 # leading non-empty cells kept per column
+PROFILE_DISTINCT_CAP = 10000 # distinct values counted exactly per column before switching to a sketch
+PROFILE_NUMERIC_RATIO = 0.9 # share of numeric cells for a column to be inferred as numeric
+IMPORTER_CACHE_LRU_SIZE = 5000 # header cache records kept in memory across imports
+IMPORTER_CACHE_LRU_MAX_AGE = 60 # seconds before a header cache record is read from the db again
+FULL_TABLE_CACHE_MAX_COLUMN_DIFF = 1 # differing columns up to which a validated full-table graph is reused
+LLM_CACHE_ENABLED = True # answer repeated LLM requests from the local response cache
+LLM_CACHE_MAX_ENTRIES = 50000 # LLM responses kept in the local response cache
+LLM_CACHE_TTL = 30 * 24 * 3600 # seconds before a cached LLM response expires
+RATE_LIMIT_REQUESTS_PER_MINUTE = 500 # initial request budget per model, adjusted from the response headers
+RATE_LIMIT_TOKENS_PER_MINUTE = 200000 # initial token budget per model, adjusted from the response headers
+RATE_LIMIT_MAX_CONCURRENCY = 16 # upper bound for in-flight OpenAI requests per model
+LLM_MAX_CONCURRENCY = 8 # concurrent LLM calls of the extraction chains per process
+LLM_CHAIN_TIMEOUT = 300 # seconds before an extraction chain is given up
+LLM_REQUEST_TIMEOUT = 120 # seconds before a single chat model request is aborted, bounds steps of timed out chains
+JOB_IO_WORKERS = 16 # concurrent IO-bound (LLM/HTTP) jobs per process
+JOB_CPU_WORKERS = 2 # concurrent CPU-bound (parsing/ingestion/matching) jobs per process
+JOB_MAX_RUNNING_PER_USER = 2 # running jobs per user across all workers, further jobs of the user wait
+JOB_POLL_INTERVAL = 2 # seconds between queue polls of an idle worker pool
+JOB_HEARTBEAT_INTERVAL = 10 # seconds between heartbeats of running jobs
+JOB_HEARTBEAT_TIMEOUT = 120 # seconds without heartbeat before a running job counts as orphaned
+JOB_MAX_ATTEMPTS = 2 # runs of a job before an orphaned job is failed instead of queued again
+JOB_QUEUE_START_ON_BOOT = True # start the workers when the server starts, not only on the first submit
+STAGE_CHECKPOINT_MAX_AGE = 7 * 24 * 3600 # seconds before the checkpoints of an unfinished import are dropped
+MATCHER_ENGINE = "decomposed" # "decomposed": per-relationship path queries joined in Python, "snapshot": path search on the in-memory process graph, "cypher": one statement
+MATCHER_WORKERS = 8 # concurrent queries of the decomposed workflow matcher
+MATCHER_MAX_PATH_LENGTH = 8 # max relationships along a path matching one workflow relationship
+MATCHER_PATH_LIMIT = 50000 # paths fetched per workflow relationship
+MATCHER_RESULT_LIMIT = 10000 # workflows returned by the decomposed matcher
+MATCHER_TEMPLATE_CACHE_SIZE = 256 # workflow query templates kept per process, keyed by workflow shape
+PROCESS_GRAPH_MAX_AGE = 900 # seconds before the in-memory process graph snapshot is reloaded from the db
 CHAT_GPT_MODEL = "o4-mini"
 
 
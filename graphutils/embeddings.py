@@ -1,21 +1,119 @@
 import logging
+import os
+import threading
+import time
+from collections import defaultdict
 from typing import List
 
+import numpy as np
+from neomodel import db
 from openai import OpenAI
 
 from tenacity import wait_random_exponential, retry, stop_after_attempt
 
-from graphutils.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+from graphutils.cache import EmbeddingCache
+from graphutils.ratelimit import get_http_client
+from graphutils.singleflight import SingleFlight
+from graphutils.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_MAX_ENTRIES, \
+    VECTOR_INDEX_IN_PROCESS, VECTOR_INDEX_MAX_AGE, VECTOR_INDEX_RETRY_INTERVAL, VECTOR_INDEX_CANDIDATES, VECTOR_INDEX_LIMIT
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_cache = None
+_flight = SingleFlight("embeddings")
+
+
+def get_client() -> OpenAI:
+    """
+    Return the process-wide OpenAI client.
+
+    The client keeps its own HTTP connection pool, so reusing a single instance avoids a new
+    TLS handshake for every embedding request. Requests pass the process-wide rate limiter.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(http_client=get_http_client())
+    return _client
+
+
+def get_cache() -> EmbeddingCache:
+    """
+    Return the process-wide embedding cache stored in `settings.CACHE_DIR`.
+    """
+    global _cache
+    if _cache is None:
+        with _client_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(os.path.join(settings.CACHE_DIR, "embeddings.sqlite3"),
+                                        max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def _prepare_text(text) -> str:
+    # Replace newlines in the input text with spaces, as they can negatively affect performance.
+    return str(text).replace("\n", " ").strip().replace("'", "")
+
+
 @retry(wait=wait_random_exponential(min=1, max=2), stop=stop_after_attempt(10))
+def _request_embedding_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Send one batch of already prepared texts to the Embedding API.
+
+    The retry decorator sits on the batch, so a failing batch is retried on its own without
+    re-sending batches that already succeeded.
+    """
+    embedding_response = get_client().embeddings.create(input=texts, model=EMBEDDING_MODEL,
+                                                        user=settings.OPENAI_API_KEY)
+    # The API does not guarantee the order of the returned items, the index field does.
+    return [item.embedding for item in sorted(embedding_response.data, key=lambda item: item.index)]
+
+
+def request_embeddings(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+    """
+    Retrieve the embeddings of the given texts using OpenAI's API.
+
+    Texts are looked up in the local embedding cache first. The remaining distinct texts are packed
+    into batches of at most `batch_size` inputs, each batch is sent in a single request over the
+    shared client and its vectors are written back to the cache. Only failing batches are retried.
+    Texts that another caller is already requesting are not sent again but taken from that request.
+
+    Args:
+        texts (List[str]): The input texts to get the embeddings for.
+        batch_size (int): The maximum number of inputs per request.
+
+    Returns:
+        List[List[float]]: The embeddings in the same order as the input texts.
+    """
+    prepared = [_prepare_text(text) for text in texts]
+    cache = get_cache()
+    embeddings = cache.get_vectors(prepared, EMBEDDING_MODEL)
+    missing = [text for text in dict.fromkeys(prepared) if text not in embeddings]
+
+    def fetch(texts):
+        fetched = {}
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            logger.debug(f"Requesting {len(batch)} embeddings")
+            vectors = dict(zip(batch, _request_embedding_batch(batch)))
+            cache.set_vectors(vectors, EMBEDDING_MODEL)
+            fetched.update(vectors)
+        return fetched
+
+    if missing:
+        embeddings.update(_flight.do_many(missing, fetch))
+    return [embeddings[text] for text in prepared]
+
+
 def request_embedding(text: str) -> List[float]:
     """
     Retrieve the embedding of the given text using OpenAI's API.
 
-    This function attempts to generate an embedding for the input text using OpenAI's Embedding API.
-    If the request fails, it will retry up to 6 times, with an exponential backoff strategy for waiting
-    between retries.
+    Thin wrapper around `request_embeddings` for callers that only need a single vector.
 
     Args:
         text (str): The input text to get the embedding for.
@@ -23,119 +121,163 @@ def request_embedding(text: str) -> List[float]:
     Returns:
         List[float]: A list of floating-point numbers representing the embedding.
     """
-    # Replace newlines in the input text with spaces, as they can negatively affect performance.
-    client = OpenAI()
-
-    text = str(text).replace("\n", " ").strip().replace("'", "")
-    # Call the OpenAI Embedding API to create an embedding for the input text.
-    # The API response contains the embedding data in a nested structure.
-    # print(settings.OPENAI_API_KEY)
-    embedding_response = client.embeddings.create(input=[text], model=EMBEDDING_MODEL, user = settings.OPENAI_API_KEY)
-    # Extract the embedding data from the response and return it as a list of floating-point numbers.
-    return embedding_response.data[0].embedding
-
-
-
-
-# class  EmbeddingSearch:
-#     """
-#     Loads embeddings for a model into RAM and enables fast search using FAISS.
-#     The index is fetched and built on instance creation.
-#
-#     Attributes:
-#         Model: The Django model class to fetch embeddings for.
-#         id_property (str): The property to use as the identifier.
-#     """
-#
-#     def __init__(self, Model, fetch_filter="true", id_property='uid'):
-#         """
-#         Initialize the EmbeddingSearch instance.
-#
-#         Args:
-#             Model: The Django model class to fetch embeddings for.
-#             fetch_filter (str): The filter to apply when fetching embeddings from the database.
-#             id_property (str): The property to use as the identifier.
-#         """
-#
-#         # import here to avoid loading faiss for everything django does
-#         import faiss
-#         import numpy as np
-#
-#         self.Model = Model
-#         self.id_property = id_property
-#
-#         logging.info(f'Fetching embeddings for label {Model.__label__}')
-#         query = f'''
-#             MATCH (n:{Model.__label__})<-[:FOR]-(emb:ModelEmbedding)
-#             WHERE COALESCE(n.disable_embedding, false)=false AND {fetch_filter}
-#             RETURN n.{id_property} as {id_property}, emb.vector as vector
-#         '''
-#         # Fetch embeddings from the database
-#         result, meta = db.cypher_query(query)
-#
-#         if not len(result):
-#             raise ValueError(f'no embeddings found for {Model.__label__}')
-#
-#         logging.info(f'Creating embedding index for label {Model.__label__}')
-#
-#         # Create FAISS index
-#         self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-#         self.index.add(np.array([
-#             np.array(row[1]) for row in result
-#         ]))
-#
-#         self.model_ids = [row[0] for row in result]
-#
-#
-#     def find_vector(self, vector, n=1, include_similarities=False):
-#         """
-#         Find the closest embeddings in the index to the input vector.
-#
-#         Args:
-#             vector (np.array): The input vector to find the closest embeddings for.
-#             n (int): The number of closest embeddings to return.
-#             include_similarities (bool): Whether to include similarities in the output.
-#
-#         Returns:
-#             If `include_similarities` is False, returns a list of ids or a single id (if n=1).
-#             If `include_similarities` is True, returns a list of tuples (id, similarity) or a tuple (id, similarity) if n=1.
-#         """
-#
-#         import numpy as np
-#
-#         D, I = self.index.search(np.array([vector]), n)
-#         ids = [self.model_ids[i] for i in I[0]]
-#
-#         if include_similarities:
-#             return ids[0], D[0][0] if n == 1 else [(ids[i], D[0][i]) for i in range(len(ids))]
-#
-#         return ids[0] if n == 1 else ids
-#
-#
-#     def find_string(self, query, return_model=False, include_similarity=False, **kwargs):
-#         """
-#         Find the closest embeddings in the index to the input query.
-#
-#         Args:
-#             query (str): The input string to find the closest embeddings for.
-#             return_model (bool): Whether to return a model instance instead of the id.
-#             include_similarity (bool): Whether to include similarities in the output.
-#             **kwargs: Additional keyword arguments to pass to the `find_vector` method.
-#
-#         Returns:
-#             Depending on the input arguments, returns:
-#             - An instance of the model or an id
-#             - A list of tuples (model instance, similarity) or a list of tuples (id, similarity)
-#         """
-#
-#         if not query:
-#             return (None, 0) if include_similarity else None
-#         res = self.find_vector(request_embedding(query), include_similarities=include_similarity, **kwargs)
-#
-#         if include_similarity:
-#             if return_model:
-#                 return self.Model.nodes.get(**{self.id_property: res[0]}), res[1]
-#             else:
-#                 return res
-#         else:
-#             return self.Model.nodes.get(**{self.id_property: res}) if return_model else res
\ No newline at end of file
+    return request_embeddings([text])[0]
+
+
+class VectorIndex:
+    """
+    In-process copy of a Neo4j vector index.
+
+    All embedding nodes covered by the Neo4j index are loaded into RAM on first use, together with
+    the nodes they point at. Queries are answered with an exact cosine search in numpy and return
+    the same rows and scores as
+
+        CALL db.index.vector.queryNodes($embedding, 50, $vector)
+        YIELD node AS similarEmbedding, score
+        MATCH (similarEmbedding)-[:FOR]->(n)
+        RETURN DISTINCT n, score, similarEmbedding.input ORDER BY score DESC LIMIT 10
+
+    Embeddings saved in this process are picked up incrementally before the next query, writes
+    from other processes after `VECTOR_INDEX_MAX_AGE` seconds by a full reload.
+
+    Attributes:
+        name (str): The name of the Neo4j vector index.
+        label (str): The node label covered by the index.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.label = self._fetch_label(name)
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._known = set()
+        self._uids = []
+        self._inputs = []
+        self._targets = []
+        self._matrix = None
+
+    @staticmethod
+    def _fetch_label(name):
+        results, _ = db.cypher_query(
+            "SHOW VECTOR INDEXES YIELD name, labelsOrTypes WHERE name = $name RETURN labelsOrTypes[0]",
+            {"name": name}
+        )
+        if not results:
+            raise ValueError(f"no vector index named {name}")
+        return results[0][0]
+
+    def _fetch(self, uids=None):
+        query = f"""
+            MATCH (emb:`{self.label}`)-[:FOR]->(n)
+            WHERE emb.vector IS NOT NULL {'AND emb.uid IN $uids' if uids is not None else ''}
+            RETURN emb.uid, emb.vector, emb.input, collect(DISTINCT n)
+        """
+        results, _ = db.cypher_query(query, {"uids": list(uids or [])})
+        return results
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def _add(self, rows):
+        rows = [row for row in rows if row[0] not in self._known]
+        if not rows:
+            return
+        vectors = self._normalize([row[1] for row in rows])
+        self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+        for uid, _, input, targets in rows:
+            self._known.add(uid)
+            self._uids.append(uid)
+            self._inputs.append(input)
+            self._targets.append(targets)
+
+    def load(self):
+        """Loads all embeddings of the index from the database."""
+        logger.info(f"Loading vector index {self.name}")
+        rows = self._fetch()
+        self._known = set()
+        self._uids, self._inputs, self._targets, self._matrix = [], [], [], None
+        _pending[self.label].clear()
+        self._add(rows)
+        self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        """Reloads a stale index or adds embeddings that were saved in this process since the last query."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > VECTOR_INDEX_MAX_AGE:
+            self.load()
+        elif pending := _pending[self.label] - self._known:
+            self._add(self._fetch(pending))
+            # embeddings that are not connected yet stay pending
+            _pending[self.label].difference_update(self._known)
+
+    def query(self, vector, Model, candidates=VECTOR_INDEX_CANDIDATES, limit=VECTOR_INDEX_LIMIT):
+        """
+        Find the nodes whose embeddings are most similar to the input vector.
+
+        Args:
+            vector (List[float]): The query vector.
+            Model: The node class used to inflate the result nodes.
+            candidates (int): The number of nearest embeddings to consider.
+            limit (int): The maximum number of result rows.
+
+        Returns:
+            List[list]: Rows of (node, score, embedding input) ordered by descending score.
+        """
+        with self._lock:
+            self.refresh()
+            matrix, inputs, targets = self._matrix, self._inputs, self._targets
+        if matrix is None:
+            return []
+        # Neo4j reports cosine similarities rescaled to [0, 1]
+        scores = (1 + matrix @ self._normalize([vector])[0]) / 2
+        k = min(candidates, len(scores))
+        nearest = np.argpartition(-scores, k - 1)[:k]
+        rows, seen = [], set()
+        for i in nearest[np.argsort(-scores[nearest], kind="stable")]:
+            score = float(scores[i])
+            for node in targets[i]:
+                if (node.element_id, score, inputs[i]) not in seen:
+                    seen.add((node.element_id, score, inputs[i]))
+                    rows.append([node, score, inputs[i]])
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return [[Model.inflate(node), score, input] for node, score, input in rows[:limit]]
+
+
+_indices = {}
+_failed_at = {}
+_pending = defaultdict(set)
+
+
+def get_vector_index(name):
+    """
+    Return the in-process index for the Neo4j vector index `name`, or None if it cannot be built.
+
+    A failed build is retried after `VECTOR_INDEX_RETRY_INTERVAL` seconds, queries use the Neo4j index
+    until then.
+    """
+    if not VECTOR_INDEX_IN_PROCESS:
+        return None
+    if name not in _indices:
+        if time.monotonic() - _failed_at.get(name, float("-inf")) < VECTOR_INDEX_RETRY_INTERVAL:
+            return None
+        with _client_lock:
+            if name not in _indices and \
+                    time.monotonic() - _failed_at.get(name, float("-inf")) >= VECTOR_INDEX_RETRY_INTERVAL:
+                try:
+                    _indices[name] = VectorIndex(name)
+                    _failed_at.pop(name, None)
+                except Exception as e:
+                    logger.warning(f"Falling back to the Neo4j vector index for {name}: {e}")
+                    _failed_at[name] = time.monotonic()
+    return _indices.get(name)
+
+
+def mark_pending(uid, labels):
+    """
+    Registers a newly saved embedding node so the in-process indices of its labels pick it up.
+    """
+    for label in labels:
+        _pending[label].add(uid)
@@ -1,10 +1,14 @@
+import logging
 from asyncio import sleep
 from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 from django.template.loader import render_to_string
 
-from importing.models import ImporterCache
+from importing.models import ImporterCache, StageCheckpoint
+from tasks.task_manager import current_task
+
+logger = logging.getLogger(__name__)
 
 
 class ReportBuilder:
@@ -91,6 +95,10 @@ class TableDataTransformer(ReportBuilder):
         self.html_report = ""
         self.cache = cache
         self.ReportClass = ReportClass
+        self._prefetched = {}
+        self._importer_cache = None
+        self._process_id = None
+        self._checkpoints = {}
         self.first_row = [el['column_values'][0] if type(el['column_values']) == list and el['column_values'] else "" for el in self.data]
 
 
@@ -148,7 +156,7 @@ class TableDataTransformer(ReportBuilder):
             bool: True if cached data is used.
         """
         column_value = kwargs['element']['column_values'][0]
-        if cached := ImporterCache.fetch(kwargs['element']['header'], column_value, attribute_type= self.attribute_type ):
+        if cached := self.importer_cache.fetch(kwargs['element']['header'], column_value, attribute_type= self.attribute_type ):
             self._update_with_cache(cached, **kwargs)
             return True
         return False
@@ -160,15 +168,40 @@ class TableDataTransformer(ReportBuilder):
     def results(self):
         return self._results
 
+    @property
+    def importer_cache(self):
+        """
+        The header cache records of this table, loaded with one query on first use.
+        Updates are buffered and written when the stage finished iterating.
+        """
+        if self._importer_cache is None:
+            self._importer_cache = ImporterCache.prefetch(self.headers)
+        return self._importer_cache
+
     def _transform(self, **kwargs):
         """
-        Transform the data.
+        Transform the data, reusing the checkpointed result of an earlier run of the stage.
         """
         input_string = self._create_input_string(**kwargs)
-        query_results = self._llm_request(input_string, **kwargs)
-        result = self.analyze_results(query_results, **kwargs)
+        key = StageCheckpoint.make_key(kwargs['element'], input_string)
+        if key in self._checkpoints:
+            result = self._checkpoints[key]
+        else:
+            query_results = self._llm_request(input_string, **kwargs)
+            result = self.analyze_results(query_results, **kwargs)
+            if self._process_id:
+                StageCheckpoint.save_result(self._process_id, self.attribute_type, key, result)
         self._update(result, input_string, **kwargs)
 
+    def _load_checkpoints(self):
+        """
+        Loads the column results a failed or interrupted run of this stage saved for the current process.
+        """
+        task = current_task()
+        self._process_id = getattr(task, "process_id", None)
+        if self._process_id:
+            self._checkpoints = StageCheckpoint.load(self._process_id, self.attribute_type)
+
     def _update_with_cache(self, element, cached, **kwargs):
         return NotImplemented
 
@@ -184,12 +217,34 @@ class TableDataTransformer(ReportBuilder):
 
     def _llm_request(self, input_string):
         return NotImplemented
+
+    def _prefetch(self):
+        """
+        Resolves the requests of all elements in bulk before they are processed one by one.
+        Results are stored in `_prefetched` keyed by input string.
+        """
+        pass
+
+    def _elements_to_request(self):
+        """The elements `_process` sends to the LLM: not pre-checked, cached or checkpointed."""
+        return [(index, element) for index, element in enumerate(self.iterable)
+                if not self._pre_check(index=index, element=element)
+                and not self.importer_cache.answers(element['header'], self.attribute_type)
+                and StageCheckpoint.make_key(element, self._create_input_string(index=index, element=element))
+                not in self._checkpoints]
+
     def run(self):
         """
         Executes the data transformation, builds the report, and saves it.
         """
+        self._load_checkpoints()
+        # one query for the cache records of all columns, before the prefetch and the worker threads
+        self._importer_cache = ImporterCache.prefetch(self.headers)
+        logger.debug("Prefetching the column results")
+        self._prefetch()
         print('trying iterate')
         self.iterate()
+        self._importer_cache.flush()
         print('trying build results')
         self.build_results()
         print('trying build report')
@@ -22,12 +22,16 @@ from neomodel import UniqueIdProperty, StringProperty, ArrayProperty, AliasPrope
 from neomodel.properties import validator, BooleanProperty
 from neomodel import db
 
-from graphutils.embeddings import request_embedding
+from graphutils.embeddings import request_embedding, request_embeddings, get_vector_index
+from graphutils.singleflight import SingleFlight
 
 
 # from graphutils.embeddings import request_embedding
 
 
+_lookup_flight = SingleFlight("vector_lookups")
+
+
 class EmbeddingNodeSet(NodeSet):
     def __init__(self, cls):
         super().__init__(cls)
@@ -52,23 +56,54 @@ class EmbeddingNodeSet(NodeSet):
         #
         # return self.query_cls(self).build_ast()._execute(False)
 
-        results, _ = db.cypher_query(query, kwargs, resolve_objects=True)
+        if index := get_vector_index(kwargs['embedding']):
+            results = index.query(kwargs['vector'], self.source_class)
+        else:
+            results, _ = db.cypher_query(query, kwargs, resolve_objects=True)
+        return self._format_results(results, kwargs.get('string'), include_similarity, include_input_string)
+
+    @staticmethod
+    def _format_results(results, string, include_similarity, include_input_string):
         # The following is not as elegant as it could be but had to be copied from the
         # version prior to cypher_query with the resolve_objects capability.
         # It seems that certain calls are only supposed to be focusing to the first
         # result item returned (?)
         if results:
             if include_similarity and include_input_string:
-                return [[n[0], n[1], n[2], kwargs['string']] for n in results]
+                return [[n[0], n[1], n[2], string] for n in results]
             elif include_similarity:
-                return [[n[0], n[1], n[2], kwargs['string']] for n in results]
+                return [[n[0], n[1], n[2], string] for n in results]
             elif include_input_string:
-                return [[n[0], n[2], kwargs['string']] for n in results]
+                return [[n[0], n[2], string] for n in results]
 
             else:
                 return [n[0] for n in results]
         return []
 
+    def _get_by_embeddings(self, vectors, strings, include_similarity, include_input_string):
+
+        query = f"""
+            UNWIND range(0, size($vectors) - 1) AS i
+            CALL db.index.vector.queryNodes($embedding, 50, $vectors[i])
+            YIELD node AS similarEmbedding, score
+            MATCH (similarEmbedding)-[:FOR]->(n)
+            WITH DISTINCT i, n, score, similarEmbedding.input AS input
+            ORDER BY i, score DESC
+            WITH i, collect([n, score, input])[..10] AS candidates
+            RETURN i, candidates
+        """
+
+        if not vectors:
+            return []
+        if index := get_vector_index(self.source_class.embedding):
+            results = [index.query(vector, self.source_class) for vector in vectors]
+        else:
+            rows, _ = db.cypher_query(query, {'embedding': self.source_class.embedding, 'vectors': vectors},
+                                      resolve_objects=True)
+            candidates = dict(rows)
+            results = [candidates.get(i, []) for i in range(len(vectors))]
+        return [self._format_results(result, string, include_similarity, include_input_string)
+                for result, string in zip(results, strings)]
 
     def get_by_embedding(self, include_similarity = False, include_input_string = False, **kwargs):
         """
@@ -88,9 +123,32 @@ class EmbeddingNodeSet(NodeSet):
         :param kwargs: same syntax as `filter()`
         :return: node
         """
-        kwargs["vector"] = request_embedding(kwargs['string'])
-        result = self._get_by_embedding(include_similarity, include_input_string, **kwargs)
-        return result
+        def lookup():
+            kwargs["vector"] = request_embedding(kwargs['string'])
+            return self._get_by_embedding(include_similarity, include_input_string, **kwargs)
+
+        # identical concurrent lookups, e.g. columns with the same header, share one request
+        key = (self.source_class.__name__, kwargs['string'], include_similarity, include_input_string)
+        return list(_lookup_flight.do(key, lookup))
+
+    def get_by_embeddings(self, vectors, strings = None, include_similarity = False, include_input_string = False):
+        """
+        Retrieve the ranked candidates for several vectors with a single query
+        :param vectors: the query vectors
+        :param strings: the input strings the vectors were created from, returned alongside the candidates
+        :return: one list of candidates per vector, formatted like `get_by_embedding`
+        """
+        strings = strings if strings is not None else [None] * len(vectors)
+        return self._get_by_embeddings(vectors, strings, include_similarity, include_input_string)
+
+    def get_by_strings(self, strings, include_similarity = False, include_input_string = False):
+        """
+        Retrieve the ranked candidates for several strings with one batched embedding request and a single query
+        :param strings: the input strings
+        :return: one list of candidates per string, formatted like `get_by_string`
+        """
+        vectors = request_embeddings(strings) if strings else []
+        return self._get_by_embeddings(vectors, strings, include_similarity, include_input_string)
 
 
 class UIDDjangoNode(DjangoNode):
@@ -0,0 +1,216 @@
+"""
+Process-wide rate limiting of OpenAI requests.
+
+All OpenAI clients of the process send their requests through `get_http_client`, whose transport
+admits a request only if the limiter of its model has a free concurrency slot and enough request
+and token budget left. The limiters follow the rate-limit headers of the responses and shrink
+their concurrency on 429 responses, so throughput tops out at the provider limit instead of
+collapsing into retries.
+
+graphutils rate limit classes:
+ - TokenBucket
+ - ModelRateLimiter
+ - RateLimitedTransport
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import Optional
+
+import httpx
+from openai import DefaultHttpxClient
+
+from graphutils.config import RATE_LIMIT_REQUESTS_PER_MINUTE, RATE_LIMIT_TOKENS_PER_MINUTE, RATE_LIMIT_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_duration(value) -> Optional[float]:
+    """Parses the reset durations of the rate-limit headers, e.g. '1s', '6m0s' or '120ms', into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    return sum(float(number) * units[unit] for number, unit in parts) if parts else None
+
+
+def _parse_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Budget that refills continuously at `rate` units per minute up to `rate` units.
+
+    Attributes:
+        rate (float): Units per minute, also the capacity of the bucket.
+        level (float): Units currently available, negative while in debt.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.level = rate
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.rate, self.level + (now - self._updated) * self.rate / 60)
+        self._updated = now
+
+    def wait_time(self, amount, now) -> float:
+        """Seconds until `amount` units are available."""
+        self._refill(now)
+        # a single request larger than the bucket is admitted once the bucket is full
+        amount = min(amount, self.rate)
+        return 0 if self.level >= amount else (amount - self.level) * 60 / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def observe(self, limit, remaining, now):
+        """Aligns the bucket with the limit and remaining budget reported by the provider."""
+        self._refill(now)
+        if limit:
+            self.rate = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class ModelRateLimiter:
+    """
+    Token-bucket limiter for the requests to one model, with adaptive concurrency.
+
+    A request is admitted once the request and token buckets can pay for it and fewer than `concurrency`
+    requests are in flight. The concurrency grows additively with successful responses up to
+    `max_concurrency` and is halved on every 429 response, which also pauses the model until the reported
+    reset time.
+
+    Attributes:
+        model (str): The model the limiter belongs to.
+        requests (TokenBucket): Requests per minute.
+        tokens (TokenBucket): Tokens per minute.
+        concurrency (float): Current number of requests allowed in flight.
+        max_concurrency (int): Upper bound for `concurrency`.
+    """
+
+    def __init__(self, model, requests_per_minute, tokens_per_minute, max_concurrency):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = float(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._paused_until = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens):
+        """Blocks until a request costing `tokens` tokens may be sent."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0 and self.active < int(self.concurrency):
+                    wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self.active += 1
+                        return
+                # without a deadline the next release wakes us up
+                self._condition.wait(wait if wait > 0 else None)
+
+    def release(self, status, headers):
+        """Returns the slot of a finished request and adapts the limits to its response."""
+        with self._condition:
+            self.active -= 1
+            now = time.monotonic()
+            if headers:
+                self.requests.observe(_parse_int(headers.get("x-ratelimit-limit-requests")),
+                                      _parse_int(headers.get("x-ratelimit-remaining-requests")), now)
+                self.tokens.observe(_parse_int(headers.get("x-ratelimit-limit-tokens")),
+                                    _parse_int(headers.get("x-ratelimit-remaining-tokens")), now)
+            if status == 429:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                pause = _parse_duration(headers.get("retry-after")) or max(
+                    _parse_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                    _parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0,
+                ) or 1
+                self._paused_until = max(self._paused_until, now + pause)
+                logger.warning(f"Rate limited on {self.model}, pausing {pause:.1f}s "
+                               f"at concurrency {int(self.concurrency)}")
+            elif status is not None and status < 400:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._condition.notify_all()
+
+
+_limiters = {}
+_lock = threading.Lock()
+_http_client = None
+
+
+def get_rate_limiter(model) -> ModelRateLimiter:
+    """Return the process-wide limiter of `model`."""
+    if model not in _limiters:
+        with _lock:
+            if model not in _limiters:
+                _limiters[model] = ModelRateLimiter(model, RATE_LIMIT_REQUESTS_PER_MINUTE,
+                                                    RATE_LIMIT_TOKENS_PER_MINUTE, RATE_LIMIT_MAX_CONCURRENCY)
+    return _limiters[model]
+
+
+def _request_cost(request):
+    """Returns the model of an OpenAI request and an upper estimate of the tokens it consumes."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return "default", 0
+    if not isinstance(body, dict):
+        return "default", 0
+    # roughly four bytes per prompt token, plus the completion budget the provider reserves
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or 0
+    return body.get("model", "default"), len(request.content) // 4 + completion
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    httpx transport that passes every request through the limiter of its model.
+    """
+
+    def __init__(self, transport=None):
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        model, tokens = _request_cost(request)
+        limiter = get_rate_limiter(model)
+        limiter.acquire(tokens)
+        status, headers = None, None
+        try:
+            response = self._transport.handle_request(request)
+            status, headers = response.status_code, response.headers
+            return response
+        finally:
+            limiter.release(status, headers)
+
+    def close(self):
+        self._transport.close()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Return the process-wide rate limited HTTP client shared by all OpenAI clients.
+    """
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = DefaultHttpxClient(transport=RateLimitedTransport())
+    return _http_client
@@ -0,0 +1,92 @@
+"""
+Coalescing of identical concurrent requests.
+
+A call made while an identical call is in flight does not start a second request but waits for the
+first one and receives its result.
+
+graphutils singleflight classes:
+ - SingleFlight
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, List
+
+
+class SingleFlight:
+    """
+    Group of calls that are deduplicated while they are in flight.
+
+    Results are not kept once a call finished, repeated sequential calls are left to the caches.
+
+    Attributes:
+        name (str): The name of the group, used in the counters.
+        calls (int): Number of keys that were actually requested.
+        deduplicated (int): Number of keys that were served by a call of another caller.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        _groups[name] = self
+
+    def do_many(self, keys: Iterable[Hashable], fn: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """
+        Resolve several keys, requesting only those that are not in flight already.
+
+        Args:
+            keys: The keys to resolve.
+            fn: Called with the keys this caller has to request, returns their results by key.
+
+        Returns:
+            Dict: The results of all keys.
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._in_flight:
+                    waiting[key] = self._in_flight[key]
+                else:
+                    self._in_flight[key] = Future()
+                    owned.append(key)
+            self.calls += len(owned)
+            self.deduplicated += len(waiting)
+        results = {}
+        if owned:
+            try:
+                results = fn(owned)
+                for key in owned:
+                    if key in results:
+                        self._in_flight[key].set_result(results[key])
+                    else:
+                        self._in_flight[key].set_exception(KeyError(key))
+            except BaseException as e:
+                for key in owned:
+                    if not self._in_flight[key].done():
+                        self._in_flight[key].set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        del self._in_flight[key]
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return results
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Resolve a single key, sharing the call with concurrent callers of the same key."""
+        return self.do_many([key], lambda keys: {key: fn()})[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "deduplicated": self.deduplicated}
+
+
+_groups = {}
+
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    """Return the call and deduplication counters of all groups."""
+    return {name: group.stats() for name, group in _groups.items()}
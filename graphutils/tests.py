@@ -0,0 +1,242 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from graphutils.cache import EmbeddingCache, SQLiteLRUCache
+from graphutils.embeddings import request_embeddings
+from graphutils.ratelimit import ModelRateLimiter, TokenBucket, _parse_duration
+from graphutils.singleflight import SingleFlight
+from graphutils.units import normalize_quantity, parse_unit
+
+
+class NormalizeQuantityTest(SimpleTestCase):
+
+    def assertQuantity(self, value, unit, expected_value, expected_unit):
+        value_si, unit_si = normalize_quantity(value, unit)
+        self.assertAlmostEqual(value_si, expected_value, places=9)
+        self.assertEqual(unit_si, expected_unit)
+
+    def test_prefixed_and_compound_units(self):
+        self.assertQuantity("5", "mA/cm2", 50.0, "m^-2*A")
+        self.assertQuantity(2, "mg mL^-1", 2.0, "kg*m^-3")
+        self.assertQuantity("3", "kPa", 3000.0, "kg*m^-1*s^-2")
+        self.assertQuantity("1", "µm", 1e-6, "m")
+        self.assertQuantity("1", "μm", 1e-6, "m")
+        self.assertQuantity("4", "m²", 4.0, "m^2")
+
+    def test_temperatures(self):
+        self.assertQuantity("25", "°C", 298.15, "K")
+        self.assertQuantity("32", "°F", 273.15, "K")
+        self.assertQuantity("300", "K", 300.0, "K")
+
+    def test_bare_c_and_f_are_coulomb_and_farad(self):
+        self.assertQuantity("2", "C", 2.0, "s*A")
+        self.assertQuantity("2", "F", 2.0, "kg^-1*m^-2*s^4*A^2")
+        self.assertQuantity("2", "mF", 2e-3, "kg^-1*m^-2*s^4*A^2")
+
+    def test_dimensionless_values(self):
+        self.assertQuantity("12", "%", 0.12, "")
+        self.assertQuantity("0.5", None, 0.5, "")
+        self.assertQuantity("0.5", "wt%", 0.005, "")
+
+    def test_decimal_comma(self):
+        self.assertQuantity("1,5", "h", 5400.0, "s")
+
+    def test_ambiguous_thousands_separator_is_not_a_number(self):
+        self.assertEqual(normalize_quantity("1,000", "g"), (None, None))
+
+    def test_clock_times(self):
+        self.assertQuantity("00:46:01", "h:min:s", 2761.0, "s")
+        self.assertQuantity("01:30", "hh:mm", 5400.0, "s")
+        self.assertEqual(normalize_quantity("46:01", "h:min:s"), (None, None))
+
+    def test_invalid_values_and_units(self):
+        self.assertEqual(normalize_quantity("n/a", "g"), (None, None))
+        self.assertEqual(normalize_quantity(True, "g"), (None, None))
+        self.assertEqual(normalize_quantity("1", "furlong"), (None, None))
+        self.assertIsNone(parse_unit("mfoo"))
+
+
+class SQLiteLRUCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.sqlite3")
+
+    def count(self, cache):
+        return cache._connection.execute(f"SELECT COUNT(*) FROM {cache.table}").fetchone()[0]
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = SQLiteLRUCache(self.path, max_entries=20)
+        cache.set_many({str(i): b"x" for i in range(20)})
+        time.sleep(0.01)
+        cache.get("0")
+        cache.set("new", b"x")
+        self.assertEqual(self.count(cache), int(20 * cache.EVICTION_LOW_WATER))
+        self.assertEqual(cache.get_many(["0", "new", "1"]), {"0": b"x", "new": b"x"})
+
+    def test_running_count_avoids_counting_on_every_write(self):
+        cache = SQLiteLRUCache(self.path, max_entries=100)
+        cache.set("first", b"x")
+        with patch.object(cache, "evict", wraps=cache.evict) as evict:
+            for i in range(104):
+                cache.set(str(i), b"x")
+        # the eviction at 101 entries trims to the low water mark, the next writes fit without one
+        self.assertEqual(evict.call_count, 1)
+        self.assertEqual(self.count(cache), 99)
+        self.assertEqual(cache._count, 99)
+
+    def test_count_is_read_from_an_existing_store(self):
+        SQLiteLRUCache(self.path, max_entries=10).set_many({str(i): b"x" for i in range(10)})
+        cache = SQLiteLRUCache(self.path, max_entries=10)
+        cache.set("new", b"x")
+        self.assertEqual(self.count(cache), 9)
+
+    def test_expired_entries_are_missing(self):
+        cache = SQLiteLRUCache(self.path, max_entries=10, ttl=60)
+        cache.set("old", b"x")
+        with patch("graphutils.cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get("old"))
+            cache.evict()
+        self.assertEqual(self.count(cache), 0)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1})
+
+    def test_embedding_vectors_round_trip_per_model(self):
+        cache = EmbeddingCache(self.path, max_entries=10)
+        cache.set_vectors({"carbon": [0.5, -1.0]}, model="small")
+        self.assertEqual(cache.get_vectors(["carbon", "platinum"], model="small"), {"carbon": [0.5, -1.0]})
+        self.assertEqual(cache.get_vectors(["carbon"], model="large"), {})
+
+
+class RequestEmbeddingsTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = EmbeddingCache(os.path.join(directory.name, "embeddings.sqlite3"), max_entries=100)
+        patcher = patch("graphutils.embeddings.get_cache", return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("graphutils.embeddings._request_embedding_batch",
+                        side_effect=lambda texts: [[float(len(text))] for text in texts])
+        self.request_batch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_distinct_texts_are_batched_in_input_order(self):
+        vectors = request_embeddings(["ab", "abc\n", "ab", "a", "abcd"], batch_size=2)
+        self.assertEqual(vectors, [[2.0], [3.0], [2.0], [1.0], [4.0]])
+        self.assertEqual([call.args[0] for call in self.request_batch.call_args_list], [["ab", "abc"], ["a", "abcd"]])
+
+    def test_cached_texts_are_not_requested_again(self):
+        request_embeddings(["ab", "abc"])
+        self.assertEqual(request_embeddings(["abc", "abcde"]), [[3.0], [5.0]])
+        self.assertEqual(self.request_batch.call_args_list[-1].args[0], ["abcde"])
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_refills_continuously_up_to_the_rate(self):
+        bucket = TokenBucket(60)
+        now = bucket._updated
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(1, now), 1.0)
+        self.assertEqual(bucket.wait_time(1, now + 1), 0)
+        self.assertEqual(bucket.wait_time(1, now + 3600), 0)
+        self.assertEqual(bucket.level, 60)
+
+    def test_oversized_requests_wait_for_a_full_bucket(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.wait_time(1000, bucket._updated), 0)
+
+    def test_observes_the_reported_budget(self):
+        bucket = TokenBucket(60)
+        bucket.observe(120, 10, bucket._updated)
+        self.assertEqual((bucket.rate, bucket.level), (120, 10))
+
+
+class ModelRateLimiterTest(SimpleTestCase):
+
+    def test_parse_duration(self):
+        self.assertEqual(_parse_duration("6m0s"), 360)
+        self.assertAlmostEqual(_parse_duration("120ms"), 0.12)
+        self.assertEqual(_parse_duration("2"), 2)
+        self.assertIsNone(_parse_duration(""))
+
+    def test_rate_limited_responses_halve_the_concurrency_and_pause(self):
+        limiter = ModelRateLimiter("model", 1000, 100000, 8)
+        limiter.acquire(10)
+        start = time.monotonic()
+        limiter.release(429, {"retry-after": "0.2"})
+        self.assertEqual(limiter.concurrency, 4)
+        limiter.acquire(10)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_successful_responses_grow_the_concurrency_up_to_the_bound(self):
+        limiter = ModelRateLimiter("model", 1000, 100000, 4)
+        limiter.concurrency = 2.0
+        for _ in range(20):
+            limiter.acquire(10)
+            limiter.release(200, {})
+        self.assertEqual(limiter.concurrency, 4)
+        self.assertEqual(limiter.active, 0)
+
+
+class SingleFlightTest(SimpleTestCase):
+
+    def test_concurrent_callers_share_in_flight_keys(self):
+        flight = SingleFlight("test-shared")
+        started, release = threading.Event(), threading.Event()
+        requested = []
+
+        def slow(keys):
+            requested.append(list(keys))
+            started.set()
+            release.wait(5)
+            return {key: key.upper() for key in keys}
+
+        results = {}
+        first = threading.Thread(target=lambda: results.update(first=flight.do_many(["a", "b"], slow)))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.update(second=flight.do_many(["b", "c", "c"], slow)))
+        second.start()
+        second.join(0.2)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(results, {"first": {"a": "A", "b": "B"}, "second": {"b": "B", "c": "C"}})
+        self.assertEqual(requested, [["a", "b"], ["c"]])
+        self.assertEqual(flight.stats(), {"calls": 3, "deduplicated": 1})
+
+    def test_errors_reach_every_waiting_caller(self):
+        flight = SingleFlight("test-errors")
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def failing(keys):
+            started.set()
+            release.wait(5)
+            raise ValueError("unavailable")
+
+        def call():
+            try:
+                flight.do("a", lambda: failing(["a"]))
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        threads[1].join(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(errors, ["unavailable", "unavailable"])
+        self.assertEqual(flight.do("a", lambda: "recovered"), "recovered")
@@ -0,0 +1,179 @@
+"""
+Normalization of quantity values to SI units.
+
+Values are stored as the raw strings of the imported tables, with the unit the extraction assigned. For
+indexed range filtering they are additionally converted to a float in SI base units, with a canonical unit
+string naming the dimension (e.g. "kg*m^-1*s^-2" for pressures, "" for dimensionless values), so values
+given in different units of the same dimension compare directly.
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# SI base units, in the order they appear in canonical unit strings
+BASE_UNITS = ("kg", "m", "s", "A", "K", "mol", "cd")
+
+PREFIXES = {
+    "Y": 1e24, "Z": 1e21, "E": 1e18, "P": 1e15, "T": 1e12, "G": 1e9, "M": 1e6, "k": 1e3, "h": 1e2, "da": 1e1,
+    "": 1.0, "d": 1e-1, "c": 1e-2, "m": 1e-3, "µ": 1e-6, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15,
+}
+
+# symbol: (factor to SI, {base unit: exponent}), these take SI prefixes
+PREFIXED_UNITS = {
+    "m": (1.0, {"m": 1}),
+    "g": (1e-3, {"kg": 1}),
+    "s": (1.0, {"s": 1}),
+    "A": (1.0, {"A": 1}),
+    "K": (1.0, {"K": 1}),
+    "mol": (1.0, {"mol": 1}),
+    "cd": (1.0, {"cd": 1}),
+    "L": (1e-3, {"m": 3}),
+    "l": (1e-3, {"m": 3}),
+    "M": (1e3, {"mol": 1, "m": -3}),
+    "Hz": (1.0, {"s": -1}),
+    "N": (1.0, {"kg": 1, "m": 1, "s": -2}),
+    "Pa": (1.0, {"kg": 1, "m": -1, "s": -2}),
+    "bar": (1e5, {"kg": 1, "m": -1, "s": -2}),
+    "J": (1.0, {"kg": 1, "m": 2, "s": -2}),
+    "eV": (1.602176634e-19, {"kg": 1, "m": 2, "s": -2}),
+    "W": (1.0, {"kg": 1, "m": 2, "s": -3}),
+    "C": (1.0, {"A": 1, "s": 1}),
+    "V": (1.0, {"kg": 1, "m": 2, "s": -3, "A": -1}),
+    "Ω": (1.0, {"kg": 1, "m": 2, "s": -3, "A": -2}),
+    "ohm": (1.0, {"kg": 1, "m": 2, "s": -3, "A": -2}),
+    "S": (1.0, {"kg": -1, "m": -2, "s": 3, "A": 2}),
+    "F": (1.0, {"kg": -1, "m": -2, "s": 4, "A": 2}),
+    "T": (1.0, {"kg": 1, "s": -2, "A": -1}),
+}
+
+# symbol: (factor to SI, {base unit: exponent}), without prefixes
+PLAIN_UNITS = {
+    "min": (60.0, {"s": 1}),
+    "h": (3600.0, {"s": 1}),
+    "hr": (3600.0, {"s": 1}),
+    "d": (86400.0, {"s": 1}),
+    "day": (86400.0, {"s": 1}),
+    "rpm": (1 / 60, {"s": -1}),
+    "Å": (1e-10, {"m": 1}),
+    "atm": (101325.0, {"kg": 1, "m": -1, "s": -2}),
+    "Torr": (101325.0 / 760, {"kg": 1, "m": -1, "s": -2}),
+    "psi": (6894.757293168, {"kg": 1, "m": -1, "s": -2}),
+    "wt%": (1e-2, {}),
+    "at%": (1e-2, {}),
+    "vol%": (1e-2, {}),
+    "%": (1e-2, {}),
+    "ppm": (1e-6, {}),
+    "°": (0.017453292519943295, {}),
+    "deg": (0.017453292519943295, {}),
+    "rad": (1.0, {}),
+}
+
+# temperatures with an offset, converted affinely when they are the whole unit; bare "C" and "F" are
+# coulomb and farad
+TEMPERATURES = {
+    "°C": (1.0, 273.15),
+    "degC": (1.0, 273.15),
+    "celsius": (1.0, 273.15),
+    "°F": (5 / 9, 459.67 * 5 / 9),
+    "degF": (5 / 9, 459.67 * 5 / 9),
+    "°K": (1.0, 0.0),
+    "kelvin": (1.0, 0.0),
+}
+
+# units of values written as clock times, e.g. "00:46:01", by the seconds of their last field
+CLOCK_UNITS = {"h:min:s": 1.0, "hh:mm:ss": 1.0, "min:s": 1.0, "mm:ss": 1.0, "h:min": 60.0, "hh:mm": 60.0}
+
+_TOKEN = re.compile(r"^(?P<symbol>[^\d^+\-]+?)\^?(?P<exponent>[+\-]?\d+)?$")
+_SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺", "0123456789-+")
+
+
+def _symbol(symbol):
+    if symbol in PLAIN_UNITS:
+        return PLAIN_UNITS[symbol]
+    if symbol in PREFIXED_UNITS:
+        return PREFIXED_UNITS[symbol]
+    for prefix, factor in PREFIXES.items():
+        if prefix and symbol.startswith(prefix) and symbol[len(prefix):] in PREFIXED_UNITS:
+            unit_factor, dimensions = PREFIXED_UNITS[symbol[len(prefix):]]
+            return factor * unit_factor, dimensions
+    return None
+
+
+@lru_cache(maxsize=1024)
+def parse_unit(unit: str) -> Optional[Tuple[float, float, str]]:
+    """
+    Parse a unit expression like "mA/cm2", "mg mL^-1" or "°C".
+
+    Returns:
+        (factor, offset, canonical unit) with `si = value * factor + offset`, None if the unit is unknown.
+    """
+    unit = " ".join(str(unit).translate(_SUPERSCRIPTS).replace("μ", "µ").split())
+    if unit in ("", "-", "1", "a.u.", "arb. units"):
+        return 1.0, 0.0, ""
+    if unit in TEMPERATURES:
+        factor, offset = TEMPERATURES[unit]
+        return factor, offset, "K"
+    factor, dimensions = 1.0, {}
+    for i, part in enumerate(unit.split("/")):
+        for token in re.split(r"[\s*·⋅.]+", part.strip("() ")):
+            if not token:
+                continue
+            match = _TOKEN.match(token)
+            resolved = _symbol(match["symbol"]) if match else None
+            if resolved is None:
+                return None
+            exponent = int(match["exponent"] or 1) * (-1 if i else 1)
+            factor *= resolved[0] ** exponent
+            for base, power in resolved[1].items():
+                dimensions[base] = dimensions.get(base, 0) + power * exponent
+    canonical = "*".join(base if dimensions[base] == 1 else f"{base}^{dimensions[base]}"
+                         for base in BASE_UNITS if dimensions.get(base))
+    return factor, 0.0, canonical
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if text.count(",") == 1 and "." not in text:
+        if re.search(r",\d{3}$", text):
+            # "1,000" is as likely a thousands separator as a decimal comma
+            return None
+        text = text.replace(",", ".")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def normalize_quantity(value, unit) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Convert a value in `unit` to SI base units.
+
+    Args:
+        value: The value, a number or its string.
+        unit: The unit of the value; None or "" for dimensionless values.
+
+    Returns:
+        (value in SI units, canonical unit), (None, None) if the value is not a number or the unit unknown.
+    """
+    unit = "" if unit is None else str(unit).strip()
+    if unit in CLOCK_UNITS:
+        fields = str(value).strip().split(":")
+        if len(fields) != unit.count(":") + 1:
+            return None, None
+        total = 0.0
+        for field in fields:
+            if (number := _number(field)) is None:
+                return None, None
+            total = total * 60 + number
+        return total * CLOCK_UNITS[unit], "s"
+    number = _number(value)
+    parsed = parse_unit(unit)
+    if number is None or parsed is None:
+        return None, None
+    factor, offset, canonical = parsed
+    return number * factor + offset, canonical
@@ -9,7 +9,7 @@ from langsmith.schemas import Run, Example
 from scipy.optimize import linear_sum_assignment
 from sklearn.metrics.pairwise import cosine_similarity
 
-from graphutils.embeddings import request_embedding
+from graphutils.embeddings import request_embeddings
 
 
 def predict_nodes(chain) -> dict:
@@ -103,7 +103,8 @@ def precompute_embeddings(attributes_list):
                     unique_strings.add(value["value"].lower())
                 if not is_number(value["index"]):
                     unique_strings.add(value["index"].lower() and value["index"] != "")
-    embeddings = {string: request_embedding(string) for string in unique_strings}
+    unique_strings = list(unique_strings)
+    embeddings = dict(zip(unique_strings, request_embeddings(unique_strings)))
     return embeddings
 
 def cosine_similarity_strings(str1, str2, embeddings):
@@ -78,7 +78,7 @@ class AttributeClassifier(TableDataTransformer):
             **{f"{i}_subattributes": None for i in range(1, 5)},
             **{f"{i}_predicted_attribute_similarities": None for i in range(1, 5)}
         })
-        ImporterCache.update(kwargs['element']['header'], column_attribute=result, attribute_type=self.attribute_type)
+        self.importer_cache.update(kwargs['element']['header'], column_attribute=result, attribute_type=self.attribute_type)
 
     def build_results(self):
         self._results = sorted(self._results, key=lambda x: x['index'])
@@ -186,7 +186,7 @@ class AttributeClassifier(TableDataTransformer):
             "input_string": input_string.replace("\n", ""),
             "1_attribute": result
         })
-        ImporterCache.update(element['header'], column_attribute=result, attribute_type=self.attribute_type)
+        self.importer_cache.update(element['header'], column_attribute=result, attribute_type=self.attribute_type)
 
     def _update_with_cache(self, cached, **kwargs):
         """
@@ -205,10 +205,25 @@ class AttributeClassifier(TableDataTransformer):
             "1_attribute": cached[3],
         })
 
+    def _prefetch(self):
+        """
+        Resolve the input strings of all columns with one batched lookup per attribute class.
+        """
+        requests = {}
+        for index, element in self._elements_to_request():
+            node_class = self._get_node_class(element['1_label'])
+            requests.setdefault(node_class, []).append(self._create_input_string(index, element))
+        for node_class, input_strings in requests.items():
+            outputs = node_class.nodes.get_by_strings(input_strings, include_similarity=True, include_input_string=True)
+            self._prefetched.update({(node_class, input_string): output
+                                     for input_string, output in zip(input_strings, outputs)})
+
     def _llm_request(self, input_string, **kwargs):
         """
         Send a request to the node label model.
         """
+        if (key := (self._get_node_class(kwargs['element']['1_label']), input_string)) in self._prefetched:
+            return self._prefetched[key]
         result = self._get_node_class(kwargs['element']['1_label']).nodes.get_by_string(string=input_string, limit=5,
                                                                                         include_similarity=True,
                                                                                         include_input_string=True)
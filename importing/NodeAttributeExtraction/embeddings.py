@@ -7,7 +7,7 @@ django.setup()
 
 import pandas as pd
 from dotenv import load_dotenv
-from graphutils.embeddings import request_embedding
+from graphutils.embeddings import request_embeddings
 from importing.models import NodeLabel, NodeLabelEmbedding, MatterAttribute, MatterAttributeEmbedding, \
     MeasurementAttribute, MeasurementAttributeEmbedding, ManufacturingAttribute, ManufacturingAttributeEmbedding, \
     PropertyAttribute, PropertyAttributeEmbedding, ParameterAttribute, ParameterAttributeEmbedding, MetadataAttribute, \
@@ -41,7 +41,19 @@ class EmbeddingGenerator:
         df.columns = ['name', 'node_name', 'embedding_cls', 'node_cls']
         return df
 
+    def missing_inputs(self, df):
+        missing = []
+        for index, row in df.iterrows():
+            try:
+                class_mapping[row['embedding_cls']].nodes.get(input=row['name'])
+            except Exception:
+                missing.append(row['name'])
+        return list(dict.fromkeys(missing))
+
     def create_embeddings(self, df):
+        # Embed all inputs that do not have an embedding node yet in one batched run
+        missing = self.missing_inputs(df)
+        vectors = dict(zip(missing, request_embeddings(missing))) if missing else {}
         for index, row in df.iterrows():
             input_text = row['name']
             node_name = row['node_name']
@@ -56,7 +68,7 @@ class EmbeddingGenerator:
                 except class_mapping[embedding_cls].DoesNotExist:
                     print(f"Creating embedding for {input_text}")
                     # If the node does not exist, create it
-                    vector = request_embedding(input_text)
+                    vector = vectors[input_text]
                     embedding_node = class_mapping[embedding_cls](input=input_text, vector=vector)
                     embedding_node.save()
 
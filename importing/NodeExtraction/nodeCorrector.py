@@ -1,10 +1,6 @@
-import os
-
 from langchain.chains.structured_output import create_structured_output_runnable
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
-from graphutils.config import CHAT_GPT_MODEL
 from importing.NodeExtraction.nodeValidator import MatterValidator, PropertyValidator, ParameterValidator, \
     ManufacturingValidator, MeasurementValidator, MetadataValidator, SimulationValidator
 from importing.NodeExtraction.schema import MatterNodeList, PropertyNodeList, ParameterNodeList, ManufacturingNodeList, \
@@ -12,6 +8,7 @@ from importing.NodeExtraction.schema import MatterNodeList, PropertyNodeList, Pa
 from importing.NodeExtraction.setupMessages import MATTER_AGGREGATION_MESSAGE, PROPERTY_AGGREGATION_MESSAGE, \
     PARAMETER_AGGREGATION_MESSAGE, MANUFACTURING_AGGREGATION_MESSAGE, MEASUREMENT_AGGREGATION_MESSAGE, \
     METADATA_AGGREGATION_MESSAGE, SIMULATION_AGGREGATION_MESSAGE
+from importing.utils.openai import invoke_cached, get_chat_model
 
 
 class NodeCorrector:
@@ -57,7 +54,7 @@ class NodeCorrector:
     @retry(stop=stop_after_attempt(4), wait=wait_fixed(2))
     def request_corrections(self, prompts):
         """Extract the relationships using the initial prompt."""
-        llm = ChatOpenAI(model_name=CHAT_GPT_MODEL, openai_api_key=os.environ.get("OPENAI_API_KEY"))
+        llm = get_chat_model()
         setup_message = self.setup_message
         setup_message = [*setup_message, *[("ai", self.llm_output), (
             "human", "Please correct the following inconsistencies: {inconsistencies} \n \nReturn a revised list of nodes that follows the requested format!")]]
@@ -68,9 +65,9 @@ class NodeCorrector:
         print(''.join(prompts))
         chain = create_structured_output_runnable(self.schema, llm, prompt).with_config(
             {"run_name": f"{self.schema}-correction"})
-        self._corrected_nodes = chain.invoke({
+        self._corrected_nodes = invoke_cached(chain, prompt, self.schema, {
             "inconsistencies": ('').join(prompts),
-            "input": self.query})
+            "input": self.query}, stage="node_correction")
 
 
     def run(self):
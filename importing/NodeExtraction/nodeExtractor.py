@@ -1,12 +1,9 @@
-import os
 from collections import defaultdict
 
 from langchain.chains import create_structured_output_runnable
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
-from langchain_core.runnables import chain, RunnableParallel
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import chain
 
-from graphutils.config import CHAT_GPT_MODEL
 from graphutils.general import TableDataTransformer
 # from importing.NodeExtraction.dummydata import test_data
 from importing.NodeExtraction.examples import MATTER_AGGREGATION_EXAMPLES, PARAMETER_AGGREGATION_EXAMPLES, \
@@ -20,6 +17,8 @@ from importing.NodeExtraction.setupMessages import MATTER_AGGREGATION_MESSAGE, P
     PARAMETER_AGGREGATION_MESSAGE, MANUFACTURING_AGGREGATION_MESSAGE, MEASUREMENT_AGGREGATION_MESSAGE, \
     METADATA_AGGREGATION_MESSAGE, SIMULATION_AGGREGATION_MESSAGE
 from importing.models import NodeExtractionReport
+from importing.utils.concurrency import run_pipelines
+from importing.utils.openai import invoke_cached, get_chat_model
 
 
 class NodeAggregator:
@@ -73,7 +72,7 @@ class NodeAggregator:
     def aggregate(self):
         """Performs the initial extraction of relationships using GPT-4."""
         query = self.create_query()
-        llm = ChatOpenAI(model_name=CHAT_GPT_MODEL, openai_api_key=os.getenv("OPENAI_API_KEY"))
+        llm = get_chat_model()
         setup_message = self.setup_message
         prompt = ChatPromptTemplate.from_messages(setup_message)
 
@@ -84,7 +83,7 @@ class NodeAggregator:
 
         chain = create_structured_output_runnable(self.schema, llm, prompt).with_config(
             {"run_name": f"{self.schema}-extraction"})
-        self.intermediate = chain.invoke({"input": query})
+        self.intermediate = invoke_cached(chain, prompt, self.schema, {"input": query}, stage="node_extraction")
         return {"input": {"header": self.header, "row": self.row, "attributes": self.attributes, "indices": self.indices}, "output": self.intermediate, "query": query}
         # return {'input': {'header': ['FuelCell_Id', 'MEA', 'Catalys Ink', 'Catalyst', 'Ionomer', 'I/C', 'Transfer substrate', 'Membrane', 'Anode', 'GDL'], 'row': ['RN0721-28', 'MEA', 'CatInk', 'F50E-HT', 'AQ', '0.7', 'Gore HCCM', 'MX10.15', 'Gore anode', 'HW4 B2.2'], 'attributes': ['identifier', 'identifier', 'name', 'name', 'name', 'name', 'name', 'identifier', 'name', 'batch_number'], 'indices': ['0', '4', '5', '8', '9', '11', '13', '14', '15', '16']},
         # 'output': MatterNodeList(nodes=[MatterNode(attributes=MatterAttributes(identifier=Identifier(AttributeValue='RN0721-28', AttributeReference=0), batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='Fuel Cell', AttributeReference='header')])), MatterNode(attributes=MatterAttributes(identifier=Identifier(AttributeValue='MEA', AttributeReference=4), batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='MEA Assembly', AttributeReference='header')])), MatterNode(attributes=MatterAttributes(identifier=None, batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='CatInk', AttributeReference=5)])), MatterNode(attributes=MatterAttributes(identifier=None, batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='F50E-HT', AttributeReference=8)])), MatterNode(attributes=MatterAttributes(identifier=None, batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='AQ', AttributeReference=9)])), MatterNode(attributes=MatterAttributes(batch_number=None, concentration=None, name=[Name(AttributeValue=0.7, AttributeReference=11)], identifier=Identifier(AttributeValue='RN0721-28', AttributeReference=0))), MatterNode(attributes=MatterAttributes(identifier=None, batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='Gore HCCM', AttributeReference=13)])), MatterNode(attributes=MatterAttributes(identifier=Identifier(AttributeValue='MX10.15', AttributeReference=14), batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='Membrane', AttributeReference='header')])), MatterNode(attributes=MatterAttributes(identifier=None, batch_number=None, ratio=None, concentration=None, name=[Name(AttributeValue='Gore anode', AttributeReference=15)])), MatterNode(attributes=MatterAttributes(identifier=None, batch_number=BatchNumber(AttributeValue='HW4 B2.2', AttributeReference=16), ratio=None, concentration=None, name=[Name(AttributeValue='GDL', AttributeReference='header')]))]),
@@ -362,21 +361,21 @@ class NodeExtractor(TableDataTransformer):
                 return aggregator
 
     def get_table_understanding(self):
-        chain = RunnableParallel(
-            propertyNodes=aggregate_properties | validate_properties,
-            matterNodes=aggregate_matters | validate_matters,
-            parameterNodes=aggregate_parameters | validate_parameters,
-            manufacturingNodes=aggregate_manufacturing | validate_manufacturings,
-            measurementNodes=aggregate_measurement | validate_measurements,
-            metadataNodes=aggregate_metadata | validate_metadata
-        ) | build_results
-        chain = chain.with_config({"run_name": "node-extraction"})
-        self.node_list = chain.invoke({
+        # Label groups are aggregated concurrently, each corrector starts as soon as its aggregator returned.
+        nodes = run_pipelines({
+            "propertyNodes": [aggregate_properties, validate_properties],
+            "matterNodes": [aggregate_matters, validate_matters],
+            "parameterNodes": [aggregate_parameters, validate_parameters],
+            "manufacturingNodes": [aggregate_manufacturing, validate_manufacturings],
+            "measurementNodes": [aggregate_measurement, validate_measurements],
+            "metadataNodes": [aggregate_metadata, validate_metadata],
+        }, {
             'input': self.iterable,
             'context': self.context,
             'header': self.headers,
             'first_line': self.first_row
-        })
+        }, stage="node_extraction")
+        self.node_list = build_results.invoke(nodes, {"run_name": "node-extraction"})
         # self.node_list = test_data
 
 
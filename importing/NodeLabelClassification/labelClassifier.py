@@ -14,6 +14,7 @@ from quantulum3 import parser
 
 
 from importing.models import LabelClassificationReport, NodeLabel, ImporterCache
+from importing.utils.table_cache import ParsedTable
 import pandas as pd
 
 class NodeClassifier(TableDataTransformer):
@@ -22,6 +23,21 @@ class NodeClassifier(TableDataTransformer):
     """
     def __init__(self, ReportClass = LabelClassificationReport,  **kwargs):
         self.attribute_type = "column_label"
+        if isinstance(kwargs['data'], ParsedTable):
+            table = kwargs['data']
+            kwargs['data'] = [
+                {
+                    'header': profile.header,
+                    'column_values': profile.samples,
+                    'index': profile.index,
+                    'inferred_type': profile.inferred_type,
+                    'null_ratio': profile.null_ratio,
+                }
+                for profile in table.profiles[:len(table.header)]
+                if profile.samples
+            ]
+            super().__init__(ReportClass = LabelClassificationReport, **kwargs)
+            return
         if isinstance(kwargs['data'], StringIO):
             kwargs['data'].seek(0)
             kwargs['data'] = pd.read_csv(kwargs['data'], header=None)
@@ -137,12 +153,22 @@ class NodeClassifier(TableDataTransformer):
             "input_string": input_string.replace("\n", ""),
             "1_label": result,
         })
-        ImporterCache.update(kwargs['element']['header'], column_label=result, attribute_type=self.attribute_type)
+        self.importer_cache.update(kwargs['element']['header'], column_label=result, attribute_type=self.attribute_type)
+
+    def _prefetch(self):
+        """
+        Resolve the input strings of all columns with one batched node label lookup.
+        """
+        input_strings = [self._create_input_string(index, element) for index, element in self._elements_to_request()]
+        outputs = NodeLabel.nodes.get_by_strings(input_strings, include_similarity=True, include_input_string=True)
+        self._prefetched = dict(zip(input_strings, outputs))
 
     def _llm_request(self, input_string, **kwargs):
         """
         Send a request to the node label model.
         """
+        if input_string in self._prefetched:
+            return self._prefetched[input_string]
         output = NodeLabel.nodes.get_by_string(string=input_string, limit=5,
                                                include_similarity=True, include_input_string=True)
         return output
@@ -173,7 +199,7 @@ class NodeClassifier(TableDataTransformer):
             **{f"{i}_sublabel": None for i in range(1, 5)},
             **{f"{i}_similarities": None for i in range(1, 5)}
         })
-        ImporterCache.update(kwargs['element']['header'], column_label=result, attribute_type=self.attribute_type)
+        self.importer_cache.update(kwargs['element']['header'], column_label=result, attribute_type=self.attribute_type)
 
     def build_results(self):
         """
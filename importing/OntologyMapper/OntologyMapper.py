@@ -1,32 +1,39 @@
-import csv
-import csv
+import logging
 import os
-from io import StringIO
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from neomodel import db
 
 from langchain_community.chains.ernie_functions.base import create_structured_output_runnable
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
-from langchain_openai import ChatOpenAI
 from tenacity import retry, stop_after_attempt, wait_fixed
 
-from graphutils.config import CHAT_GPT_MODEL
-from graphutils.embeddings import request_embedding
+from graphutils.cache import SQLiteLRUCache
+from graphutils.config import ONTOLOGY_MAPPING_WORKERS, ONTOLOGY_MAPPING_CACHE_MAX_ENTRIES
+from graphutils.embeddings import request_embeddings
 # from graphutils.models import AlternativeLabel
 from importing.OntologyMapper.setupMessages import PARAMETER_SETUP_MESSAGE, MEASUREMENT_SETUP_MESSAGE, \
     MANUFACTURING_SETUP_MESSAGE, MATTER_SETUP_MESSAGE, PROPERTY_SETUP_MESSAGE
-from importing.utils.openai import chat_with_gpt3
+from importing.utils.openai import chat_with_gpt3, get_chat_model
 from matgraph.models.embeddings import MatterEmbedding, ProcessEmbedding, QuantityEmbedding
-from matgraph.models.metadata import File
+from importing.utils.table_cache import get_table
 from matgraph.models.ontology import EMMOMatter, EMMOProcess, EMMOQuantity
+from ontologymanagement.lexicalSearch import get_lexical_index, normalize_term
 from ontologymanagement.examples import MATTER_ONTOLOGY_CANDIDATES_EXAMPLES, PROCESS_ONTOLOGY_CANDIDATES_EXAMPLES, \
     QUANTITY_ONTOLOGY_CANDIDATES_EXAMPLES, MATTER_ONTOLOGY_ASSISTANT_EXAMPLES, PROCESS_ONTOLOGY_ASSISTANT_EXAMPLES, \
     QUANTITY_ONTOLOGY_ASSISTANT_EXAMPLES
 from ontologymanagement.ontologyManager import OntologyManager
 from ontologymanagement.schema import Response, ChildClass, ClassList
+from ontologymanagement.subsumption import get_subsumption_index
 from ontologymanagement.setupMessages import MATTER_ONTOLOGY_CANDIDATES_MESSAGES, PROCESS_ONTOLOGY_CANDIDATES_MESSAGES, \
     QUANTITY_ONTOLOGY_CANDIDATES_MESSAGES, MATTER_ONTOLOGY_CONNECTOR_MESSAGES, PROCESS_ONTOLOGY_CONNECTOR_MESSAGES, \
     QUANTITY_ONTOLOGY_CONNECTOR_MESSAGES, MATTER_ONTOLOGY_ASSISTANT_MESSAGES, PROCESS_ONTOLOGY_ASSISTANT_MESSAGES, \
     QUANTITY_ONTOLOGY_ASSISTANT_MESSAGES
 
+logger = logging.getLogger(__name__)
+
 ONTOLOGY_MAPPER = {
     'matter': EMMOMatter,
     'manufacturing': EMMOProcess,
@@ -52,59 +59,130 @@ EMBEDDING_MODEL_MAPPER = {
 }
 
 
+class OntologyMappingCache(SQLiteLRUCache):
+    """
+    Persistent (label, normalized name) -> ontology uid mappings, so repeated names skip the lookup entirely.
+    """
+
+    table = "ontology_mappings"
+
+    def get_uids(self, pairs):
+        keys = {self.make_key(label, normalize_term(name)): (name, label) for name, label in pairs}
+        return {keys[key]: value.decode("utf-8") for key, value in self.get_many(keys).items()}
+
+    def set_uid(self, name, label, uid):
+        self.set(self.make_key(label, normalize_term(name)), uid.encode("utf-8"))
+
+    def delete_uids(self, pairs):
+        self.delete_many(self.make_key(label, normalize_term(name)) for name, label in pairs)
+
+
+_mapping_cache = None
+_mapping_cache_lock = threading.Lock()
+
+
+def get_mapping_cache():
+    """
+    Return the process-wide cache of resolved (label, name) -> ontology uid mappings, shared across imports.
+    """
+    global _mapping_cache
+    if _mapping_cache is None:
+        with _mapping_cache_lock:
+            if _mapping_cache is None:
+                _mapping_cache = OntologyMappingCache(os.path.join(settings.CACHE_DIR, "ontology_mappings.sqlite3"),
+                                                      max_entries=ONTOLOGY_MAPPING_CACHE_MAX_ENTRIES)
+    return _mapping_cache
+
+
 class OntologyMapper:
+    """
+    Maps the node names of an extracted graph onto the ontology.
+
+    Mapping runs as a pipeline: the distinct (name, label) pairs of the whole table are collected first,
+    pairs known from earlier imports are taken from the mapping cache, the remaining ones are resolved
+    concurrently with at most `ONTOLOGY_MAPPING_WORKERS` workers and the results are fanned back into
+    `mapping` in table order.
+    """
 
     def __init__(self, data, file_link, context):
         self.data = data
         self.file_link = file_link
         self.context = context
         self._mapping = []
-        self.names = []
-        self._table = self._load_table(file_link)
-
-    def _load_table(self, file_link):
-        file = File.nodes.get(link=file_link)
-        file_content = file.get_file().decode('utf-8')
-        csv_reader = csv.reader(StringIO(file_content))
-        columns = list(zip(*csv_reader))  # Transpose rows to columns
-        return [list(filter(None, col)) for col in columns]  # Remove empty values
+        self._candidates = {}
+        self._table = get_table(link=file_link)
 
-    def map_on_ontology(self):
+    def _collect_pairs(self):
+        """Collects the distinct (name, label) pairs of all nodes, including the values of name columns."""
+        pairs = {}
         for node in self.data['nodes']:
-            if node['label'] == 'metadata':
+            label = node['label']
+            if label == 'metadata':
                 continue
             node['name'] = [node['attributes']['name']] if not isinstance(node['attributes']['name'], list) else node['attributes']['name']
-            for node_name in node['name']:
-                self._process_node(node, node_name)
-            
-    def _process_node(self, node, name):
-        label = node['label']
-        
-        index_value = name.get('index', 'inferred')
-        value_value = name.get('value')
-        
-        if index_value == 'inferred' or value_value not in self.names:
-            self._append_mapping(value_value, label)
-        elif label != 'metadata':
-            self._handle_table_mapping(name, label)
-
-    def _handle_table_mapping(self, name, label):
-        for col_value in self.table[int(name['index'])]:
-            if col_value not in self.names:
-                self._append_mapping(col_value, label)
-
-    def _append_mapping(self, name_value, label):
-        print(name_value, label)
-        if label == 'metadata':
-            return
-        ontology_generator = OntologyGenerator(self.context, name_value, label, ONTOLOGY_MAPPER[label])
-        if name_value not in [mapping['name'] for mapping in self._mapping]:
-            node_uid = ontology_generator.get_or_create(name_value, label).uid
-            self._mapping.append({'name': name_value,
-                                  'id': node_uid,
-                                  'ontology_label': ONTOLOGY_MAPPER[label].__name__,
-                                  'label': label.upper()})
-            self.names.append(name_value)
+            for name in node['name']:
+                index_value = name.get('index', 'inferred')
+                pairs[(name.get('value'), label)] = None
+                if index_value not in ('inferred', 'missing'):
+                    for col_value in self.table.distinct(int(index_value)):
+                        pairs[(col_value, label)] = None
+        return [(name, label) for name, label in pairs if isinstance(name, str) and name]
+
+    def _prefetch_candidates(self, pairs):
+        """Resolves the ontology candidates of the given pairs with one batched lookup per ontology class."""
+        requests = {}
+        for name, label in pairs:
+            # names with a lexical match never reach the vector search
+            if not get_lexical_index(ONTOLOGY_MAPPER[label]).lookup(name):
+                requests.setdefault(label, []).append(name)
+        for label, names in requests.items():
+            candidates = ONTOLOGY_MAPPER[label].nodes.get_by_strings([name.replace("_", " ") for name in names],
+                                                                     include_similarity=True)
+            self._candidates.update({(label, name): result for name, result in zip(names, candidates)})
+
+    def _validate_cached(self, uids):
+        """Drops cached mappings whose ontology node no longer exists, e.g. after it was deleted or merged."""
+        requests = {}
+        for (name, label), uid in uids.items():
+            requests.setdefault(ONTOLOGY_MAPPER[label], set()).add(uid)
+        existing = set()
+        for ontology_class, class_uids in requests.items():
+            results, _ = db.cypher_query(f"MATCH (n:{ontology_class.__name__}) WHERE n.uid IN $uids RETURN n.uid",
+                                         {"uids": list(class_uids)})
+            existing.update(uid for (uid,) in results)
+        if stale := [pair for pair, uid in uids.items() if uid not in existing]:
+            get_mapping_cache().delete_uids(stale)
+        return {pair: uid for pair, uid in uids.items() if uid in existing}
+
+    def _resolve(self, pair):
+        name, label = pair
+        ontology_generator = OntologyGenerator(self.context, name, label, ONTOLOGY_MAPPER[label])
+        node_uid = ontology_generator.get_or_create(name, label, candidates=self._candidates.get((label, name))).uid
+        get_mapping_cache().set_uid(name, label, node_uid)
+        return node_uid
+
+    def map_on_ontology(self):
+        pairs = self._collect_pairs()
+        uids = self._validate_cached(get_mapping_cache().get_uids(pairs))
+        missing = [pair for pair in pairs if pair not in uids]
+        self._prefetch_candidates(missing)
+        with ThreadPoolExecutor(max_workers=ONTOLOGY_MAPPING_WORKERS) as executor:
+            futures = {pair: executor.submit(self._resolve, pair) for pair in missing}
+            for pair, future in futures.items():
+                try:
+                    uids[pair] = future.result()
+                except Exception as e:
+                    # the pair stays unmapped, the other pairs are kept
+                    logger.exception(f"Mapping {pair[0]!r} ({pair[1]}) onto the ontology failed: {e}")
+        self._mapping = [{'name': name,
+                          'id': uids[(name, label)],
+                          'ontology_label': ONTOLOGY_MAPPER[label].__name__,
+                          'label': label.upper()}
+                         for name, label in pairs if (name, label) in uids]
+
+    @property
+    def names(self):
+        return [mapping['name'] for mapping in self._mapping]
 
     @property
     def table(self):
@@ -118,6 +196,9 @@ class OntologyMapper:
         self.map_on_ontology()
 
 
+_create_locks = {ontology_class: threading.Lock() for ontology_class in set(ONTOLOGY_MAPPER.values())}
+
+
 class OntologyGenerator:
 
     def __init__(self, context, name, label, ontology_class):
@@ -126,15 +207,24 @@ class OntologyGenerator:
         self.label = label
         self.ontology_class = ontology_class
 
-    def get_or_create(self, input, label):
-        ontology = ONTOLOGY_MAPPER[label].nodes.get_by_string(string=input.replace("_", " "), limit=15,
-                                                              include_similarity=True)
+    def get_or_create(self, input, label, candidates=None):
+        lexical_index = get_lexical_index(ONTOLOGY_MAPPER[label])
+        if lexical_match := lexical_index.lookup(input):
+            return lexical_match[0]
+        ontology = candidates or ONTOLOGY_MAPPER[label].nodes.get_by_string(string=input.replace("_", " "), limit=15,
+                                                                            include_similarity=True)
         if ontology[0][1] < 0.97:
             output = self.create_synonym(input, ontology, label)
+            if lexical_match := lexical_index.lookup(output):
+                return lexical_match[0]
             nodes = ONTOLOGY_MAPPER[label].nodes.get_by_string(string=output, limit=15, include_similarity=True)
             if nodes[0][1] < 0.97:
-                ontology_node = ONTOLOGY_MAPPER[label](name=output)
-                self.save_ontology_node(ontology_node)
+                # concurrent mappers may arrive at the same new synonym, only one of them creates it
+                with _create_locks[ONTOLOGY_MAPPER[label]]:
+                    if lexical_match := lexical_index.lookup(output, threshold=1.0):
+                        return lexical_match[0]
+                    ontology_node = ONTOLOGY_MAPPER[label](name=output)
+                    self.save_ontology_node(ontology_node)
                 return ontology_node
             else:
                 return nodes[0][0]
@@ -148,6 +238,8 @@ class OntologyGenerator:
         :param node: The ontology node to save.
         """
         node.save()  # Assuming node has a save method for basic saving operations
+        get_lexical_index(self.ontology_class).add(node)
+        get_subsumption_index(self.ontology_class).add(node)
         self.add_labels_create_embeddings(node)
         self.connect_to_ontology(node)
 
@@ -167,9 +259,11 @@ class OntologyGenerator:
                     # No similar node found, or similarity is too low; create a new node
                     current_node = self.ontology_class(name=name)
                     current_node.save()
+                    get_subsumption_index(self.ontology_class).add(current_node)
                 # Connect the current node to the previous one in the chain, if applicable
                 if previous_node and previous_node != current_node:
                     previous_node.emmo_parentclass.connect(current_node)
+                    get_subsumption_index(self.ontology_class).add_edge(current_node.uid, previous_node.uid)
 
                 previous_node = current_node
         else:
@@ -188,7 +282,7 @@ class OntologyGenerator:
             'EMMOQuantity': QUANTITY_ONTOLOGY_CANDIDATES_EXAMPLES
         }
         nodes = self.ontology_class.nodes.get_by_string(string=node.name, limit=8, include_similarity=False)
-        llm = ChatOpenAI(model_name=CHAT_GPT_MODEL, openai_api_key=os.getenv("OPENAI_API_KEY"))
+        llm = get_chat_model()
         setup_message = ONTOLOGY_CANDIDATES[self.ontology_class._meta.object_name]
         prompt = ChatPromptTemplate.from_messages(setup_message)
         query = f"""Input: {node.name}\nCandidates: {", ".join([el.name for el in nodes if el.name != node.name])} \nContext: {self.context}"""
@@ -219,7 +313,7 @@ class OntologyGenerator:
             'EMMOQuantity': QUANTITY_ONTOLOGY_CONNECTOR_MESSAGES,
         }
 
-        llm = ChatOpenAI(model_name=CHAT_GPT_MODEL, openai_api_key=os.getenv("OPENAI_API_KEY"))
+        llm = get_chat_model()
         llm = llm.bind_tools([ClassList])
         setup_message = ONTOLOGY_CONNECTOR[self.ontology_class._meta.object_name]
 
@@ -257,21 +351,19 @@ class OntologyGenerator:
         ontology_manager = OntologyManager()
         ontology_class = ontology_manager.get_labels(node.name, SETUP_MAPPER_MESSAGES[self.label],
                                                      examples=SETUP_MAPPER_EXAMPLES[self.label])
-        for label in ontology_class.alternative_labels:
+        inputs = [*ontology_class.alternative_labels, node.name]
+        for label, embedding in zip(inputs, request_embeddings(inputs)):
             # alternative_label_node = AlternativeLabel(label=label).save()
             # node.alternative_label.connect(alternative_label_node)
-            embedding = request_embedding(label)
             embedding_node = EMBEDDING_MODEL_MAPPER[self.label](vector=embedding, input=label).save()
             node.model_embedding.connect(embedding_node)
-        embedding_node = EMBEDDING_MODEL_MAPPER[self.label](vector=request_embedding(node.name), input=node.name).save()
-        node.model_embedding.connect(embedding_node)
 
     def ontology_extension_prompt(self, input, ontology):
         return f"Input: {input}\nContext: {self.context}\nCandidates: {', '.join([ont[0].name for ont in ontology])}"
 
     def create_synonym(self, input, ontology, label):
         prompt = self.ontology_extension_prompt(input, ontology)
-        output = chat_with_gpt3(prompt=prompt, setup_message=SETUP_MESSAGES[label])
+        output = chat_with_gpt3(prompt=prompt, setup_message=SETUP_MESSAGES[label], stage="ontology_synonym")
         return output
 
     def extend_ontology(self, input, ontology, label):
@@ -8,10 +8,11 @@ from importing.RelationshipExtraction.relationshipCorrector import hasParameterC
 from importing.RelationshipExtraction.relationshipExtractor import HasParameterExtractor, HasManufacturingExtractor, \
     HasMeasurementExtractor, HasPropertyExtractor, HasPartMatterExtractor, HasPartManufacturingExtractor, \
     HasPartMeasurementExtractor, HasMetadataExtractor
+from importing.utils.concurrency import run_pipelines
 
 django.setup()
 
-from langchain_core.runnables import chain, RunnableParallel
+from langchain_core.runnables import chain
 
 
 
@@ -139,24 +140,23 @@ class fullRelationshipsExtractor:
 
 
     def run(self):
-        # Ensure extractors are created
-        chain = RunnableParallel(
-            has_property=extract_has_property | validate_has_property,
-            has_measurement=extract_has_measurement | validate_has_measurement,
-            has_manufacturing=extract_has_manufacturing | validate_has_manufacturing,
-            has_parameter=extract_has_parameter | validate_has_parameter,
-            # has_part_matter = extract_has_part_matter | validate_has_part_matter,
-            # has_part_manufacturing = extract_has_part_manufacturing | validate_has_part_manufacturing,
-            # has_part_measurement = extract_has_part_measurement | validate_has_part_measurement
-            # has_metadata=extract_has_metadata | validate_has_metadata
-        ) | build_results
-        chain = chain.with_config({"run_name": "relationship-extraction"})
-        self.relationships = chain.invoke({
+        # Every extractor is followed by its validator; the pairs run concurrently with a bounded number of LLM calls.
+        results = run_pipelines({
+            "has_property": [extract_has_property, validate_has_property],
+            "has_measurement": [extract_has_measurement, validate_has_measurement],
+            "has_manufacturing": [extract_has_manufacturing, validate_has_manufacturing],
+            "has_parameter": [extract_has_parameter, validate_has_parameter],
+            # "has_part_matter": [extract_has_part_matter, validate_has_part_matter],
+            # "has_part_manufacturing": [extract_has_part_manufacturing, validate_has_part_manufacturing],
+            # "has_part_measurement": [extract_has_part_measurement, validate_has_part_measurement],
+            # "has_metadata": [extract_has_metadata, validate_has_metadata],
+        }, {
             'input': self.data["nodes"],
             'context': self.context,
             'header': self.header,
             'first_line': self.first_line
-        })
+        }, stage="relationship_extraction")
+        self.relationships = build_results.invoke(results, {"run_name": "relationship-extraction"})
 
     @property
     def relationships(self):
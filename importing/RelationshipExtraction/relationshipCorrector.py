@@ -1,10 +1,6 @@
-import os
-
 from langchain_community.chains.ernie_functions.base import create_structured_output_runnable
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
-from graphutils.config import CHAT_GPT_MODEL
 from importing.RelationshipExtraction.input_generator import prepare_lists
 from importing.RelationshipExtraction.relationshipValidator import hasParameterValidator, hasPropertyValidator, \
     hasMeasurementValidator, hasManufacturingValidator, hasPartMatterValidator, hasPartManufacturingValidator, \
@@ -14,6 +10,7 @@ from importing.RelationshipExtraction.schema import HasMeasurementRelationships,
 from importing.RelationshipExtraction.setupMessages import MATTER_MANUFACTURING_MESSAGE, PROPERTY_MEASUREMENT_MESSAGE, \
     MATTER_PROPERTY_MESSAGE, HAS_PARAMETER_MESSAGE, MATTER_MATTER_MESSAGE, MEASUREMENT_MEASUREMENT_MESSAGE, \
     MANUFACTURING_MANUFACTURING_MESSAGE, PROCESS_METADATA_MESSAGE
+from importing.utils.openai import invoke_cached, get_chat_model
 
 
 class relationshipCorrector:
@@ -42,16 +39,16 @@ class relationshipCorrector:
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
     def request_corrections(self):
         """Extract the relationships using the initial prompt."""
-        llm = ChatOpenAI(model_name=CHAT_GPT_MODEL, openai_api_key=os.environ.get("OPENAI_API_KEY"))
+        llm = get_chat_model()
         setup_message = self.setup_message
         setup_message = [*setup_message, *[("ai", self.llm_output), (
         "human", "Please correct the following inconsistencies: {inconsistencies}")]]
         prompt = ChatPromptTemplate.from_messages(setup_message)
         chain = create_structured_output_runnable(self.schema, llm, prompt).with_config(
             {"run_name": f"{self.schema}-correction"})
-        self._corrected_graph = chain.invoke({
+        self._corrected_graph = invoke_cached(chain, prompt, self.schema, {
             "inconsistencies": (', ').join(self.prompts),
-            "input": self.query})
+            "input": self.query}, stage="relationship_correction")
 
     def run(self):
         self.full_validate()
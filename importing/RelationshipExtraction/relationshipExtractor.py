@@ -1,17 +1,14 @@
-import os
-
 from langchain.chains.structured_output import create_structured_output_runnable
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
-from langchain_openai import ChatOpenAI
 from tenacity import retry, stop_after_attempt, wait_fixed
 
-from graphutils.config import CHAT_GPT_MODEL
 from importing.RelationshipExtraction.examples import (
     MATTER_MANUFACTURING_EXAMPLES,
     HAS_PARAMETER_EXAMPLES,
     MATTER_PROPERTY_EXAMPLES,
 )
 from importing.RelationshipExtraction.input_generator import prepare_lists
+from importing.utils.openai import invoke_cached, get_chat_model
 from importing.RelationshipExtraction.schema import (
     HasManufacturingRelationships,
     HasMeasurementRelationships,
@@ -118,7 +115,7 @@ Scientific Context: {self.context}
     def initial_extraction(self):
         """Performs the initial extraction of relationships using GPT-4."""
         query = self.create_query()
-        llm = ChatOpenAI(model_name=CHAT_GPT_MODEL, openai_api_key=os.getenv("OPENAI_API_KEY"))
+        llm = get_chat_model()
         setup_message = self.setup_message
         prompt = ChatPromptTemplate.from_messages(setup_message)
 
@@ -130,7 +127,7 @@ Scientific Context: {self.context}
 
         chain = create_structured_output_runnable(self.schema, llm, prompt).with_config(
             {"run_name": f"{self.schema}-extraction"})
-        self.intermediate = chain.invoke({"input": query})
+        self.intermediate = invoke_cached(chain, prompt, self.schema, {"input": query}, stage="relationship_extraction")
         self.generate_result()
 
     def run(self):
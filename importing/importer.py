@@ -1,7 +1,5 @@
-import csv
 from datetime import timezone
 import time
-from io import StringIO
 from pprint import pprint
 
 import pandas as pd
@@ -15,8 +13,9 @@ from importing.NodeLabelClassification.labelClassifier import NodeClassifier
 from importing.OntologyMapper.OntologyMapper import OntologyMapper
 from importing.RelationshipExtraction.completeRelExtractor import fullRelationshipsExtractor
 from importing.models import ImportingReport, LabelClassificationReport
+from importing.utils.ingestion import BatchIngestor
+from importing.utils.table_cache import get_table
 from importing.utils.openai import chat_with_gpt4, chat_with_gpt3
-from matgraph.models.metadata import File
 from matgraph.models.ontology import EMMOMatter, EMMOProcess, EMMOQuantity
 
 
@@ -315,93 +314,19 @@ class TableImporter(Importer):
         }
 
     def prepare_data(self, file_link, data):
-        file = File.nodes.get(link=file_link)
-        file_obj_bytes = file.get_file()
-
-        # Decode the bytes object to a string
-        file_obj_str = file_obj_bytes.decode('utf-8')
-
-        # Use StringIO on the decoded string
-        file_obj = StringIO(file_obj_str)
-        csv_reader = csv.reader(file_obj)
-        first_row = next(csv_reader)
-
-        # Initialize a list of sets for each column
-        column_values = [set() for _ in range(len(first_row))]
-
-        for row in csv_reader:
-            for i, value in enumerate(row):
-                column_values[i].add(value)
-
-        data['column_values'] = [list(column_set) for column_set in column_values]
+        table = get_table(link=file_link)
+        data['column_values'] = [list(profile.distinct_values) for profile in table.profiles[:len(table.header)]]
         self.ontology_mapper.run()
         self.mapping = self.ontology_mapper.mapping
 
         return data
 
     def build_query(self):
-        # Construct the base part of the query for loading the CSV
-        base_query = f"LOAD CSV FROM '{self.file_link}' as row WITH row, toString(timestamp()) AS uniqueId WITH row, uniqueId SKIP 1"
-        query_parts = [base_query]
-
-        # Function to construct attribute value strings
-        def format_attr_value(attr_value):
-            print(attr_value)
-            
-            index_value = attr_value.get('index', 'inferred')
-            
-            if index_value == 'inferred' or index_value == "missing":
-                return f"'{attr_value['value']}'"
-            return f"row[{int(index_value)}]"
-
-
-        # Construct the query for adding ontology relations
-        ontology_mapping = str(self.mapping).replace("':", ":").replace("{'", "{").replace(", '", ", ").replace("-", "_")
-        add_ontology = f"""WITH * UNWIND {ontology_mapping} as input
-        MATCH (ontology:EMMOMatter|EMMOQuantity|EMMOProcess),
-        (n:Matter|Parameter|Manufacturing|Measurement|Property)
-        WHERE ontology.uid = input.id AND (n.name = input.name OR input.name in n.name)
-        MERGE (n)-[:IS_A]->(ontology)
-        """
-
-        # Function to add attributes to nodes
-        def construct_setter(attr_name, attr_values, node_id):
-            single_value = len(attr_values) == 1
-            setter_prefix = f"SET n{node_id}.{attr_name} = "
-            if single_value:
-                value = attr_values[0]
-                print(attr_name, value, node_id)
-                setter_value = format_attr_value(value)
-                return setter_prefix + setter_value
-
-            # For multiple values, construct an array and remove nulls
-            value_strings = [format_attr_value(value) for value in attr_values]
-            values_list = ", ".join(value_strings)
-            return f"{setter_prefix}apoc.coll.removeAll([{values_list}], [null])"
-
-
-        # Build queries for nodes and their attributes
-        for node_config in self.data['nodes']:
-            node_id, label = node_config['id'], node_config['label']
-            query_parts.append(f"CREATE (n{node_id}:{label.capitalize()} {{uid: randomUUID(), flag: 'dev'}})")
-
-            for attr_name, attr_values in node_config['attributes'].items():
-                attr_values = [attr_values] if not isinstance(attr_values, list) else attr_values
-                attr_values = [attr_value for attr_value in attr_values if attr_value['value'] != 'MISSING_VALUE_OR_OPERATOR']
-                attribute_query = construct_setter(attr_name, attr_values, node_id)
-                query_parts.append(attribute_query)
-
-        # Build queries for relationships
-        relationship_queries = [
-            f"MERGE (n{rel['connection'][0]})-[:{rel['rel_type']}]->(n{rel['connection'][1]})"
-            for rel in self.data['relationships']
-        ]
-
-        # Combine all parts of the query
-        full_query = '\n'.join(query_parts + relationship_queries + [add_ontology])
-        print(full_query)
-
-        return full_query, {}
+        """
+        Returns the parameterized ingestion template for the shape of the extracted graph.
+        """
+        self.ingestor = BatchIngestor(self.data, self.mapping)
+        return self.ingestor.query, {}
 
     def ingest_data(self):
         """
@@ -409,9 +334,22 @@ class TableImporter(Importer):
         """
         query, params = self.build_query()
         start = time.time()
-        self.db_results = db.run(query, **params)
+        self.db_results = self.ingestor.run(get_table(link=self.file_link).iter_rows())
         end = time.time()
-        # self._build_query_report(query, params, start, end)
+        if self.generate_report:
+            self._build_query_report(query, params, start, end)
+            self._build_ingestion_report()
+
+    def run(self):
+        """
+        Method to ingest the table and generate the report.
+        """
+        self.ingest_data()
+        if self.generate_report:
+            ImportingReport(
+                type=self.type,
+                report=self.report
+            ).save()
 
     def _build_query_report(self, query, params, start, end):
         """
@@ -438,6 +376,16 @@ class TableImporter(Importer):
             'paginator': self.paginator
         })
 
+    def _build_ingestion_report(self):
+        """
+        Helper method to build report for the ingestion statistics.
+        """
+        self.report += render_to_string('reports/results.html', {
+            'label': 'Ingestion',
+            'columns': list(self.db_results),
+            'rows': [list(self.db_results.values())]
+        })
+
     def _build_result_report(self):
         """
         Helper method to build report for the result.
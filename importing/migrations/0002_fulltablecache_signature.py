@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+from importing.utils.table_signature import header_columns, header_signature
+
+
+def fill_signatures(apps, schema_editor):
+    FullTableCache = apps.get_model("importing", "FullTableCache")
+    seen = set()
+    # validated entries win if several headers share a signature
+    for cached in FullTableCache.objects.order_by("-validated_graph", "id"):
+        columns = header_columns(cached.header)
+        signature = header_signature(columns)
+        if signature in seen:
+            continue
+        seen.add(signature)
+        cached.signature = signature
+        cached.column_count = len(columns)
+        cached.save(update_fields=["signature", "column_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('importing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fulltablecache',
+            name='signature',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='fulltablecache',
+            name='column_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='fulltablecache',
+            name='header',
+            field=models.TextField(),
+        ),
+        migrations.RunPython(fill_signatures, migrations.RunPython.noop),
+    ]
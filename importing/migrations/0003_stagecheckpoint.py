@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('importing', '0002_fulltablecache_signature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process_id', models.CharField(max_length=255)),
+                ('stage', models.CharField(max_length=64)),
+                ('key', models.CharField(max_length=64)),
+                ('result', models.JSONField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'importing_stage_checkpoint',
+                'constraints': [models.UniqueConstraint(fields=('process_id', 'stage', 'key'), name='unique_stage_checkpoint')],
+            },
+        ),
+    ]
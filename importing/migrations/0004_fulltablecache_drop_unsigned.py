@@ -0,0 +1,34 @@
+from django.db import migrations
+
+from importing.utils.table_signature import header_columns, header_signature
+
+
+def drop_unsigned(apps, schema_editor):
+    """
+    Entries that lost the signature of their header to another entry in 0002 kept no signature and are
+    never looked up; they are removed, or signed if their signature is free again. Validated entries win
+    if several unsigned headers share a free signature.
+    """
+    FullTableCache = apps.get_model("importing", "FullTableCache")
+    signed = set(FullTableCache.objects.exclude(signature=None).values_list("signature", flat=True))
+    for cached in FullTableCache.objects.filter(signature=None).order_by("-validated_graph", "id"):
+        columns = header_columns(cached.header)
+        signature = header_signature(columns)
+        if signature in signed:
+            cached.delete()
+            continue
+        signed.add(signature)
+        cached.signature = signature
+        cached.column_count = len(columns)
+        cached.save(update_fields=["signature", "column_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('importing', '0003_stagecheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unsigned, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,32 @@
+import copy
+import hashlib
 import io
+import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
 
 import requests
 from django.db import models
+from django.utils import timezone
 from django_neomodel import classproperty
 from neomodel import RelationshipFrom, ZeroOrMore
 from neomodel import StringProperty, RelationshipTo, One, ArrayProperty, FloatProperty
 from tenacity import retry, wait_random_exponential, stop_after_attempt
 
+from graphutils.config import (IMPORTER_CACHE_LRU_SIZE, IMPORTER_CACHE_LRU_MAX_AGE, FULL_TABLE_CACHE_MAX_COLUMN_DIFF,
+                               STAGE_CHECKPOINT_MAX_AGE)
 from graphutils.models import UIDDjangoNode, EmbeddingNodeSet
 from matgraph.models.embeddings import ModelEmbedding
 
+from importing.utils.table_signature import header_columns, header_signature, column_difference, remap_graph
 from tasks.models import Process
 
+logger = logging.getLogger(__name__)
+
 
 class ImportingReport(models.Model):
     """
@@ -290,7 +304,114 @@ class MetadataAttributeEmbedding(NodeAttributeEmbedding):
     label = RelationshipTo("importing.models.MetadataAttribute", "FOR", One)  # Points at NodeAttribute
 
 
+_recent_records = OrderedDict()
+_recent_records_lock = threading.Lock()
+
+
+def _remember_records(records):
+    """Puts copies of saved cache records into the cross-request LRU."""
+    now = time.monotonic()
+    with _recent_records_lock:
+        for record in records:
+            key = (type(record).__name__, record.header)
+            _recent_records[key] = (copy.copy(record), now)
+            _recent_records.move_to_end(key)
+        while len(_recent_records) > IMPORTER_CACHE_LRU_SIZE:
+            _recent_records.popitem(last=False)
+
+
+def _recall_records(model, headers):
+    """Returns copies of the recently seen records of `headers` that are younger than the LRU max age."""
+    oldest = time.monotonic() - IMPORTER_CACHE_LRU_MAX_AGE
+    found = {}
+    with _recent_records_lock:
+        for header in headers:
+            key = (model.__name__, header)
+            if (entry := _recent_records.get(key)) and entry[1] >= oldest:
+                _recent_records.move_to_end(key)
+                found[header] = copy.copy(entry[0])
+    return found
+
+
+class CacheBatch:
+    """
+    In-memory view of the cache records of one table.
+
+    All records of the table's headers are loaded with a single query, lookups and updates work on the
+    loaded records and writes are buffered until `flush`, which stores them with one `bulk_create` and
+    one `bulk_update`. Mirrors `Cache.fetch` and `Cache.update`; safe to use from worker threads.
+    """
+
+    def __init__(self, model, headers):
+        self.model = model
+        headers = list(dict.fromkeys(str(header) for header in headers))
+        self._records = _recall_records(model, headers)
+        if missing := [header for header in headers if header not in self._records]:
+            loaded = list(model.objects.filter(header__in=missing))
+            _remember_records(loaded)
+            self._records.update({record.header: record for record in loaded})
+        self._created = {}
+        self._updated = {}
+        self._fields = set()
+        self._lock = threading.Lock()
+
+    def answers(self, header, attribute_type):
+        """Whether `fetch` returns a validated record for the header, without creating one."""
+        with self._lock:
+            cached = self._records.get(str(header))
+            return bool(cached and cached.get_validation_state(attribute_type))
+
+    def fetch(self, header, column_value, attribute_type):
+        with self._lock:
+            cached = self._records.get(str(header))
+            if cached:
+                if cached.get_validation_state(attribute_type):
+                    return (cached.sample_column, cached.column_label, cached.header_attribute, cached.column_attribute)
+                return None
+            new_record = self.model(header=str(header)[:200], sample_column=column_value[:200])
+            self._records[str(header)] = self._created[str(header)] = new_record
+            return None
+
+    def update(self, header, attribute_type, **kwargs):
+        with self._lock:
+            if not (cached := self._records.get(str(header))):
+                return
+            validated = cached.get_validation_state(attribute_type)
+            for key, value in kwargs.items():
+                if not hasattr(cached, key):
+                    raise AttributeError(f"{self.model.__name__} has no attribute '{key}'")
+                setattr(cached, key, value)
+                self._fields.add(key)
+                if validated:
+                    setattr(cached, f"validated_{attribute_type}", False)
+                    self._fields.add(f"validated_{attribute_type}")
+            if str(header) not in self._created:
+                self._updated[str(header)] = cached
+
+    def flush(self):
+        """Writes the buffered records to the database."""
+        with self._lock:
+            created, updated, fields = list(self._created.values()), list(self._updated.values()), list(self._fields)
+            self._created, self._updated, self._fields = {}, {}, set()
+        if created:
+            # records of the same header may have been created by a concurrent import
+            self.model.objects.bulk_create(created, ignore_conflicts=True)
+        if updated and fields:
+            self.model.objects.bulk_update(updated, fields)
+        _remember_records(updated)
+
+
 class Cache:
+    @classmethod
+    def prefetch(cls, headers):
+        """
+        Load the records of all `headers` at once.
+
+        Returns:
+            CacheBatch: Answers `fetch` and buffers `update` calls for these headers until it is flushed.
+        """
+        return CacheBatch(cls, headers)
+
     def get_validation_state(self, attribute_type):
         # Construct the attribute name based on the attribute_type
         attribute_name = f"validated_{attribute_type}"
@@ -313,9 +434,13 @@ class Cache:
             new_record.save()
             return None
 
+    @classmethod
+    def _find(cls, header):
+        return cls.objects.filter(header=header).first()
+
     @classmethod
     def update(cls, header, attribute_type, **kwargs):
-        if cached := cls.objects.filter(header=header).first():
+        if cached := cls._find(header):
             if not cached.get_validation_state(attribute_type):
                 for key, value in kwargs.items():
                     if hasattr(cached, key):
@@ -374,21 +499,137 @@ class ImporterCache(models.Model, Cache):
 
 
 class FullTableCache(models.Model, Cache):
-    header = models.CharField(db_index=True, unique=True, max_length=40000)
+    """
+    Validated graphs of whole tables, keyed by the signature of their header.
+
+    The signature is a digest of the sorted, whitespace- and case-folded column names, so lookups compare
+    fixed-size keys and reordered headers share an entry. Tables without an exact entry may reuse the
+    validated graph of a header that differs by at most `FULL_TABLE_CACHE_MAX_COLUMN_DIFF` columns.
+    """
+    signature = models.CharField(max_length=64, unique=True, null=True)
+    column_count = models.PositiveIntegerField(default=0, db_index=True)
+    header = models.TextField()
     validated_graph = models.BooleanField(default=False, verbose_name="Validated Graph")
     graph = models.JSONField(null=True)
 
     @classmethod
-    def fetch(cls, header):
-        # Attempt to find an existing record
-        cached = cls.objects.filter(header=header).first()
+    def _find(cls, header):
+        columns = header_columns(header)
+        cached = cls.objects.filter(signature=header_signature(columns)).first()
+        if cached and sorted(header_columns(cached.header)) != sorted(columns):
+            logger.warning(f"Header signature collision for {cached.signature}")
+            return None
+        return cached
 
-        if cached:
+    @classmethod
+    def update(cls, header, attribute_type, **kwargs):
+        """
+        Store a graph extracted for `header` in the entry of its signature.
+
+        The header may list the columns in another order than the entry, so the graph is remapped to the
+        column order of the entry's header, which `fetch` and `template` remap from. Validated entries are
+        kept as they are.
+        """
+        cached = cls._find(header)
+        if cached is None or cached.get_validation_state(attribute_type):
+            return
+        if "graph" in kwargs:
+            kwargs["graph"] = remap_graph(kwargs["graph"], header_columns(header), header_columns(cached.header))
+        for key, value in kwargs.items():
+            if not hasattr(cached, key):
+                raise AttributeError(f"{cls.__name__} has no attribute '{key}'")
+            setattr(cached, key, value)
+        cached.save(update_fields=list(kwargs))
+
+    @classmethod
+    def fetch(cls, header):
+        columns = header_columns(header)
+        if cached := cls._find(header):
             if cached.get_validation_state("graph"):
-                return cached.graph
+                return remap_graph(cached.graph, header_columns(cached.header), columns)
         else:
-            new_record = cls.objects.create(header=header)
-            new_record.save()
+            cls.objects.get_or_create(signature=header_signature(columns),
+                                      defaults={"header": header, "column_count": len(columns)})
+        return cls.fetch_similar(header)
+
+    @classmethod
+    def template(cls, header, signature=None):
+        """
+        Return the validated graph registered for the signature of `header`, bound to its column order.
+
+        Tables with a template can be imported without running the extraction stages. If `signature` is
+        given, the header has to match that template.
+        """
+        if signature is not None and header_signature(header_columns(header)) != signature:
+            return None
+        if (cached := cls._find(header)) and cached.get_validation_state("graph"):
+            return remap_graph(cached.graph, header_columns(cached.header), header_columns(header))
+        return None
+
+    @classmethod
+    def fetch_similar(cls, header, max_difference=FULL_TABLE_CACHE_MAX_COLUMN_DIFF):
+        """
+        Return the validated graph of the most similar other header, adapted to `header`.
+
+        Only entries whose column count is within `max_difference` of the header are compared.
+        """
+        if max_difference <= 0:
+            return None
+        columns = header_columns(header)
+        candidates = cls.objects.filter(
+            validated_graph=True,
+            column_count__range=(len(columns) - max_difference, len(columns) + max_difference),
+        ).exclude(signature=header_signature(columns)).only("header", "graph")
+        best, best_difference = None, max_difference + 1
+        for candidate in candidates.iterator():
+            difference = column_difference(header_columns(candidate.header), columns)
+            if difference < best_difference:
+                best, best_difference = candidate, difference
+        if best is None:
+            return None
+        logger.info(f"Reusing the cached graph of a header differing by {best_difference} columns")
+        return remap_graph(best.graph, header_columns(best.header), columns)
+
+
+class StageCheckpoint(models.Model):
+    """
+    The result of one unit of an import stage, a column or a node/relationship pipeline, saved as soon as
+    it is computed. A retried or resumed stage of the same process only computes the units whose input
+    has no checkpoint.
+    """
+    process_id = models.CharField(max_length=255)
+    stage = models.CharField(max_length=64)
+    key = models.CharField(max_length=64)
+    result = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "importing_stage_checkpoint"
+        constraints = [
+            models.UniqueConstraint(fields=["process_id", "stage", "key"], name="unique_stage_checkpoint"),
+        ]
+
+    @staticmethod
+    def make_key(*inputs):
+        """Return the digest of the inputs of a unit."""
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, process_id, stage):
+        """
+        Return the checkpointed results of a stage by key. Checkpoints older than `STAGE_CHECKPOINT_MAX_AGE`
+        belong to abandoned imports and are dropped.
+        """
+        cls.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=STAGE_CHECKPOINT_MAX_AGE)).delete()
+        return dict(cls.objects.filter(process_id=process_id, stage=stage).values_list("key", "result"))
+
+    @classmethod
+    def save_result(cls, process_id, stage, key, result):
+        cls.objects.update_or_create(process_id=process_id, stage=stage, key=key, defaults={"result": result})
+
+    @classmethod
+    def clear(cls, process_id):
+        cls.objects.filter(process_id=process_id).delete()
 
 
 class ImportProcess(Process):
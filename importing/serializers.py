@@ -14,6 +14,13 @@ class CsvFileSerializer(serializers.Serializer):
 
 class LabelExtractSerializer(BaseProcessSerializer):
     context = serializers.CharField(required=True)
+    use_template = serializers.BooleanField(required=False, default=False)
+    auto = serializers.BooleanField(required=False, default=False)
+
+
+class TemplateImportSerializer(BaseProcessSerializer):
+    context = serializers.CharField(required=True)
+    signature = serializers.CharField(required=False, max_length=64)
 
 
 class AttributeExtractSerializer(BaseProcessSerializer):
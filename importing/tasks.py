@@ -1,7 +1,4 @@
-import json
-import csv
 import logging
-from io import StringIO
 
 from django.db import connection, close_old_connections
 
@@ -13,9 +10,10 @@ from importing.RelationshipExtraction.completeRelExtractor import (
     fullRelationshipsExtractor,
 )
 from importing.importer import TableImporter
-from importing.models import FullTableCache
+from importing.models import FullTableCache, StageCheckpoint
 from tasks.models import ProcessKeys, ProcessStatus
 from importing.utils.data_processing import sanitize_data
+from importing.utils.table_cache import get_table
 
 from tasks.utils.callback import send_callback
 
@@ -31,12 +29,10 @@ def extract_labels(task, process):
 
         file_id = process.file_id
         file_record = File.nodes.get(uid=file_id)
-        file_obj_bytes = file_record.get_file()
-        file_obj_str = file_obj_bytes.decode("utf-8")
-        file_obj = StringIO(file_obj_str)
+        table = get_table(uid=file_id, link=file_record.link)
 
         node_classifier = NodeClassifier(
-            data=file_obj,
+            data=table,
             context=process.context,
             file_link=file_record.link,
             file_name=file_record.name,
@@ -52,14 +48,7 @@ def extract_labels(task, process):
             task_cancelled(process)
             return
 
-        labels = {element["header"]: [element["1_label"], element["column_values"][0]] for element in node_classifier.results}
-        sanitized_labels = sanitize_data(labels)
-
-        if task.is_cancelled():
-            task_cancelled(process)
-            return
-
-        process.labels = sanitized_labels
+        process.labels = label_results(node_classifier)
         process.status = ProcessStatus.COMPLETED
         process.save()
     except Exception as e:
@@ -106,15 +95,7 @@ def extract_attributes(task, process):
             task_cancelled(process)
             return
 
-        attributes = {
-            element["header"]: {
-                "Label": element["1_label"],
-                "Attribute": element["1_attribute"],
-            }
-            for element in attribute_classifier.results
-        }
-
-        process.attributes = attributes
+        process.attributes = attribute_results(attribute_classifier)
         process.status = ProcessStatus.COMPLETED
         process.save()
     except Exception as e:
@@ -161,9 +142,7 @@ def extract_nodes(task, process):
             task_cancelled(process)
             return
 
-        graph = json.loads(str(node_extractor.results).replace("'", '"'))
-
-        process.nodes = graph
+        process.nodes = node_extractor.results
         process.status = ProcessStatus.COMPLETED
         process.save()
     except Exception as e:
@@ -242,7 +221,11 @@ def import_graph(task, process, request_data):
             task_cancelled(process)
             return
 
-        FullTableCache.update(request_data["session"], graph)
+        # template imports carry no session header, their graph is the cached one
+        session = request_data.get("session")
+        if session and not request_data.get("template"):
+            FullTableCache.update(session, "graph", graph=graph)
+        StageCheckpoint.clear(process.process_id)
 
         process.status = ProcessStatus.COMPLETED
         process.save()
@@ -258,6 +241,79 @@ def import_graph(task, process, request_data):
         connection.close()
 
 
+def run_import(task, process):
+    """
+    Runs all import stages as one job ("auto" mode).
+
+    The file record and the parsed table are fetched once and every stage hands its results to the next one
+    in memory. After each stage its results are saved to the process row, so the progress stays visible and
+    the stage results can be inspected, and the job stops between stages if it was cancelled.
+    """
+    close_old_connections()
+    try:
+        file_record = File.nodes.get(uid=process.file_id)
+        table = get_table(uid=process.file_id, link=file_record.link)
+        kwargs = {"context": process.context, "file_link": file_record.link, "file_name": file_record.name}
+
+        def checkpoint(key, value):
+            setattr(process, key, value)
+            process.save(update_fields=[key, "updated_at"])
+            return not task.is_cancelled()
+
+        node_classifier = NodeClassifier(data=table, **kwargs)
+        node_classifier.run()
+        if not checkpoint(ProcessKeys.LABELS, label_results(node_classifier)):
+            return task_cancelled(process)
+
+        attribute_classifier = AttributeClassifier(prepare_attribute_data(process.labels), **kwargs)
+        attribute_classifier.run()
+        if not checkpoint(ProcessKeys.ATTRIBUTES, attribute_results(attribute_classifier)):
+            return task_cancelled(process)
+
+        node_extractor = NodeExtractor(data=prepare_node_data(process.file_id, process.attributes), **kwargs)
+        node_extractor.run()
+        if not checkpoint(ProcessKeys.NODES, node_extractor.results):
+            return task_cancelled(process)
+
+        relationships_extractor = fullRelationshipsExtractor(process.nodes, process.context, table.header,
+                                                             table.first_row)
+        relationships_extractor.run()
+        if not checkpoint(ProcessKeys.GRAPH, relationships_extractor.results):
+            return task_cancelled(process)
+
+        TableImporter(process.graph, file_record.link, process.context).run()
+        FullTableCache.update(table.header_line.lower(), "graph", graph=process.graph)
+        StageCheckpoint.clear(process.process_id)
+
+        process.status = ProcessStatus.COMPLETED
+        process.save()
+    except Exception as e:
+        import traceback
+
+        logger.exception(f"Exception occurred during auto import: {e}", exc_info=True)
+        process.status = ProcessStatus.FAILED
+        process.error_message = traceback.format_exc()
+        process.save()
+    finally:
+        send_callback(process.process_id, ProcessKeys.IMPORT)
+        connection.close()
+
+
+def label_results(node_classifier):
+    labels = {element["header"]: [element["1_label"], element["column_values"][0]] for element in node_classifier.results}
+    return sanitize_data(labels)
+
+
+def attribute_results(attribute_classifier):
+    return {
+        element["header"]: {
+            "Label": element["1_label"],
+            "Attribute": element["1_attribute"],
+        }
+        for element in attribute_classifier.results
+    }
+
+
 def prepare_attribute_data(labels):
     input_data = [{"column_values": [value[1]], "header": key, "1_label": value[0]} for key, value in labels.items()]
     for index, item in enumerate(input_data):
@@ -266,39 +322,14 @@ def prepare_attribute_data(labels):
 
 
 def prepare_node_data(file_id, attributes):
-    file_record = File.nodes.get(uid=file_id)
-    file_obj_bytes = file_record.get_file()
-    file_obj_str = file_obj_bytes.decode("utf-8")
-    file_obj = StringIO(file_obj_str)
-    csv_reader = csv.reader(file_obj)
-
-    first_row = next(csv_reader)
-    column_values = [[] for _ in range(len(first_row))]
-
-    for row in csv_reader:
-        for i, value in enumerate(row):
-            if value != "" and len(column_values[i]) < 4:
-                column_values[i].append(value)
-
-    file_obj.seek(0)
-
-    first_line = file_obj.readline().strip()
-    first_line = first_line.split(",")
-    input = [{"index": i, "column_values": column_values[i], "header": header, "1_label": attributes[header]["Label"], "1_attribute": attributes[header]["Attribute"]} for i, header in enumerate(first_line)]
+    table = get_table(uid=file_id)
+    input = [{"index": i, "column_values": table.samples(i, 4), "header": header, "1_label": attributes[header]["Label"], "1_attribute": attributes[header]["Attribute"]} for i, header in enumerate(table.header)]
     return input
 
 
 def prepare_graph_data(file_id):
-    file_record = File.nodes.get(uid=file_id)
-    file_obj_bytes = file_record.get_file()
-    file_obj_str = file_obj_bytes.decode("utf-8")
-    file_obj = StringIO(file_obj_str)
-    csv_reader = csv.reader(file_obj)
-
-    header = next(csv_reader)
-    first_row = next(csv_reader)
-
-    return header, first_row
+    table = get_table(uid=file_id)
+    return table.header, table.first_row
 
 
 def task_cancelled(process):
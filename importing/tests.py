@@ -1,3 +1,186 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from importing.models import FullTableCache
+from importing.utils.column_profiler import DistinctCounter, profile_csv
+from importing.utils.ingestion import BatchIngestor, build_ingestion_query
+from importing.utils.table_signature import column_difference, header_columns, header_signature, remap_graph
+
+
+class ProfileCsvTest(SimpleTestCase):
+
+    def test_profiles_columns_in_one_pass(self):
+        stream = io.StringIO("id,temperature,name\r\n1,20.5,a\r\n2,,b\r\n3,1e3,a\r\n", newline="")
+        profile = profile_csv(stream, chunk_rows=2, n_samples=2)
+        self.assertEqual((profile.header_line, profile.header), ("id,temperature,name", ["id", "temperature", "name"]))
+        self.assertEqual((profile.first_row, profile.row_count), (["1", "20.5", "a"], 3))
+        identifier, temperature, name = profile.columns
+        self.assertEqual(identifier.samples, ["1", "2"])
+        self.assertEqual((temperature.nulls, temperature.numeric), (1, 2))
+        self.assertAlmostEqual(temperature.null_ratio, 1 / 3)
+        self.assertEqual(temperature.inferred_type, "numeric")
+        self.assertEqual((name.distinct_values, name.distinct_count, name.distinct_exact), (["a", "b"], 2, True))
+
+    def test_rows_wider_than_the_header_add_columns(self):
+        profile = profile_csv(io.StringIO("a\n1\n2,x\n", newline=""))
+        self.assertEqual(len(profile.columns), 2)
+        extra = profile.columns[1]
+        self.assertEqual((extra.header, extra.count, extra.nulls, extra.samples), ("", 2, 1, ["x"]))
+
+    def test_empty_table(self):
+        profile = profile_csv(io.StringIO("a,b\n", newline=""))
+        self.assertEqual((profile.first_row, profile.row_count), ([], 0))
+        self.assertEqual(profile.columns[0].inferred_type, "empty")
+
+    def test_distinct_counts_are_estimated_beyond_the_cap(self):
+        counter = DistinctCounter(cap=10)
+        for i in range(5000):
+            counter.add(str(i % 2000))
+        self.assertFalse(counter.exact)
+        self.assertEqual(len(counter.values), 10)
+        self.assertAlmostEqual(counter.count, 2000, delta=200)
+
+
+class BatchIngestorTest(SimpleTestCase):
+
+    GRAPH = {
+        "nodes": [
+            {"id": "1", "label": "matter", "attributes": {
+                "name": [{"value": "Pt", "index": 0}, {"value": "catalyst", "index": "inferred"}]}},
+            {"id": "2", "label": "property", "attributes": {
+                "name": {"value": "temperature", "index": "inferred"},
+                "value": {"value": "25", "index": 1},
+                "unit": {"value": "°C", "index": "inferred"},
+                "error": {"value": "MISSING_VALUE_OR_OPERATOR", "index": "missing"}}},
+        ],
+        "relationships": [{"connection": ["1", "2"], "rel_type": "HAS_PROPERTY"}],
+    }
+    MAPPING = [{"name": "Pt", "label": "MATTER", "id": "onto-pt"},
+               {"name": "temperature", "label": "PROPERTY", "id": "onto-temperature"}]
+
+    def test_query_depends_on_the_shape_only(self):
+        ingestor = BatchIngestor(self.GRAPH, self.MAPPING)
+        self.assertEqual(ingestor.shape, (("Matter", "Property"), ((0, "HAS_PROPERTY", 1),)))
+        query = build_ingestion_query(*ingestor.shape)
+        self.assertIs(query, BatchIngestor(self.GRAPH, []).query)
+        self.assertIn("CREATE (n0:`Matter` {flag: 'dev'}) SET n0 += row.n0", query)
+        self.assertIn("MERGE (n0)-[:`HAS_PROPERTY`]->(n1)", query)
+        self.assertIn("UNWIND row.ontology AS link", query)
+
+    def test_build_row(self):
+        ingestor = BatchIngestor(self.GRAPH, self.MAPPING)
+        parameters = ingestor.build_row(["Pt", "25"])
+        matter, quantity = parameters["n0"], parameters["n1"]
+        self.assertEqual(matter["name"], ["Pt", "catalyst"])
+        self.assertEqual({key: quantity[key] for key in ("name", "value", "unit", "unit_si")},
+                         {"name": "temperature", "value": "25", "unit": "°C", "unit_si": "K"})
+        self.assertAlmostEqual(quantity["value_si"], 298.15)
+        self.assertNotIn("error", quantity)
+        self.assertEqual(parameters["ontology"], [[0, "onto-pt"], [1, "onto-temperature"]])
+        self.assertEqual(ingestor.relationships([parameters]),
+                         [(matter["uid"], "HAS_PROPERTY", quantity["uid"]),
+                          (matter["uid"], "IS_A", "onto-pt"), (quantity["uid"], "IS_A", "onto-temperature")])
+
+    def test_empty_and_missing_cells_are_null(self):
+        parameters = BatchIngestor(self.GRAPH, self.MAPPING).build_row([""])
+        self.assertEqual(parameters["n0"]["name"], ["catalyst"])
+        self.assertIsNone(parameters["n1"]["value"])
+        self.assertNotIn("value_si", parameters["n1"])
+
+
+class TableSignatureTest(SimpleTestCase):
+
+    def test_header_columns_are_folded(self):
+        self.assertEqual(header_columns('Sample ID, Temperature  (°C),"a,b"'), ["sample id", "temperature (°c)", "a,b"])
+
+    def test_signature_is_independent_of_the_order(self):
+        self.assertEqual(header_signature(["a", "b", "c"]), header_signature(["c", "a", "b"]))
+        self.assertNotEqual(header_signature(["a", "b"]), header_signature(["a", "b", "b"]))
+        self.assertEqual(column_difference(["a", "b", "b"], ["b", "c"]), 3)
+
+
+class RemapGraphTest(SimpleTestCase):
+
+    GRAPH = {"nodes": [
+        {"id": "1", "label": "matter", "attributes": {
+            "name": [{"value": "Pt", "index": 0}, {"value": "catalyst", "index": "inferred"}]}},
+        {"id": "2", "label": "property", "attributes": {
+            "name": {"value": "temperature", "index": "inferred"},
+            "value": {"value": "25", "index": "1"},
+            "unit": {"value": "K", "index": 2},
+            "error": {"value": "MISSING_VALUE_OR_OPERATOR", "index": "missing"}}},
+    ]}
+
+    def test_reordered_columns_move_their_references(self):
+        graph = remap_graph(self.GRAPH, ["name", "t", "unit"], ["unit", "name", "t"])
+        matter, quantity = graph["nodes"]
+        self.assertEqual(matter["attributes"]["name"], [{"value": "Pt", "index": 1},
+                                                       {"value": "catalyst", "index": "inferred"}])
+        # the index keeps the type it was stored with
+        self.assertEqual(quantity["attributes"]["value"]["index"], "2")
+        self.assertEqual(quantity["attributes"]["unit"]["index"], 0)
+        self.assertEqual(quantity["attributes"]["error"]["index"], "missing")
+        self.assertEqual(self.GRAPH["nodes"][0]["attributes"]["name"][0]["index"], 0)
+
+    def test_dropped_columns_drop_their_values(self):
+        graph = remap_graph(self.GRAPH, ["name", "t", "unit"], ["t", "name"])
+        matter, quantity = graph["nodes"]
+        self.assertEqual(matter["attributes"]["name"][0]["index"], 1)
+        self.assertNotIn("unit", quantity["attributes"])
+        self.assertEqual(set(quantity["attributes"]), {"name", "value", "error"})
+
+    def test_repeated_columns_are_matched_in_order(self):
+        nodes = [{"attributes": {"value": [{"value": "1", "index": 0}, {"value": "2", "index": 1}]}}]
+        graph = remap_graph(nodes, ["x", "x"], ["y", "x", "x"])
+        self.assertEqual([value["index"] for value in graph[0]["attributes"]["value"]], [1, 2])
+
+    def test_unchanged_header_returns_the_graph(self):
+        self.assertIs(remap_graph(self.GRAPH, ["a", "b"], ["a", "b"]), self.GRAPH)
+
+
+class FullTableCacheTest(TestCase):
+
+    HEADER = "name,temperature,unit"
+    GRAPH = [{"id": "1", "label": "matter", "attributes": {"name": {"value": "Pt", "index": 0}}},
+             {"id": "2", "label": "property", "attributes": {"value": {"value": "25", "index": 1},
+                                                             "unit": {"value": "K", "index": 2}}}]
+
+    def create(self, header, validated=True):
+        columns = header_columns(header)
+        return FullTableCache.objects.create(signature=header_signature(columns), column_count=len(columns),
+                                             header=header, validated_graph=validated, graph=self.GRAPH)
+
+    @staticmethod
+    def indices(graph):
+        return [value["index"] for node in graph for value in node["attributes"].values()]
+
+    def test_template_is_bound_to_the_header_order(self):
+        self.create(self.HEADER)
+        self.assertEqual(self.indices(FullTableCache.template(self.HEADER)), [0, 1, 2])
+        self.assertEqual(self.indices(FullTableCache.template("Unit, Name ,TEMPERATURE")), [1, 2, 0])
+
+    def test_template_needs_a_validated_matching_entry(self):
+        self.create(self.HEADER, validated=False)
+        self.assertIsNone(FullTableCache.template(self.HEADER))
+        self.assertIsNone(FullTableCache.template("name,temperature"))
+
+    def test_template_checks_the_requested_signature(self):
+        self.create(self.HEADER)
+        self.assertIsNone(FullTableCache.template(self.HEADER, signature=header_signature(["name"])))
+        signature = header_signature(header_columns(self.HEADER))
+        self.assertIsNotNone(FullTableCache.template(self.HEADER, signature=signature))
+
+    def test_similar_headers_reuse_a_validated_graph(self):
+        self.create(self.HEADER)
+        graph = FullTableCache.fetch("temperature,name,unit,comment")
+        self.assertEqual(self.indices(graph), [1, 0, 2])
+        self.assertIsNone(FullTableCache.fetch("temperature,comment,remark"))
+
+    def test_fetch_creates_the_entry(self):
+        self.assertIsNone(FullTableCache.fetch(self.HEADER))
+        cached = FullTableCache.objects.get(signature=header_signature(header_columns(self.HEADER)))
+        self.assertEqual((cached.header, cached.column_count, cached.validated_graph), (self.HEADER, 3, False))
+        FullTableCache.update("unit,name,temperature", "graph", graph=self.GRAPH)
+        cached.refresh_from_db()
+        self.assertEqual(self.indices(cached.graph), [2, 0, 1])
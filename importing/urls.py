@@ -6,6 +6,7 @@ from importing.views import (
     NodeExtractView,
     GraphExtractView,
     GraphImportView,
+    TemplateImportView,
     CancelTaskView,
     ProcessReportView, 
     ProcessDeleteView
@@ -17,6 +18,7 @@ urlpatterns = [
     path('api/import/node-extract', NodeExtractView.as_view(), name='node-extract'),
     path('api/import/graph-extract', GraphExtractView.as_view(), name='graph-extract',),
     path('api/import/graph-import', GraphImportView.as_view(), name='graph-import',),
+    path('api/import/template-import', TemplateImportView.as_view(), name='template-import',),
     path('api/import/cancel', CancelTaskView.as_view(), name='process-cancel',),
     path('api/import/report', ProcessReportView.as_view(), name='process-report',),
     path('api/import/delete', ProcessDeleteView.as_view(), name='process-delete',)
@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import math
+import re
+from itertools import islice
+
+from quantulum3 import parser
+
+from graphutils.config import PROFILE_CHUNK_ROWS, PROFILE_SAMPLES, PROFILE_DISTINCT_CAP, PROFILE_NUMERIC_RATIO
+
+NUMBER_PATTERN = re.compile(r"^\s*[-+]?(\d+([.,]\d*)?|[.,]\d+)([eE][-+]?\d+)?\s*$")
+NUMBER_WITH_TEXT_PATTERN = re.compile(r"\d+\.?\d*")
+
+
+class DistinctCounter:
+    """
+    Counts distinct values exactly up to `cap`, then switches to a HyperLogLog sketch.
+
+    The first `cap` distinct values are kept in `values` in order of appearance either way, so consumers
+    that only need a bounded set of representatives do not have to care whether the count is exact.
+    """
+
+    PRECISION = 12
+
+    def __init__(self, cap=PROFILE_DISTINCT_CAP):
+        self.cap = cap
+        self.values = {}
+        self._registers = None
+
+    @property
+    def exact(self):
+        return self._registers is None
+
+    def _hash(self, value):
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def _add_to_sketch(self, value):
+        h = self._hash(value)
+        bits = 64 - self.PRECISION
+        remainder = h & ((1 << bits) - 1)
+        rank = bits - remainder.bit_length() + 1
+        register = h >> bits
+        if rank > self._registers[register]:
+            self._registers[register] = rank
+
+    def add(self, value):
+        if self._registers is not None:
+            self._add_to_sketch(value)
+        elif value not in self.values:
+            if len(self.values) < self.cap:
+                self.values[value] = None
+            else:
+                self._registers = bytearray(1 << self.PRECISION)
+                for known in self.values:
+                    self._add_to_sketch(known)
+                self._add_to_sketch(value)
+
+    @property
+    def count(self):
+        if self.exact:
+            return len(self.values)
+        m = len(self._registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return max(int(round(estimate)), len(self.values))
+
+
+class ColumnProfile:
+    """
+    Bounded-memory summary of one table column.
+
+    Attributes:
+        index (int): The column index.
+        header (str): The column header.
+        samples (list): The first non-empty cells in row order.
+        count (int): The number of data rows seen.
+        nulls (int): The number of empty cells.
+        numeric (int): The number of numeric cells.
+    """
+
+    def __init__(self, index, header, n_samples=PROFILE_SAMPLES, distinct_cap=PROFILE_DISTINCT_CAP):
+        self.index = index
+        self.header = header
+        self.n_samples = n_samples
+        self.samples = []
+        self.count = 0
+        self.nulls = 0
+        self.numeric = 0
+        self.distinct = DistinctCounter(distinct_cap)
+
+    def update(self, value):
+        self.count += 1
+        if value == "":
+            self.nulls += 1
+            return
+        if len(self.samples) < self.n_samples:
+            self.samples.append(value)
+        if NUMBER_PATTERN.match(value):
+            self.numeric += 1
+        self.distinct.add(value)
+
+    @property
+    def null_ratio(self):
+        return self.nulls / self.count if self.count else 1.0
+
+    @property
+    def distinct_count(self):
+        return self.distinct.count
+
+    @property
+    def distinct_values(self):
+        """All distinct non-empty cells if `distinct_exact`, otherwise the first `distinct_cap` of them."""
+        return list(self.distinct.values)
+
+    @property
+    def distinct_exact(self):
+        return self.distinct.exact
+
+    @property
+    def inferred_type(self):
+        """
+        Returns "empty", "numeric", "unit" (numbers with units, judged on the samples) or "text".
+        """
+        filled = self.count - self.nulls
+        if not filled:
+            return "empty"
+        if self.numeric / filled >= PROFILE_NUMERIC_RATIO:
+            return "numeric"
+        with_units = [sample for sample in self.samples
+                      if NUMBER_WITH_TEXT_PATTERN.search(sample) and
+                      any(quantity.unit.name != "dimensionless" for quantity in parser.parse(sample))]
+        if len(with_units) * 2 > len(self.samples):
+            return "unit"
+        return "text"
+
+    def as_dict(self):
+        return {
+            "index": self.index,
+            "header": self.header,
+            "samples": self.samples,
+            "null_ratio": self.null_ratio,
+            "distinct_count": self.distinct_count,
+            "distinct_exact": self.distinct_exact,
+            "inferred_type": self.inferred_type,
+        }
+
+
+class TableProfile:
+    """
+    Result of a profiling pass: the header, the first data row and one `ColumnProfile` per column.
+    """
+
+    def __init__(self, header_line, header, first_row, columns, row_count):
+        self.header_line = header_line
+        self.header = header
+        self.first_row = first_row
+        self.columns = columns
+        self.row_count = row_count
+
+
+def profile_csv(stream, chunk_rows=PROFILE_CHUNK_ROWS, n_samples=PROFILE_SAMPLES, distinct_cap=PROFILE_DISTINCT_CAP):
+    """
+    Profile a CSV in a single streaming pass.
+
+    Rows are read `chunk_rows` at a time, so memory is bounded by the chunk size and the per-column
+    sample and distinct caps, not by the size of the file.
+
+    Args:
+        stream: A text stream opened with newline="".
+        chunk_rows (int): Number of rows read per chunk.
+        n_samples (int): Number of leading non-empty cells kept per column.
+        distinct_cap (int): Number of distinct values counted exactly per column.
+
+    Returns:
+        TableProfile: The table profile.
+    """
+    header_line = stream.readline()
+    header = next(csv.reader([header_line]), [])
+    columns = [ColumnProfile(i, value, n_samples, distinct_cap) for i, value in enumerate(header)]
+    first_row = None
+    row_count = 0
+    reader = csv.reader(stream)
+    while chunk := list(islice(reader, chunk_rows)):
+        if first_row is None:
+            first_row = chunk[0]
+        for row in chunk:
+            # rows wider than the header add columns without a header
+            for i in range(len(columns), len(row)):
+                columns.append(ColumnProfile(i, "", n_samples, distinct_cap))
+                columns[i].count = row_count
+                columns[i].nulls = row_count
+            for i, column in enumerate(columns):
+                column.update(row[i] if i < len(row) else "")
+            row_count += 1
+    return TableProfile(header_line.strip(), header, first_row or [], columns, row_count)
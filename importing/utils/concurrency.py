@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from django.db import connection
+from pydantic import BaseModel
+
+from graphutils.config import LLM_MAX_CONCURRENCY, LLM_CHAIN_TIMEOUT
+from importing.models import StageCheckpoint
+from tasks.task_manager import current_task
+
+logger = logging.getLogger(__name__)
+
+# all pipelines of the process run on one event loop thread, their blocking steps on one pool; a step
+# of a timed out pipeline gives up its slot and finishes in the background within `LLM_REQUEST_TIMEOUT`
+_loop = None
+_loop_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2 * LLM_MAX_CONCURRENCY, thread_name_prefix="llm-chain")
+_llm_slots = None
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-chain-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _get_slots():
+    # only called on the loop thread, so the semaphore is created once and bound to that loop
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_slots
+
+
+def _dump(result):
+    return {"schema": f"{type(result).__module__}.{type(result).__qualname__}", "json": result.model_dump_json()}
+
+
+def _restore(checkpoint):
+    module, name = checkpoint["schema"].rsplit(".", 1)
+    return getattr(importlib.import_module(module), name).model_validate_json(checkpoint["json"])
+
+
+def _save_checkpoint(process_id, stage, key, result):
+    try:
+        StageCheckpoint.save_result(process_id, stage, key, _dump(result))
+    finally:
+        connection.close()
+
+
+async def _run_pipeline(name, steps, data, timeout, task, checkpoint):
+    loop = asyncio.get_running_loop()
+
+    async def run():
+        result = data
+        for step in steps:
+            if result is None:
+                # nothing to extract or validate, do not occupy an LLM slot
+                return None
+            if task is not None and task.is_cancelled():
+                logger.info(f"Chain {name} stopped, its job was cancelled")
+                return None
+            async with _get_slots():
+                result = await loop.run_in_executor(_executor, step.invoke, result, {"run_name": name})
+        return result
+
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Chain {name} timed out after {timeout}s, its results are dropped")
+        return None
+    logger.debug(f"Chain {name} finished in {time.perf_counter() - start:.1f}s")
+    if checkpoint is not None and isinstance(result, BaseModel):
+        await loop.run_in_executor(_executor, _save_checkpoint, *checkpoint, result)
+    return result
+
+
+def run_pipelines(pipelines: Dict[str, List[Any]], data, timeout: float = LLM_CHAIN_TIMEOUT,
+                  stage: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run independent chains of LLM steps as a bounded-concurrency async fan-out.
+
+    Every pipeline is a list of runnables that are applied one after the other, so each step starts as soon
+    as the previous step of the same pipeline finished, independently of the other pipelines. At most
+    `LLM_MAX_CONCURRENCY` steps talk to the LLM at the same time across all imports of the process.
+    A pipeline that does not finish within `timeout` seconds yields None and frees its slot at once, its
+    running step is left to finish within `LLM_REQUEST_TIMEOUT`; errors of a step are raised.
+    When the job running the pipelines is cancelled, no further steps are started and the unfinished
+    pipelines yield None.
+
+    With a `stage`, the result of every pipeline run by a job is checkpointed as soon as it finished, and
+    pipelines whose input already has a checkpoint of the job's process are not run again.
+
+    Args:
+        pipelines (Dict[str, List[Runnable]]): The steps of each pipeline by name.
+        data: The input of the first step of every pipeline.
+        timeout (float): The time limit of a single pipeline in seconds.
+        stage (str): The import stage the pipelines belong to, enables the checkpoints.
+
+    Returns:
+        Dict[str, Any]: The output of the last step of each pipeline by name.
+    """
+    task = current_task()
+    process_id = getattr(task, "process_id", None) if stage else None
+    keys = {name: StageCheckpoint.make_key(name, data) for name in pipelines} if process_id else {}
+    checkpoints = StageCheckpoint.load(process_id, stage) if process_id else {}
+    restored = {name: _restore(checkpoints[key]) for name, key in keys.items() if key in checkpoints}
+    pending = {name: steps for name, steps in pipelines.items() if name not in restored}
+    if restored:
+        logger.info(f"Reusing the checkpointed results of {', '.join(restored)}")
+
+    async def run_all():
+        results = await asyncio.gather(*[
+            _run_pipeline(name, steps, data, timeout, task,
+                          (process_id, stage, keys[name]) if process_id else None)
+            for name, steps in pending.items()
+        ])
+        results = {**restored, **dict(zip(pending, results))}
+        return {name: results[name] for name in pipelines}
+
+    # the shared loop also serves callers that run inside an event loop themselves
+    return asyncio.run_coroutine_threadsafe(run_all(), _get_loop()).result()
@@ -12,4 +12,13 @@ def store_file(file_obj):
         file_record.save()
         return file_record
     except Exception as e:
-        raise ValueError(f"File storage failed: {e}")
\ No newline at end of file
+        raise ValueError(f"File storage failed: {e}")
+
+def read_header_line(file_obj):
+    """Return the first line of an uploaded file, as the table cache reads it, without storing the file."""
+    file_obj.seek(0)
+    line = file_obj.readline()
+    file_obj.seek(0)
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    return line.strip()
@@ -0,0 +1,187 @@
+import logging
+import time
+import uuid
+from functools import lru_cache
+from itertools import islice
+
+from neomodel import db
+
+from graphutils.config import INGESTION_BATCH_SIZE
+from graphutils.units import normalize_quantity
+
+logger = logging.getLogger(__name__)
+
+MISSING_VALUE = 'MISSING_VALUE_OR_OPERATOR'
+
+# callables receiving the (source uid, relationship type, target uid) triples of every committed batch
+_listeners = []
+
+
+def add_ingestion_listener(listener):
+    """
+    Register a callable that is called with the relationships written by every ingested batch.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+@lru_cache(maxsize=256)
+def build_ingestion_query(labels, relationships):
+    """
+    Build the parameterized Cypher template for one graph shape.
+
+    Every entry of `$rows` carries one property map per node template (`row.n<i>`, the uid
+    included) and the (node position, ontology uid) pairs to link (`row.ontology`). Templates only depend on the
+    shape, so they are built once and Neo4j can reuse the query plan across batches and imports.
+
+    Args:
+        labels (tuple): The node labels in template order.
+        relationships (tuple): (source position, relationship type, target position) triples.
+
+    Returns:
+        str: The Cypher template.
+    """
+    nodes = [f"n{i}" for i in range(len(labels))]
+    query_parts = ["UNWIND $rows AS row"]
+    query_parts += [f"CREATE ({node}:`{label}` {{flag: 'dev'}}) SET {node} += row.{node}"
+                    for node, label in zip(nodes, labels)]
+    query_parts += [f"MERGE (n{source})-[:`{rel_type}`]->(n{target})"
+                    for source, rel_type, target in relationships]
+    query_parts += [
+        f"WITH row, [{', '.join(nodes)}] AS nodes",
+        "UNWIND row.ontology AS link",
+        "MATCH (ontology:EMMOMatter|EMMOQuantity|EMMOProcess {uid: link[1]})",
+        "WITH nodes[link[0]] AS n, ontology",
+        "MERGE (n)-[:IS_A]->(ontology)",
+    ]
+    return "\n".join(query_parts)
+
+
+class BatchIngestor:
+    """
+    Writes an extracted graph for every row of a table with parameterized, batched statements.
+
+    The table is read locally and sent in batches of `batch_size` rows, each batch in its own
+    explicit write transaction, so memory on the database stays bounded by the batch size.
+
+    Attributes:
+        graph (dict): The extracted graph with "nodes" and "relationships".
+        mapping (list): The ontology mapping produced by the OntologyMapper.
+        batch_size (int): Number of table rows per transaction.
+    """
+
+    def __init__(self, graph, mapping, batch_size=INGESTION_BATCH_SIZE):
+        self.graph = graph
+        self.batch_size = batch_size
+        self.nodes = list(graph['nodes'])
+        self.positions = {str(node['id']): i for i, node in enumerate(self.nodes)}
+        self.ontology_ids = {(entry['name'], entry['label']): entry['id'] for entry in mapping}
+        self.stats = {}
+
+    @property
+    def shape(self):
+        labels = tuple(node['label'].capitalize() for node in self.nodes)
+        relationships = tuple((self.positions[str(rel['connection'][0])], rel['rel_type'],
+                               self.positions[str(rel['connection'][1])])
+                              for rel in self.graph['relationships'])
+        return labels, relationships
+
+    @property
+    def query(self):
+        return build_ingestion_query(*self.shape)
+
+    @staticmethod
+    def _value(attr_value, row):
+        index_value = attr_value.get('index', 'inferred')
+        if index_value == 'inferred' or index_value == 'missing':
+            return attr_value['value']
+        index_value = int(index_value)
+        # empty and missing cells are null, as with LOAD CSV
+        return row[index_value] if index_value < len(row) and row[index_value] != "" else None
+
+    def _node_properties(self, node, row):
+        properties = {}
+        for attr_name, attr_values in node['attributes'].items():
+            attr_values = [attr_values] if not isinstance(attr_values, list) else attr_values
+            values = [self._value(attr_value, row) for attr_value in attr_values
+                      if attr_value['value'] != MISSING_VALUE]
+            if len(values) == 1:
+                properties[attr_name] = values[0]
+            elif values:
+                properties[attr_name] = [value for value in values if value is not None]
+        if node['label'].capitalize() in ('Property', 'Parameter'):
+            # typed copy of the raw value for indexed range filters
+            value_si, unit_si = normalize_quantity(properties.get('value'), properties.get('unit'))
+            if value_si is not None:
+                properties['value_si'], properties['unit_si'] = value_si, unit_si
+        return properties
+
+    def build_row(self, row):
+        """
+        Turn one table row into the parameters of one `$rows` entry.
+        """
+        parameters = {}
+        ontology = []
+        for i, node in enumerate(self.nodes):
+            properties = self._node_properties(node, row)
+            # uids are assigned here so the written relationships are known without reading them back
+            properties['uid'] = str(uuid.uuid4())
+            parameters[f"n{i}"] = properties
+            names = properties.get('name')
+            for name in names if isinstance(names, list) else [names]:
+                if (ontology_id := self.ontology_ids.get((name, node['label'].upper()))) is not None:
+                    ontology.append([i, ontology_id])
+        parameters['ontology'] = ontology
+        return parameters
+
+    def relationships(self, batch):
+        """
+        Return the (source uid, relationship type, target uid) triples a batch writes, IS_A links included.
+        """
+        _, relationships = self.shape
+        triples = []
+        for parameters in batch:
+            triples += [(parameters[f"n{source}"]['uid'], rel_type, parameters[f"n{target}"]['uid'])
+                        for source, rel_type, target in relationships]
+            triples += [(parameters[f"n{i}"]['uid'], 'IS_A', ontology_id)
+                        for i, ontology_id in parameters['ontology']]
+        return triples
+
+    def run(self, rows):
+        """
+        Ingest the rows of a table.
+
+        Args:
+            rows (iterable): The data rows of the table, header excluded.
+
+        Returns:
+            dict: The number of rows and batches, the duration and the throughput in rows per second.
+        """
+        query = self.query
+        rows = iter(rows)
+        start = time.time()
+        row_count = 0
+        batch_count = 0
+        while batch := [self.build_row(row) for row in islice(rows, self.batch_size)]:
+            with db.write_transaction:
+                db.cypher_query(query, {'rows': batch})
+            if _listeners:
+                triples = self.relationships(batch)
+                for listener in _listeners:
+                    try:
+                        listener(triples)
+                    except Exception as e:
+                        logger.warning(f"Ingestion listener {listener} failed: {e}")
+            row_count += len(batch)
+            batch_count += 1
+            logger.debug(f"Ingested batch {batch_count} ({row_count} rows)")
+        duration = time.time() - start
+        self.stats = {
+            'rows': row_count,
+            'batches': batch_count,
+            'duration': duration,
+            'rows_per_second': row_count / duration if duration else 0.0,
+        }
+        logger.info(f"Ingested {row_count} rows in {batch_count} batches "
+                    f"({self.stats['rows_per_second']:.1f} rows/s)")
+        return self.stats
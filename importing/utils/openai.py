@@ -1,37 +1,141 @@
+import json
+import logging
 import os
+import threading
 
+from django.conf import settings
 from tenacity import retry, stop_after_attempt, wait_random_exponential
+from langchain_openai import ChatOpenAI
 from openai import OpenAI
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from graphutils.cache import LLMResponseCache
+from graphutils.ratelimit import get_http_client
+from graphutils.singleflight import SingleFlight
+from graphutils.config import CHAT_GPT_MODEL, LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, \
+    LLM_REQUEST_TIMEOUT
 
+logger = logging.getLogger(__name__)
+
+client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=get_http_client())
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+_chat_models = {}
+_flight = SingleFlight("llm")
+
+
+def get_chat_model(model=CHAT_GPT_MODEL) -> ChatOpenAI:
+    """
+    Return the process-wide chat model for `model`.
+
+    The model keeps its HTTP connection pool, so all extraction chains share one pool instead of
+    opening new connections for every request. Requests pass the process-wide rate limiter.
+    """
+    if model not in _chat_models:
+        with _llm_cache_lock:
+            if model not in _chat_models:
+                _chat_models[model] = ChatOpenAI(model_name=model, openai_api_key=os.getenv("OPENAI_API_KEY"),
+                                                   http_client=get_http_client(), timeout=LLM_REQUEST_TIMEOUT)
+    return _chat_models[model]
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Return the process-wide LLM response cache stored in `settings.CACHE_DIR`.
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(os.path.join(settings.CACHE_DIR, "llm_responses.sqlite3"),
+                                              max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL)
+    return _llm_cache
+
+
+def _chain_model(chain):
+    """Returns the name of the chat model a runnable chain talks to, None if it contains no chat model."""
+    runnables = [chain]
+    while runnables:
+        runnable = runnables.pop()
+        if isinstance(model := getattr(runnable, "model_name", None), str):
+            return model
+        # sequences list their steps, bindings like `with_config` or `bind_tools` wrap the bound runnable
+        runnables.extend(getattr(runnable, "steps", None) or [])
+        if (bound := getattr(runnable, "bound", None)) is not None:
+            runnables.append(bound)
+    return None
+
+
+def invoke_cached(chain, prompt, schema, inputs, stage):
+    """
+    Invoke a structured output chain, answering repeated requests from the LLM response cache.
+
+    The cache key covers the model of the chain, the output schema and the fully rendered prompt, which
+    contains the setup messages, the few-shot examples and the query. Concurrent callers with the same key
+    share one call. Chains without a recognizable chat model are invoked uncached.
+
+    Args:
+        chain: The runnable built from `prompt` that returns an instance of `schema`.
+        prompt (ChatPromptTemplate): The prompt template of the chain.
+        schema: The pydantic model of the structured output.
+        inputs (dict): The input variables of the prompt.
+        stage (str): The import stage the request belongs to, used for the hit/miss metrics.
+
+    Returns:
+        The structured output of the chain.
+    """
+    if (model := _chain_model(chain)) is None:
+        return chain.invoke(inputs)
+    cache = get_llm_cache() if LLM_CACHE_ENABLED else None
+    messages = [(message.type, message.content) for message in prompt.format_messages(**inputs)]
+    key = LLMResponseCache.make_key(model, json.dumps(schema.model_json_schema(), sort_keys=True),
+                                    json.dumps(messages))
+    if cache is not None and (response := cache.get_response(stage, key)) is not None:
+        logger.debug(f"LLM cache hit for stage {stage}")
+        return schema.model_validate_json(response)
+
+    def request():
+        output = chain.invoke(inputs)
+        if cache is not None and isinstance(output, schema):
+            cache.set_response(key, output.model_dump_json())
+        return output
+
+    # identical requests of concurrent imports share one call
+    return _flight.do(key, request)
+
+
+def _cached_chat(model, conversation_history, max_tokens, stage):
+    cache = get_llm_cache() if LLM_CACHE_ENABLED else None
+    key = LLMResponseCache.make_key(model, max_tokens, json.dumps(conversation_history))
+    if cache is not None and (response := cache.get_response(stage, key)) is not None:
+        return response
+
+    def request():
+        response = client.chat.completions.create(model=model,
+        messages=conversation_history,
+        max_tokens=max_tokens,
+        n=1,
+        stop=None,
+        temperature=0)
+        content = [res.message.content for res in response.choices][0]
+        if cache is not None and content is not None:
+            cache.set_response(key, content)
+        return content
+
+    return _flight.do(key, request)
 
 
 @retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(6))
-def chat_with_gpt4(setup_message=[], prompt='', api_key=os.environ.get("OPENAI_API_KEY"), langsmith_api_key=os.environ.get("LANGSMITH_API_KEY")):
+def chat_with_gpt4(setup_message=[], prompt='', api_key=os.environ.get("OPENAI_API_KEY"), langsmith_api_key=os.environ.get("LANGSMITH_API_KEY"), stage="chat"):
     apikey = langsmith_api_key
 
-    conversation_history = setup_message
-    conversation_history.append({"role": "user", "content": prompt})
+    conversation_history = [*setup_message, {"role": "user", "content": prompt}]
 
-    response = client.chat.completions.create(model="gpt-4-1106-preview",
-    messages=conversation_history,
-    max_tokens=2500,
-    n=1,
-    stop=None,
-    temperature=0)
-    return [res.message.content for res in response.choices][0]
+    return _cached_chat("gpt-4-1106-preview", conversation_history, 2500, stage)
 
 
-def chat_with_gpt3(setup_message=[], prompt='', api_key=os.environ.get("OPENAI_API_KEY")):
+def chat_with_gpt3(setup_message=[], prompt='', api_key=os.environ.get("OPENAI_API_KEY"), stage="chat"):
 
-    conversation_history = setup_message
-    conversation_history.append({"role": "user", "content": prompt})
+    conversation_history = [*setup_message, {"role": "user", "content": prompt}]
 
-    response = client.chat.completions.create(model="gpt-3.5-turbo",
-    messages=conversation_history,
-    max_tokens=1000,
-    n=1,
-    stop=None,
-    temperature=0)
-    return [res.message.content for res in response.choices][0]
\ No newline at end of file
+    return _cached_chat("gpt-3.5-turbo", conversation_history, 1000, stage)
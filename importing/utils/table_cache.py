@@ -0,0 +1,226 @@
+import csv
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+
+from graphutils.config import TABLE_CACHE_MAX_TABLES, TABLE_CACHE_MAX_FILES, TABLE_DOWNLOAD_CHUNK_SIZE
+from importing.utils.column_profiler import profile_csv
+from matgraph.models.metadata import File
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedTable:
+    """
+    A CSV upload profiled once and shared by all import stages.
+
+    Only the profile is held in memory; the file itself stays on local disk and is streamed again
+    when a stage needs every cell of a column.
+
+    Attributes:
+        uid (str): The uid of the File node.
+        link (str): The fileserver link of the file.
+        path (str): The local copy of the file.
+        header_line (str): The raw first line of the file.
+        header (list): The parsed header row.
+        first_row (list): The first data row.
+        profiles (list): One `ColumnProfile` per column.
+        row_count (int): The number of data rows.
+    """
+
+    def __init__(self, uid, link, path):
+        self.uid = uid
+        self.link = link
+        self.path = path
+        with open(path, newline="", encoding="utf-8") as f:
+            profile = profile_csv(f)
+        self.header_line = profile.header_line
+        self.header = profile.header
+        self.first_row = profile.first_row
+        self.profiles = profile.columns
+        self.row_count = profile.row_count
+
+    def _ensure_file(self):
+        if not os.path.exists(self.path):
+            download_file(self.link, self.path)
+
+    def iter_rows(self):
+        """Streams the data rows of the table, header excluded."""
+        self._ensure_file()
+        with open(self.path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from reader
+
+    def iter_column(self, index):
+        """Streams the non-empty cells of a column in row order."""
+        for row in self.iter_rows():
+            if index < len(row) and row[index] != "":
+                yield row[index]
+
+    def column_values(self, index):
+        """Returns the non-empty cells of a column in row order."""
+        return list(self.iter_column(index))
+
+    def samples(self, index, n):
+        """Returns the first `n` non-empty cells of a column, `n` at most `PROFILE_SAMPLES`."""
+        return self.profiles[index].samples[:n]
+
+    def distinct(self, index):
+        """
+        Returns the distinct non-empty cells of a column in order of appearance, streaming the column if the
+        profile only holds a capped subset.
+        """
+        profile = self.profiles[index]
+        if profile.distinct_exact:
+            return profile.distinct_values
+        return list(dict.fromkeys(self.iter_column(index)))
+
+
+def download_file(link, path, chunk_size=TABLE_DOWNLOAD_CHUNK_SIZE):
+    """
+    Stream a file from the fileserver to `path` without holding it in memory.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with requests.get(link, headers={'Accept': '*/*'}, stream=True) as response:
+        response.raise_for_status()
+        with open(tmp_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+class TableCache:
+    """
+    Per-file cache of parsed tables, keyed by file uid and link.
+
+    A table is streamed from the fileserver to `settings.CACHE_DIR/tables` and profiled at most once
+    per worker. The most recently used profiles stay in memory, all profiles are spilled next to their
+    file so other stages and worker restarts can load them without another download.
+    """
+
+    def __init__(self, directory, max_tables=TABLE_CACHE_MAX_TABLES, max_files=TABLE_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_tables = max_tables
+        self.max_files = max_files
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def _key(uid=None, link=None):
+        return hashlib.sha256(f"{uid or ''}|{link or ''}".encode("utf-8")).hexdigest()
+
+    def _path(self, key, extension="pickle"):
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def _remember(self, key, table):
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+
+    def _from_memory(self, keys):
+        with self._lock:
+            for key in keys:
+                if key in self._tables:
+                    self._tables.move_to_end(key)
+                    return self._tables[key]
+        return None
+
+    def _from_disk(self, keys):
+        for key in keys:
+            try:
+                with open(self._path(key), "rb") as f:
+                    table = pickle.load(f)
+                if os.path.exists(table.path):
+                    return table
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"Discarding unreadable table spill {key}: {e}")
+        return None
+
+    def _spill(self, table):
+        os.makedirs(self.directory, exist_ok=True)
+        for key in {self._key(uid=table.uid), self._key(link=table.link)}:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        spills = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith((".pickle", ".csv"))),
+                        key=lambda entry: entry.stat().st_mtime)
+        for entry in spills[:max(0, len(spills) - self.max_files)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, uid=None, link=None):
+        """
+        Return the parsed table of a file.
+
+        Args:
+            uid (str): The uid of the File node.
+            link (str): The fileserver link of the file.
+
+        Returns:
+            ParsedTable: The parsed table.
+
+        Raises:
+            ValueError: If neither `uid` nor `link` is given.
+        """
+        if not uid and not link:
+            raise ValueError("A file uid or link is required to get a table")
+        keys = [self._key(uid=uid)] if uid else []
+        keys += [self._key(link=link)] if link else []
+        if table := self._from_memory(keys):
+            return table
+        file_record = None
+        if not link:
+            file_record = File.nodes.get(uid=uid)
+            link = file_record.link
+            keys.append(self._key(link=link))
+        with self._lock:
+            # locked by link, so callers passing the uid, the link or both share one lock per file
+            key_lock = self._key_locks.setdefault(self._key(link=link), threading.Lock())
+        # only one thread per file downloads and parses
+        with key_lock:
+            if table := self._from_memory(keys) or self._from_disk(keys):
+                self._remember(self._key(uid=table.uid), table)
+                self._remember(self._key(link=table.link), table)
+                return table
+            file_record = file_record or File.nodes.get(link=link)
+            path = self._path(self._key(uid=file_record.uid), "csv")
+            download_file(file_record.link, path)
+            table = ParsedTable(file_record.uid, file_record.link, path)
+            self._remember(self._key(uid=table.uid), table)
+            self._remember(self._key(link=table.link), table)
+            try:
+                self._spill(table)
+            except OSError as e:
+                logger.warning(f"Could not spill table {table.uid} to disk: {e}")
+            return table
+
+_table_cache = None
+_table_cache_lock = threading.Lock()
+
+
+def get_table(uid=None, link=None):
+    """
+    Return the parsed table for a file uid or link from the process-wide table cache.
+    """
+    global _table_cache
+    if _table_cache is None:
+        with _table_cache_lock:
+            if _table_cache is None:
+                _table_cache = TableCache(os.path.join(settings.CACHE_DIR, "tables"))
+    return _table_cache.get(uid=uid, link=link)
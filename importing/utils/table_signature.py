@@ -0,0 +1,74 @@
+import copy
+import csv
+import hashlib
+from collections import Counter, defaultdict
+from typing import List
+
+
+def header_columns(header) -> List[str]:
+    """
+    Split a raw header line into its canonical column names, whitespace- and case-folded.
+    """
+    columns = next(csv.reader([str(header)]), [])
+    return [" ".join(column.split()).casefold() for column in columns]
+
+
+def header_signature(columns: List[str]) -> str:
+    """
+    Return the fixed-size digest of a header, independent of the column order.
+    """
+    return hashlib.sha256("\x1f".join(sorted(columns)).encode("utf-8")).hexdigest()
+
+
+def column_difference(columns: List[str], other: List[str]) -> int:
+    """
+    Return the number of columns that are only in one of the two headers.
+    """
+    counts, other_counts = Counter(columns), Counter(other)
+    return sum(((counts - other_counts) + (other_counts - counts)).values())
+
+
+def remap_graph(graph, old_columns: List[str], new_columns: List[str]):
+    """
+    Adapt a cached graph to a header with reordered, added or removed columns.
+
+    Attribute references are moved to the position of their column in the new header, repeated column
+    names are matched in order. Attribute values read from columns the new header does not have are dropped.
+
+    Args:
+        graph: The cached graph, either a dict with a 'nodes' list or the node list itself.
+        old_columns (List[str]): The canonical columns of the header the graph was built for.
+        new_columns (List[str]): The canonical columns of the new header.
+
+    Returns:
+        A copy of the graph that references the columns of the new header.
+    """
+    if old_columns == new_columns or not graph:
+        return graph
+    positions = defaultdict(list)
+    for index, column in enumerate(new_columns):
+        positions[column].append(index)
+    taken = Counter()
+    mapping = {}
+    for index, column in enumerate(old_columns):
+        if taken[column] < len(positions[column]):
+            mapping[str(index)] = str(positions[column][taken[column]])
+            taken[column] += 1
+
+    graph = copy.deepcopy(graph)
+    for node in graph['nodes'] if isinstance(graph, dict) else graph:
+        attributes = {}
+        for name, values in node.get('attributes', {}).items():
+            is_list = isinstance(values, list)
+            remapped = []
+            for value in values if is_list else [values]:
+                index = str(value.get('index', 'inferred'))
+                if index in ('inferred', 'missing'):
+                    remapped.append(value)
+                elif index in mapping:
+                    new_index = mapping[index]
+                    remapped.append({**value, 'index': int(new_index) if isinstance(value['index'], int) else new_index})
+            if remapped:
+                attributes[name] = remapped if is_list else remapped[0]
+        node['attributes'] = attributes
+    return graph
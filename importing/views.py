@@ -1,4 +1,3 @@
-from io import StringIO
 import logging
 import json
 
@@ -12,20 +11,22 @@ from django.http import Http404
 
 from django.db import connection, close_old_connections
 
-from .models import FullTableCache, ImportProcess
+from .models import FullTableCache, ImportProcess, StageCheckpoint
 from .tasks import (
     extract_labels,
     extract_attributes,
     extract_nodes,
     extract_relationships,
     import_graph,
+    run_import,
 )
-from .utils.file_processing import store_file
+from .utils.file_processing import read_header_line, store_file
 from .utils.process_management import create_import_process
-from matgraph.models.metadata import File
+from .utils.table_cache import get_table
+from .utils.table_signature import header_columns, header_signature
 
 from tasks.task_manager import submit_task, cancel_task
-from tasks.models import ProcessStatus
+from tasks.models import JobKind, JobPriority, ProcessStatus
 # from .utils.data_processing import sanitize_data
 
 logger = logging.getLogger(__name__)
@@ -90,10 +91,26 @@ class LabelExtractView(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
+            if data["use_template"] and (template := self.try_template(file_id)) is not None:
+                # the header layout has a validated graph, skip the extraction stages
+                process.graph = template
+                process.status = ProcessStatus.PROCESSING
+                process.save()
+                submit_task(process_id, import_graph, process, {"template": True}, kind=JobKind.CPU,
+                            retryable=False)
+                return Response(
+                    {"status": ProcessStatus.PROCESSING, "message": "Template import started", "template": True},
+                    status=status.HTTP_202_ACCEPTED,
+                )
+
             try:
                 process.status = ProcessStatus.PROCESSING
                 process.save()
-                submit_task(process_id, extract_labels, process)
+                if data["auto"]:
+                    # run all stages as one job without waiting for the user in between
+                    submit_task(process_id, run_import, process, retryable=False)
+                else:
+                    submit_task(process_id, extract_labels, process)
                 return Response(
                     {"status": ProcessStatus.PROCESSING, "message": "Process started"},
                     status=status.HTTP_202_ACCEPTED,
@@ -118,15 +135,17 @@ class LabelExtractView(APIView):
         finally:
             connection.close()
 
+    def try_template(self, file_id):
+        try:
+            return FullTableCache.template(get_table(uid=file_id).header_line.lower())
+        except Exception as e:
+            logger.warning("Template lookup failed: %s", e)
+            return None
+
     def try_cache(self, file_id):
         close_old_connections()
         try:
-            file_record = File.nodes.get(uid=file_id)
-            file_obj_bytes = file_record.get_file()
-            file_obj_str = file_obj_bytes.decode("utf-8")
-            file_obj = StringIO(file_obj_str)
-            file_obj.seek(0)
-            first_line = str(file_obj.readline().strip().lower())
+            first_line = get_table(uid=file_id).header_line.lower()
 
             cached = FullTableCache.fetch(first_line)
             if cached:
@@ -451,6 +470,8 @@ class GraphImportView(APIView):
                     import_graph,
                     process,
                     {"session": request.session.get("first_line")},
+                    kind=JobKind.CPU,
+                    retryable=False,
                 )
 
                 return Response(
@@ -478,6 +499,95 @@ class GraphImportView(APIView):
             connection.close()
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class TemplateImportView(APIView):
+    """
+    Imports several files with the same header layout against one validated graph template.
+
+    Every file gets its own import process with the id `<process_id>-<n>`; files whose header does not match
+    the template are reported and skipped.
+    """
+    def post(self, request):
+        close_old_connections()
+        try:
+            from importing.serializers import CsvFileSerializer, TemplateImportSerializer
+
+            files = request.FILES.getlist("files")
+            if not files:
+                return Response(
+                    {"status": ProcessStatus.FAILED, "message": "No files provided"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            for file in files:
+                CsvFileSerializer(data={"file": file}).is_valid(raise_exception=True)
+
+            raw_payload = request.data.get("payload")
+
+            if raw_payload and isinstance(raw_payload, str):
+                try:
+                    raw_payload = json.loads(raw_payload)
+                except json.JSONDecodeError:
+                    raw_payload = {}
+            elif not raw_payload:
+                raw_payload = {}
+
+            ser = TemplateImportSerializer(data=raw_payload)
+            ser.is_valid(raise_exception=True)
+            data = ser.validated_data
+
+            process_id = data["process_id"]
+            user_id = data["user_id"]
+            context = data["context"]
+            signature = data.get("signature")
+            callback_url = data.get("callback_url")
+
+            processes = []
+            for n, file in enumerate(files):
+                try:
+                    # the header is checked before storing, skipped files leave no File node behind
+                    header = read_header_line(file).lower()
+                    template = FullTableCache.template(header, signature=signature)
+                    if template is not None and signature is None:
+                        # without an explicit template the first matching file selects it
+                        signature = header_signature(header_columns(header))
+                except Exception as e:
+                    logger.exception("Template lookup failed for %s: %s", file.name, e, exc_info=True)
+                    template = None
+                if template is None:
+                    processes.append({"file": file.name, "status": ProcessStatus.SKIPPED,
+                                      "message": "Header does not match the template"})
+                    continue
+
+                file_record = store_file(file)
+                file_process_id = f"{process_id}-{n}"
+                process = create_import_process(file_process_id, user_id, file_record.uid, context, callback_url)
+                process.graph = template
+                process.status = ProcessStatus.PROCESSING
+                process.save()
+                submit_task(file_process_id, import_graph, process, {"template": True},
+                            kind=JobKind.CPU, priority=JobPriority.LOW, retryable=False)
+                processes.append({"file": file.name, "process_id": file_process_id, "status": ProcessStatus.PROCESSING})
+
+            started = any(entry["status"] == ProcessStatus.PROCESSING for entry in processes)
+            return Response(
+                {
+                    "status": ProcessStatus.PROCESSING if started else ProcessStatus.FAILED,
+                    "message": "Template imports started" if started else "No file matches a template",
+                    "signature": signature,
+                    "processes": processes,
+                },
+                status=status.HTTP_202_ACCEPTED if started else status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            logger.exception("Unhandled exception in TemplateImportView: %s", e, exc_info=True)
+            return Response(
+                {"status": ProcessStatus.FAILED, "message": "Internal server error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        finally:
+            connection.close()
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class CancelTaskView(APIView):
     def patch(self, request):
@@ -632,6 +742,7 @@ class ProcessDeleteView(APIView):
             try:
                 process = get_object_or_404(ImportProcess, user_id=user_id, process_id=process_id)
                 process.delete()
+                StageCheckpoint.clear(process_id)
 
                 return Response(
                     {"status": ProcessStatus.CANCELLED, "message": "Process deleted"},
@@ -52,6 +52,9 @@ LOG_DIR = os.path.join(BASE_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
+# Local caches for embeddings and LLM responses
+CACHE_DIR = os.getenv("MATGRAPH_CACHE_DIR", os.path.join(BASE_DIR, "cache"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -30,6 +30,7 @@ urlpatterns = [
     path('', include('default.urls')),
     path('', include('matching.urls')),
     path('', include('importing.urls')),
+    path('', include('tasks.urls')),
     # Catch-all for SPA
     path('', spa_view, name='app'),
 
@@ -0,0 +1,228 @@
+"""
+Decomposed execution of fabrication workflow queries.
+
+Instead of one statement that cross-unwinds every candidate pair into path matches and re-joins the path
+lists inside Cypher, every query relationship runs as its own bounded path query between the candidate
+nodes of its endpoints. The endpoint tables are joined in Python with hash joins, smallest and connected
+tables first, and the joins stop once `MATCHER_RESULT_LIMIT` workflows are found. With a process graph
+snapshot the paths are searched in memory and the database only serves candidates and the result rows.
+
+matching engine classes:
+ - EdgeTable
+ - DecomposedWorkflowEngine
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from neomodel import db
+
+from graphutils.config import MATCHER_WORKERS, MATCHER_MAX_PATH_LENGTH, MATCHER_PATH_LIMIT, MATCHER_RESULT_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+PATH_QUERY = """
+MATCH path = (source:{source_label})-[:{rel_types}*..{max_length}]->(target:{target_label})
+WHERE source.uid IN $sources AND target.uid IN $targets
+RETURN source.uid, target.uid, [node IN nodes(path) | node.uid]
+LIMIT $limit
+"""
+
+# labels of the nodes on workflow paths, each backed by the uid index of its label
+HYDRATE_LABELS = ("Matter", "Process", "Manufacturing", "Measurement", "Property", "Parameter", "Metadata")
+
+HYDRATE_QUERY = """
+UNWIND $uids AS uid
+CALL {
+    WITH uid
+""" + "\n    UNION\n    WITH uid\n".join(f"    MATCH (node:{label} {{uid: uid}}) RETURN node" for label in HYDRATE_LABELS) + """
+}
+WITH DISTINCT node
+OPTIONAL MATCH (node)-[:IS_A]->(onto)
+WITH node, collect(onto.name) AS onto_names
+OPTIONAL MATCH (node)-[:HAS_PROPERTY|HAS_PARAMETER]->(attribute)-[:IS_A]->(quantity:EMMOQuantity)
+WHERE (node:Matter AND attribute:Property) OR (NOT node:Matter AND attribute:Parameter)
+RETURN node.uid, node:Matter, onto_names,
+       collect(CASE WHEN attribute IS NULL THEN NULL ELSE [attribute.value, attribute.name, quantity.name] END)
+"""
+
+
+@lru_cache(maxsize=256)
+def build_path_query(source_label, target_label, rel_types):
+    """Return the path query between two node labels; endpoints and limit are parameters."""
+    return PATH_QUERY.format(source_label=source_label, target_label=target_label,
+                             rel_types=rel_types, max_length=MATCHER_MAX_PATH_LENGTH)
+
+
+@dataclass
+class EdgeTable:
+    """
+    The paths found for one query relationship.
+
+    Attributes:
+        source (str): The query node id of the start of the paths.
+        target (str): The query node id of the end of the paths.
+        rows (List[Tuple[str, str, List[str]]]): (source uid, target uid, uids along the path) per path.
+    """
+    source: str
+    target: str
+    rows: List[Tuple[str, str, List[str]]] = field(default_factory=list)
+
+
+class DecomposedWorkflowEngine:
+    """
+    Executes a workflow query as per-node candidate queries, per-relationship path queries and Python joins.
+
+    Args:
+        candidate_queries (Dict[str, str]): Per query node id, a query returning the candidate uids.
+        labels (Dict[str, str]): Per query node id, the node label the candidates have.
+        relationships (List[Tuple[str, str, str]]): (source id, target id, relationship types) per
+            query relationship, the types in Cypher alternation syntax.
+        snapshot (Optional[ProcessGraph]): Searches the paths in this snapshot instead of the database.
+        params (Optional[dict]): The parameters of the candidate queries.
+    """
+
+    def __init__(self, candidate_queries: Dict[str, str], labels: Dict[str, str],
+                 relationships: List[Tuple[str, str, str]], snapshot=None, params: Optional[dict] = None):
+        self.candidate_queries = candidate_queries
+        self.labels = labels
+        self.relationships = relationships
+        self.snapshot = snapshot
+        self.params = params or {}
+
+    def describe(self) -> str:
+        """Return the queries the engine runs, for the matching report."""
+        parts = [f"// candidates of {node_id}\n{query}" for node_id, query in self.candidate_queries.items()]
+        parts += [f"// paths {source} -> {target}\n" + self._path_query(source, target, rel_types)
+                  for source, target, rel_types in self.relationships]
+        return "\n".join(parts + [HYDRATE_QUERY])
+
+    def _path_query(self, source, target, rel_types):
+        if self.snapshot is not None:
+            return f"// {rel_types} paths of at most {MATCHER_MAX_PATH_LENGTH} hops in the process graph snapshot"
+        return build_path_query(self.labels[source], self.labels[target], rel_types)
+
+    @staticmethod
+    def _cypher(query, params=None):
+        results, _ = db.cypher_query(query, params or {})
+        return results
+
+    def _candidates(self, executor) -> Dict[str, set]:
+        futures = {node_id: executor.submit(self._cypher, query, self.params) for node_id, query in self.candidate_queries.items()}
+        return {node_id: set(future.result()[0][0] or []) for node_id, future in futures.items()}
+
+    def _edge_tables(self, executor, candidates) -> List[EdgeTable]:
+        if self.snapshot is not None:
+            return [EdgeTable(source, target, self.snapshot.paths(candidates[source], candidates[target],
+                                                                  rel_types.split("|"), MATCHER_MAX_PATH_LENGTH,
+                                                                  MATCHER_PATH_LIMIT))
+                    for source, target, rel_types in self.relationships]
+        futures = []
+        for source, target, rel_types in self.relationships:
+            params = {"sources": list(candidates[source]), "targets": list(candidates[target]),
+                      "limit": MATCHER_PATH_LIMIT}
+            futures.append((source, target, executor.submit(self._cypher, self._path_query(source, target, rel_types),
+                                                            params)))
+        tables = []
+        for source, target, future in futures:
+            rows = future.result()
+            if len(rows) >= MATCHER_PATH_LIMIT:
+                logger.warning(f"Paths {source} -> {target} truncated at {MATCHER_PATH_LIMIT}")
+            tables.append(EdgeTable(source, target, [tuple(row) for row in rows]))
+        return tables
+
+    @staticmethod
+    def _join_order(tables: List[EdgeTable]) -> List[int]:
+        """
+        Orders the relationships for joining: the smallest table first, then always the smallest table
+        that shares a query node with the tables joined so far, so cross products only happen between
+        disconnected parts of the query.
+        """
+        remaining = sorted(range(len(tables)), key=lambda i: len(tables[i].rows))
+        order, bound = [], set()
+        while remaining:
+            connected = [i for i in remaining if {tables[i].source, tables[i].target} & bound]
+            chosen = connected[0] if connected else remaining[0]
+            remaining.remove(chosen)
+            order.append(chosen)
+            bound |= {tables[chosen].source, tables[chosen].target}
+        return order
+
+    def _join(self, tables: List[EdgeTable]) -> List[Dict[int, int]]:
+        """
+        Joins the edge tables on their shared query nodes. Only the result of the last join is limited
+        to `MATCHER_RESULT_LIMIT` workflows, partial workflows cut off earlier could all fail to join later.
+
+        Returns:
+            List[Dict[int, int]]: Per workflow, the row of each edge table by table index.
+        """
+        partials = [({}, {})]  # (uid per query node, row per table)
+        order = self._join_order(tables)
+        for step, position in enumerate(order):
+            last = step == len(order) - 1
+            table = tables[position]
+            shared = [node_id for node_id in dict.fromkeys([table.source, table.target]) if node_id in partials[0][0]]
+            # hash the edge table on the query nodes it shares with the partial workflows
+            buckets = {}
+            for row_index, (source_uid, target_uid, _) in enumerate(table.rows):
+                if table.source == table.target and source_uid != target_uid:
+                    continue
+                uids = {table.source: source_uid, table.target: target_uid}
+                buckets.setdefault(tuple(uids[node_id] for node_id in shared), []).append((row_index, uids))
+            joined = []
+            for bindings, rows in partials:
+                for row_index, uids in buckets.get(tuple(bindings[node_id] for node_id in shared), ()):
+                    joined.append(({**bindings, **uids}, {**rows, position: row_index}))
+                    if last and len(joined) >= MATCHER_RESULT_LIMIT:
+                        break
+                if last and len(joined) >= MATCHER_RESULT_LIMIT:
+                    logger.warning(f"Workflow matches truncated at {MATCHER_RESULT_LIMIT}")
+                    break
+            partials = joined
+            if not partials:
+                return []
+        return [rows for _, rows in partials]
+
+    def _hydrate(self, uids) -> Dict[str, tuple]:
+        return {uid: (is_matter, onto_names, attributes)
+                for uid, is_matter, onto_names, attributes in self._cypher(HYDRATE_QUERY, {"uids": list(uids)})}
+
+    def execute(self) -> Tuple[list, Optional[list]]:
+        """
+        Runs the query.
+
+        Returns:
+            The result in the shape of the monolithic query: one row holding the distinct workflows, each
+            the uids of its nodes followed by their ontology names, and the [uid, value, attribute] metadata
+            of all nodes.
+        """
+        with ThreadPoolExecutor(max_workers=MATCHER_WORKERS, thread_name_prefix="matcher") as executor:
+            candidates = self._candidates(executor)
+            if not self.relationships or any(not uids for uids in candidates.values()):
+                return [[[], []]], None
+            tables = self._edge_tables(executor, candidates)
+
+        workflows = []
+        for rows in self._join(tables):
+            path_nodes = dict.fromkeys(uid for position in sorted(rows)
+                                       for uid in tables[position].rows[rows[position]][2])
+            workflows.append(tuple(path_nodes))
+        workflows = list(dict.fromkeys(workflows))
+
+        nodes = self._hydrate({uid for workflow in workflows for uid in workflow})
+        combinations = [
+            [*workflow, *[(nodes[uid][1] or [None])[0] if uid in nodes else None for uid in workflow]]
+            for workflow in workflows
+        ]
+        metadata = []
+        for uid, (is_matter, onto_names, attributes) in nodes.items():
+            for onto_name in onto_names:
+                for value, name, quantity in attributes:
+                    label = f"{onto_name}_{name}" if is_matter else f"{onto_name}_{quantity}_{name}"
+                    metadata.append([uid, value, label])
+        metadata = [list(entry) for entry in dict.fromkeys(tuple(entry) for entry in metadata)]
+        return [[combinations, metadata]], None
@@ -1,10 +1,17 @@
 import os
+import threading
+from collections import OrderedDict
 
 import pandas as pd
 from dotenv import load_dotenv
 
+from graphutils.config import MATCHER_ENGINE, MATCHER_TEMPLATE_CACHE_SIZE
+from graphutils.units import normalize_quantity
+from matching.engine import DecomposedWorkflowEngine
 from matching.matcher import Matcher
+from matching.snapshot import get_process_graph
 from matgraph.models.ontology import EMMOMatter, EMMOProcess, EMMOQuantity
+from ontologymanagement.subsumption import get_subsumption_index
 
 
 def create_table_structure(data):
@@ -65,8 +72,7 @@ def create_table_structure(data):
     return final_df
 
 
-# TODO implement filtering for values!
-QUERY_BY_VALUE = """"""
+ONTOLOGY_CLASSES = {"EMMOMatter": EMMOMatter, "EMMOProcess": EMMOProcess, "EMMOQuantity": EMMOQuantity}
 
 ONTOMAPPER = {"matter": "EMMOMatter", "manufacturing": "EMMOProcess", "measurement": "EMMOProcess", "property": "EMMOQuantity", "parameter": "EMMOQuantity"}
 
@@ -104,12 +110,18 @@ $id as id
 
 
 class FabricationWorkflowMatcher(Matcher):
+    # query templates by workflow shape, shared by the matchers of the process
+    _templates = OrderedDict()
+    _templates_lock = threading.Lock()
+
     def __init__(self, workflow_list, count=False, **kwargs):
         print(workflow_list)
 
-        self.query_list = [{**node, "uid": self._get_uid(node)} for node in workflow_list["nodes"]]
+        uids = self._get_uids(workflow_list["nodes"])
+        self.query_list = [{**node, "uid": uid} for node, uid in zip(workflow_list["nodes"], uids)]
         self.relationships = workflow_list["relationships"]
         self.count = count
+        self._engine = None
         super().__init__(**kwargs)
 
     @staticmethod
@@ -139,54 +151,83 @@ class FabricationWorkflowMatcher(Matcher):
             return field.get("operator", default)
         return default
 
-    def _get_uid(self, node):
-        """Resolve the UID based on node label + normalized name."""
-        name_val = self.pick_attr_value(node.get("attributes", {}).get("name"))
-        label = ONTOMAPPER.get(node.get("label"))
+    def _get_uids(self, nodes):
+        """Resolve the UIDs of all nodes based on label + normalized name, one batched lookup per ontology class."""
+        uids = []
+        lookups = {}
+        for i, node in enumerate(nodes):
+            name_val = self.pick_attr_value(node.get("attributes", {}).get("name"))
+            label = ONTOMAPPER.get(node.get("label"))
+            uids.append(None if label in ONTOLOGY_CLASSES else "nope")
+            if label in ONTOLOGY_CLASSES and name_val:
+                lookups.setdefault(label, []).append((i, name_val))
+
+        for label, entries in lookups.items():
+            candidates = ONTOLOGY_CLASSES[label].nodes.get_by_strings([name_val for _, name_val in entries])
+            for (i, _), result in zip(entries, candidates):
+                uids[i] = result[0].uid
+        return uids
+
+    def _ontology_uids(self, node):
+        """
+        Return the uids of the ontology class of a query node and of all its subclasses, looked up in the
+        materialized EMMO hierarchy. None if the node has no ontology class, any class of its kind matches then.
+        """
+        onto = ONTOMAPPER.get(node["label"])
+        if not onto or not node.get("uid"):
+            return None
+        return get_subsumption_index(ONTOLOGY_CLASSES[onto]).descendants([node["uid"]])
 
-        if label == "EMMOMatter":
-            return EMMOMatter.nodes.get_by_string(string=name_val, limit=10)[0].uid if name_val else None
-        if label == "EMMOProcess":
-            return EMMOProcess.nodes.get_by_string(string=name_val, limit=10)[0].uid if name_val else None
-        if label == "EMMOQuantity":
-            return EMMOQuantity.nodes.get_by_string(string=name_val, limit=10)[0].uid if name_val else None
-        return "nope"
+    def _node_filter(self, node):
+        """
+        Split the candidate filter of a query node into its structure and its values.
 
-    def _build_ontology_query(self, node):
-        node_id, label = node["id"], node["label"]
-        onto = ONTOMAPPER.get(label)
-        uid = node.get("uid")
-        if not onto or not uid:
-            return f"(onto_{node_id})"
-        return f"(onto_{node_id}: {onto} {{uid: '{uid}'}})"
+        Value filters with a unit are converted to SI and compared with the indexed `value_si` of nodes
+        of the same canonical unit; without a unit, or with one that cannot be converted, the raw values
+        are compared.
 
-    def _build_tree_query(self, node_id, label):
-        onto = ONTOMAPPER.get(label)
-        if not onto:
-            return f""
-        return f"""CALL {{
-            WITH onto_{node_id}
-            OPTIONAL MATCH (onto_{node_id})<-[:EMMO__IS_A*..]-(tree_onto_{node_id}:{onto})
-            RETURN collect(DISTINCT tree_onto_{node_id}) + collect(DISTINCT onto_{node_id}) AS combined_{node_id}
-        }}
+        Returns:
+            The key the candidate query template depends on, (node id, label, filtered by ontology
+            class, value operator, typed value filter), and the parameters the template reads.
         """
-
-    def _build_find_nodes_query(self, node_id, label, attributes):
-        label = (label or "").capitalize()
-        where_clause = ""
-        if label in ("Property", "Parameter"):
-            val_field = attributes.get("value") if isinstance(attributes, dict) else None
+        node_id, label = node["id"], node["label"]
+        params = {}
+        ontology_uids = self._ontology_uids(node)
+        if ontology_uids is not None:
+            params[f"onto_uids_{node_id}"] = ontology_uids
+        operator, typed = None, False
+        if (label or "").capitalize() in ("Property", "Parameter"):
+            attributes = node["attributes"] if isinstance(node["attributes"], dict) else {}
+            val_field = attributes.get("value")
             value = self.pick_attr_value(val_field)
-            op_sym = self.pick_attr_operator(val_field, default="=")
-            operator = OPERATOR_MAPPING.get(op_sym, "=")
-
             if value is not None:
-                where_clause = f"WHERE toFloat(node_{node_id}.value) {operator} toFloat({value})"
+                operator = OPERATOR_MAPPING.get(self.pick_attr_operator(val_field, default="="), "=")
+                params[f"value_{node_id}"] = value
+                unit = self.pick_attr_value(attributes.get("unit"))
+                value_si, unit_si = normalize_quantity(value, unit) if unit is not None else (None, None)
+                if value_si is not None:
+                    typed = True
+                    params[f"value_{node_id}"], params[f"unit_{node_id}"] = value_si, unit_si
+        return (node_id, label, ontology_uids is not None, operator, typed), params
 
+    @staticmethod
+    def _build_find_nodes_query(node_id, label, has_ontology=False, operator=None, typed=False):
+        onto = ONTOMAPPER.get(label)
+        label = (label or "").capitalize()
+        conditions = []
+        if has_ontology:
+            conditions.append(f"full_onto_{node_id}.uid IN $onto_uids_{node_id}")
+        if operator is not None and typed:
+            # equality on the unit and a range on the value, a seek on the (unit_si, value_si) index; nodes
+            # imported before the index are backfilled by the normalize-quantity-values command
+            conditions.append(f"node_{node_id}.unit_si = $unit_{node_id} AND node_{node_id}.value_si {operator} $value_{node_id}")
+        elif operator is not None:
+            conditions.append(f"toFloat(node_{node_id}.value) {operator} toFloat($value_{node_id})")
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        pattern = f"(full_onto_{node_id}:{onto})<-[:IS_A]-(node_{node_id}:{label})" if onto else f"(node_{node_id}:{label})"
         return f"""CALL {{
-            WITH combined_{node_id}
-            UNWIND combined_{node_id} AS full_onto_{node_id}
-            MATCH (full_onto_{node_id})<-[:IS_A]-(node_{node_id}:{label})
+            MATCH {pattern}
             {where_clause}
             RETURN collect(DISTINCT node_{node_id}) AS nodes_{node_id}
         }}
@@ -273,21 +314,24 @@ class FabricationWorkflowMatcher(Matcher):
         }}
         """
 
+    def _rel_type(self, rel):
+        if rel_type := rel.get("rel_type"):
+            return rel_type
+        node_labels = {node["id"]: node.get("label") for node in self.query_list}
+        source, target = rel["connection"]
+        source_label, target_label = node_labels.get(source), node_labels.get(target)
+        rel_type = RELATIONSHIP_MAP.get((source_label, target_label))
+        if rel_type is None:
+            raise ValueError(f"Cannot determine rel_type for relationship between {source_label} → {target_label}")
+        return rel_type
+
     def _build_path_queries_and_conditions(self):
         paths, uid_paths, xid_paths, path_combinations = [], [], [], []
         path_queries = []
 
-        node_labels = {node["id"]: node.get("label") for node in self.query_list}
-
         for i, rel in enumerate(self.relationships):
             source, target = rel["connection"]
-            rel_type = rel.get("rel_type")
-            if rel_type is None:
-                source_label = node_labels.get(source)
-                target_label = node_labels.get(target)
-                rel_type = RELATIONSHIP_MAP.get((source_label, target_label))
-                if rel_type is None:
-                    raise ValueError(f"Cannot determine rel_type for relationship between {source_label} → {target_label}")
+            rel_type = self._rel_type(rel)
             path = f"path_{source}_{target}"
             uid_path = f"uids_path_{source}_{target}"
             xid_path = f"idx_uids_path_{source}_{target}"
@@ -323,19 +367,65 @@ class FabricationWorkflowMatcher(Matcher):
 
         # Assuming _build_single_path_query remains unchanged
 
-    def build_query(self):
-        ontology_queries = [self._build_ontology_query(node) for node in self.query_list]
-        tree_queries = [self._build_tree_query(node["id"], node["label"]) for node in self.query_list]
-        find_nodes_queries = [self._build_find_nodes_query(node["id"], node["label"], node["attributes"]) for node in self.query_list]
+    def _template(self, shape, build):
+        """
+        Return the cached template of a workflow shape, building it with `build` on a miss.
+
+        Templates hold no uids or values, so every workflow of the same shape reuses both the template
+        and the query plans Neo4j cached for its statements.
+        """
+        with self._templates_lock:
+            if shape in self._templates:
+                self._templates.move_to_end(shape)
+                return self._templates[shape]
+        template = build()
+        with self._templates_lock:
+            self._templates[shape] = template
+            while len(self._templates) > MATCHER_TEMPLATE_CACHE_SIZE:
+                self._templates.popitem(last=False)
+        return template
+
+    def _build_engine_template(self, node_keys):
+        candidate_queries = {
+            key[0]: self._build_find_nodes_query(*key) + f"RETURN [node IN nodes_{key[0]} | node.uid]"
+            for key in node_keys
+        }
+        labels = {node["id"]: (node["label"] or "").capitalize() for node in self.query_list}
+        relationships = [(*rel["connection"], RELAMAPPER[self._rel_type(rel)]) for rel in self.relationships]
+        return candidate_queries, labels, relationships
+
+    def _build_cypher_template(self, node_keys):
+        # subclass sets come from the materialized hierarchy instead of EMMO__IS_A* traversals
+        find_nodes_queries = [self._build_find_nodes_query(*key) for key in node_keys]
         path_queries_and_conditions = self._build_path_queries_and_conditions()
         prepare_results = self._build_results()
 
         # Combining all parts into a single query
-        final_query = f"""MATCH {", ".join(ontology_queries)} 
-        {" ".join(tree_queries + find_nodes_queries + [path_queries_and_conditions] + [prepare_results])}
+        return f"""{" ".join(find_nodes_queries + [path_queries_and_conditions] + [prepare_results])}
         """
+
+    def build_query(self):
+        filters = [self._node_filter(node) for node in self.query_list]
+        node_keys = [key for key, _ in filters]
+        params = {name: value for _, node_params in filters for name, value in node_params.items()}
+        shape = (MATCHER_ENGINE, tuple(node_keys),
+                 tuple((*rel["connection"], self._rel_type(rel)) for rel in self.relationships))
+
+        if MATCHER_ENGINE in ("decomposed", "snapshot"):
+            candidate_queries, labels, relationships = self._template(
+                shape, lambda: self._build_engine_template(node_keys))
+            snapshot = get_process_graph() if MATCHER_ENGINE == "snapshot" else None
+            self._engine = DecomposedWorkflowEngine(candidate_queries, labels, relationships, snapshot, params)
+            return self._engine.describe(), params
+
+        final_query = self._template(shape, lambda: self._build_cypher_template(node_keys))
         print(final_query)
-        return final_query, {}
+        return final_query, params
+
+    def execute(self, query, params):
+        if self._engine is not None:
+            return self._engine.execute()
+        return super().execute(query, params)
 
     def build_result(self):
         # if self.count:
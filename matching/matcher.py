@@ -106,8 +106,7 @@ class Matcher:
         )
 
         start = time.time()
-        self.db_result, self.db_columns = db.cypher_query(query, params)
-        print(f'{query} \n \n {params}')
+        self.db_result, self.db_columns = self.execute(query, params)
         end = time.time()
 
 
@@ -121,6 +120,18 @@ class Matcher:
                 report=self.report
             ).save()
 
+    def execute(self, query, params):
+        """
+        Method to execute the built query.
+        Subclasses can override it to run the query with a different execution engine.
+
+        Returns:
+            A tuple of (db_results, db_columns).
+        """
+        result = db.cypher_query(query, params)
+        print(f'{query} \n \n {params}')
+        return result
+
     def build_result(self):
         """
         Method to build the result.
@@ -0,0 +1,176 @@
+"""
+In-memory snapshot of the process graph for workflow path search.
+
+The relationships fabrication workflows are matched along are kept as a compressed sparse row (CSR)
+adjacency with integer node ids and a typed edge array, so bounded path searches run as vectorized
+path frontiers in numpy instead of variable-length traversals in the database. Relationships
+written by the batch ingestor of this process are added as they are committed, changes of other
+processes are picked up by a full reload after `PROCESS_GRAPH_MAX_AGE` seconds.
+
+matching snapshot classes:
+ - ProcessGraph
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+from neomodel import db
+
+from graphutils.config import PROCESS_GRAPH_MAX_AGE
+from importing.utils.ingestion import add_ingestion_listener
+
+logger = logging.getLogger(__name__)
+
+EDGE_TYPES = ("IS_MANUFACTURING_INPUT", "IS_MANUFACTURING_OUTPUT", "HAS_PARAMETER", "HAS_PROPERTY", "IS_A")
+EDGE_TYPE_CODES = {rel_type: code for code, rel_type in enumerate(EDGE_TYPES)}
+
+
+class ProcessGraph:
+    """
+    CSR snapshot of the `EDGE_TYPES` relationships of the graph.
+
+    The outgoing edges of node `i` are `indices[indptr[i]:indptr[i + 1]]`, their types the same slice of
+    `types`. New relationships are buffered and merged into the arrays before the next search.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._pending = []
+
+    def load(self):
+        """Loads all `EDGE_TYPES` relationships from the db."""
+        logger.info("Loading process graph snapshot")
+        self._ids, self._uids = {}, []
+        sources, targets, types = [], [], []
+        for code, rel_type in enumerate(EDGE_TYPES):
+            results, _ = db.cypher_query(f"MATCH (a)-[:{rel_type}]->(b) RETURN a.uid, b.uid")
+            for source_uid, target_uid in results:
+                sources.append(self._id(source_uid))
+                targets.append(self._id(target_uid))
+            types += [code] * len(results)
+        self._build(np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64),
+                    np.array(types, dtype=np.int8))
+        self._pending = []
+        self._loaded_at = time.monotonic()
+        logger.info(f"Process graph snapshot holds {len(self._uids)} nodes and {len(self._indices)} edges")
+
+    def _id(self, uid):
+        if (i := self._ids.get(uid)) is None:
+            i = self._ids[uid] = len(self._uids)
+            self._uids.append(uid)
+        return i
+
+    def _build(self, sources, targets, types):
+        order = np.argsort(sources, kind="stable")
+        counts = np.bincount(sources, minlength=len(self._uids))
+        indptr = np.zeros(len(self._uids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        # searches hold references to the old arrays, so they are replaced, never changed in place
+        self._indptr, self._indices, self._types = indptr, targets[order], types[order]
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        sources = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+        new_sources, new_targets, new_types = map(np.array, zip(*self._pending))
+        self._build(np.concatenate([sources, new_sources]), np.concatenate([self._indices, new_targets]),
+                    np.concatenate([self._types, new_types.astype(np.int8)]))
+        self._pending = []
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > PROCESS_GRAPH_MAX_AGE:
+                self.load()
+            self._merge_pending()
+            return self._ids, self._uids, self._indptr, self._indices, self._types
+
+    def invalidate(self):
+        """Forces a reload on the next search, e.g. after nodes were deleted."""
+        with self._lock:
+            self._loaded_at = None
+
+    def add_edges(self, triples):
+        """
+        Adds newly written relationships to a loaded snapshot.
+
+        Args:
+            triples: (source uid, relationship type, target uid) per relationship; types outside
+                `EDGE_TYPES` are ignored.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._pending += [(self._id(source_uid), self._id(target_uid), EDGE_TYPE_CODES[rel_type])
+                              for source_uid, rel_type, target_uid in triples if rel_type in EDGE_TYPE_CODES]
+
+    def paths(self, sources, targets, rel_types, max_length, limit):
+        """
+        Finds the paths along `rel_types` from the sources to the targets, like the variable-length path
+        query of the matching engine: every path of 1 to `max_length` relationships that does not use a
+        relationship twice, shorter paths first.
+
+        Args:
+            sources: The uids the paths start at.
+            targets: The uids the paths end at.
+            rel_types: The relationship types the paths may follow.
+            max_length (int): Maximum number of relationships along a path.
+            limit (int): Maximum number of paths returned.
+
+        Returns:
+            List[Tuple[str, str, List[str]]]: (source uid, target uid, uids along the path) per path.
+        """
+        with self._lock:
+            # uids added concurrently get ids beyond the arrays, so they are resolved with the arrays
+            ids, uids, indptr, indices, types = self._ensure_loaded()
+            start_ids = [ids[uid] for uid in dict.fromkeys(sources) if uid in ids]
+            target_ids = [ids[uid] for uid in targets if uid in ids]
+        is_target = np.zeros(len(indptr) - 1, dtype=bool)
+        is_target[target_ids] = True
+        allowed = np.isin(types, [EDGE_TYPE_CODES[rel_type] for rel_type in rel_types if rel_type in EDGE_TYPE_CODES])
+        if not start_ids or not is_target.any() or not allowed.any():
+            return []
+
+        # one frontier row per path, with the nodes and the edge positions along it
+        nodes = np.array(start_ids, dtype=np.int64)[:, None]
+        edges = np.empty((len(start_ids), 0), dtype=np.int64)
+        rows = []
+        for _ in range(max_length):
+            ends = nodes[:, -1]
+            counts = indptr[ends + 1] - indptr[ends]
+            parents = np.repeat(np.arange(len(ends), dtype=np.int64), counts)
+            offsets = np.arange(len(parents), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+            next_edges = indptr[ends][parents] + offsets
+            keep = allowed[next_edges]
+            parents, next_edges = parents[keep], next_edges[keep]
+            # a path may pass a node twice, but not a relationship
+            keep = ~(edges[parents] == next_edges[:, None]).any(axis=1)
+            parents, next_edges = parents[keep], next_edges[keep]
+            if not len(parents):
+                break
+            nodes = np.hstack([nodes[parents], indices[next_edges][:, None]])
+            edges = np.hstack([edges[parents], next_edges[:, None]])
+            for path in nodes[is_target[nodes[:, -1]]][:limit - len(rows)].tolist():
+                rows.append((uids[path[0]], uids[path[-1]], [uids[i] for i in path]))
+            if len(rows) >= limit:
+                break
+        return rows
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_process_graph():
+    """
+    Return the process-wide process graph snapshot.
+    """
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                graph = ProcessGraph()
+                add_ingestion_listener(graph.add_edges)
+                _graph = graph
+    return _graph
@@ -0,0 +1,164 @@
+import re
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from matching.engine import DecomposedWorkflowEngine, EdgeTable
+from matching.snapshot import ProcessGraph
+
+
+class JoinTest(SimpleTestCase):
+
+    def test_join_order_starts_small_and_stays_connected(self):
+        tables = [
+            EdgeTable("a", "b", [("a1", "b1", [])] * 3),
+            EdgeTable("c", "d", [("c1", "d1", [])] * 1),
+            EdgeTable("b", "c", [("b1", "c1", [])] * 5),
+            EdgeTable("d", "e", [("d1", "e1", [])] * 4),
+        ]
+        # c-d is smallest, then its neighbours by size before the disconnected a-b
+        self.assertEqual(DecomposedWorkflowEngine._join_order(tables), [1, 3, 2, 0])
+
+    def test_join_matches_on_shared_nodes(self):
+        tables = [
+            EdgeTable("a", "b", [("a1", "b1", []), ("a2", "b2", [])]),
+            EdgeTable("b", "c", [("b1", "c1", []), ("b1", "c2", []), ("b3", "c3", [])]),
+        ]
+        joined = DecomposedWorkflowEngine({}, {}, [])._join(tables)
+        self.assertCountEqual(joined, [{0: 0, 1: 0}, {0: 0, 1: 1}])
+
+    def test_join_skips_self_relationships_between_different_nodes(self):
+        tables = [EdgeTable("a", "a", [("a1", "a2", []), ("a1", "a1", [])])]
+        self.assertEqual(DecomposedWorkflowEngine({}, {}, [])._join(tables), [{0: 1}])
+
+    def test_join_without_match_is_empty(self):
+        tables = [
+            EdgeTable("a", "b", [("a1", "b1", [])]),
+            EdgeTable("b", "c", [("b2", "c1", []), ("b3", "c1", [])]),
+        ]
+        self.assertEqual(DecomposedWorkflowEngine({}, {}, [])._join(tables), [])
+
+    @patch("matching.engine.MATCHER_RESULT_LIMIT", 2)
+    def test_limit_applies_to_last_join_only(self):
+        # only the last row of the first table joins, a limited first join would drop it
+        tables = [
+            EdgeTable("a", "b", [("a1", "b1", []), ("a2", "b2", []), ("a3", "b3", [])]),
+            EdgeTable("b", "c", [("b3", "c1", []), ("b3", "c2", []), ("b3", "c3", []), ("b4", "c4", [])]),
+        ]
+        joined = DecomposedWorkflowEngine({}, {}, [])._join(tables)
+        self.assertEqual(len(joined), 2)
+        self.assertTrue(all(rows[0] == 2 for rows in joined))
+
+
+class ProcessGraphTest(SimpleTestCase):
+
+    EDGES = {
+        "IS_MANUFACTURING_INPUT": [("m1", "p1"), ("m2", "p2")],
+        "IS_MANUFACTURING_OUTPUT": [("p1", "m3"), ("p2", "m4"), ("p1", "x")],
+        "HAS_PARAMETER": [("x", "m4")],
+        "HAS_PROPERTY": [],
+        "IS_A": [],
+    }
+
+    def setUp(self):
+        patcher = patch("matching.snapshot.db.cypher_query", side_effect=self._cypher_query)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.graph = ProcessGraph()
+
+    def _cypher_query(self, query, params=None):
+        rel_type = query.split("[:")[1].split("]")[0]
+        return [list(edge) for edge in self.EDGES[rel_type]], None
+
+    def test_paths_follow_allowed_types(self):
+        paths = self.graph.paths(["m1", "m2"], ["m3", "m4"],
+                                 ["IS_MANUFACTURING_INPUT", "IS_MANUFACTURING_OUTPUT"], 4, 10)
+        self.assertCountEqual(paths, [("m1", "m3", ["m1", "p1", "m3"]), ("m2", "m4", ["m2", "p2", "m4"])])
+
+    def test_paths_are_bounded(self):
+        rel_types = ["IS_MANUFACTURING_INPUT", "IS_MANUFACTURING_OUTPUT", "HAS_PARAMETER"]
+        self.assertEqual(self.graph.paths(["m1"], ["m4"], rel_types, 3, 10), [("m1", "m4", ["m1", "p1", "x", "m4"])])
+        self.assertEqual(self.graph.paths(["m1"], ["m4"], rel_types, 2, 10), [])
+
+    def test_all_paths_are_returned(self):
+        self.EDGES = {**self.EDGES, "HAS_PARAMETER": [("x", "m4"), ("p1", "y"), ("y", "m4")]}
+        paths = self.graph.paths(["m1"], ["m4"], ["IS_MANUFACTURING_INPUT", "IS_MANUFACTURING_OUTPUT", "HAS_PARAMETER"],
+                                 4, 10)
+        self.assertCountEqual(paths, [("m1", "m4", ["m1", "p1", "x", "m4"]), ("m1", "m4", ["m1", "p1", "y", "m4"])])
+
+    def test_paths_limit(self):
+        paths = self.graph.paths(["m1"], ["p1", "m3", "x"],
+                                 ["IS_MANUFACTURING_INPUT", "IS_MANUFACTURING_OUTPUT"], 4, 2)
+        self.assertEqual(paths, [("m1", "p1", ["m1", "p1"]), ("m1", "m3", ["m1", "p1", "m3"])])
+
+    def test_added_edges_are_searched(self):
+        self.graph.paths(["m1"], ["m3"], ["IS_MANUFACTURING_INPUT"], 1, 10)
+        self.graph.add_edges([("m3", "IS_MANUFACTURING_INPUT", "p9"), ("m3", "UNRELATED", "p1")])
+        paths = self.graph.paths(["m1"], ["p9"], ["IS_MANUFACTURING_INPUT", "IS_MANUFACTURING_OUTPUT"], 4, 10)
+        self.assertEqual(paths, [("m1", "p9", ["m1", "p1", "m3", "p9"])])
+
+    def test_unknown_uids_have_no_paths(self):
+        self.assertEqual(self.graph.paths(["unknown"], ["m3"], ["IS_MANUFACTURING_INPUT"], 4, 10), [])
+
+
+class EngineSnapshotTest(SimpleTestCase):
+    """The snapshot has to answer the path queries like the database."""
+
+    # two branches from m1 to m2, and a cycle back from m3 to m1
+    EDGES = {
+        "IS_MANUFACTURING_INPUT": [("m1", "p1"), ("m1", "p2"), ("m2", "p3"), ("m3", "p4")],
+        "IS_MANUFACTURING_OUTPUT": [("p1", "m2"), ("p2", "m2"), ("p3", "m3"), ("p4", "m1")],
+        "HAS_PARAMETER": [("p3", "t")],
+        "HAS_PROPERTY": [],
+        "IS_A": [],
+    }
+    CANDIDATES = {"a": ["m1"], "b": ["m2", "p3"], "c": ["m3", "t"]}
+
+    def setUp(self):
+        for target in ("matching.engine.db.cypher_query", "matching.snapshot.db.cypher_query"):
+            patcher = patch(target, side_effect=self._cypher_query)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _cypher_query(self, query, params=None):
+        if query.startswith("candidates"):
+            return [[self.CANDIDATES[query.split()[1]]]], None
+        if "MATCH path" in query:
+            rel_types, max_length = re.search(r"\[:([A-Z_|]+)\*\.\.(\d+)\]", query).groups()
+            return self._match_paths(params, rel_types.split("|"), int(max_length)), None
+        if "UNWIND $uids" in query:
+            return [], None
+        rel_type = query.split("[:")[1].split("]")[0]
+        return [list(edge) for edge in self.EDGES[rel_type]], None
+
+    def _match_paths(self, params, rel_types, max_length):
+        """Variable-length path semantics: 1 to `max_length` relationships, none of them twice."""
+        edges = [(rel_type, edge) for rel_type in rel_types for edge in self.EDGES[rel_type]]
+        rows = []
+
+        def expand(path, used):
+            if len(path) > 1 and path[-1] in params["targets"]:
+                rows.append([path[0], path[-1], list(path)])
+            if len(used) < max_length:
+                for position, (_, (source, target)) in enumerate(edges):
+                    if source == path[-1] and position not in used:
+                        expand(path + [target], used | {position})
+
+        for source in params["sources"]:
+            expand([source], frozenset())
+        return rows[:params["limit"]]
+
+    def execute(self, relationships, snapshot=None):
+        engine = DecomposedWorkflowEngine({node_id: f"candidates {node_id}" for node_id in self.CANDIDATES},
+                                          {"a": "Matter", "b": "Matter", "c": "Matter"}, relationships,
+                                          snapshot=snapshot)
+        return sorted(engine.execute()[0][0][0], key=repr)
+
+    def test_engines_agree_on_branching_graph(self):
+        relationships = [("a", "b", "IS_MANUFACTURING_INPUT|IS_MANUFACTURING_OUTPUT"),
+                         ("b", "c", "IS_MANUFACTURING_INPUT|IS_MANUFACTURING_OUTPUT|HAS_PARAMETER")]
+        expected = self.execute(relationships)
+        self.assertEqual(self.execute(relationships, snapshot=ProcessGraph()), expected)
+        # both branches from m1 to m2 are workflows of their own
+        self.assertIn(["m1", "p1", "m2", "p3", "m3", None, None, None, None, None], expected)
+        self.assertIn(["m1", "p2", "m2", "p3", "m3", None, None, None, None, None], expected)
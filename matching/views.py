@@ -9,7 +9,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .utils.process_management import create_extract_process
-from tasks.models import ProcessStatus
+from tasks.models import JobKind, ProcessStatus
 from .models import ExtractProcess
 
 from .tasks import match_workflow
@@ -68,7 +68,7 @@ class WorkflowMatcher(APIView):
                 process.status = ProcessStatus.PROCESSING
                 process.save()
 
-                submit_task(process_id, match_workflow, process)
+                submit_task(process_id, match_workflow, process, kind=JobKind.CPU)
 
                 return Response(
                     {"status": ProcessStatus.PROCESSING, "message": "Process started"},
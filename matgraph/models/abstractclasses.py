@@ -52,34 +52,14 @@ class OntologyNode(UIDDjangoNode):
         return EmbeddingNodeSet(cls)
 
     def get_subclasses(self, uids):
-        prompt = f"""
-        // Part 1: Return details of `n`
-        MATCH (n:{self._meta.object_name})
-        WHERE n.uid IN {uids}
-        RETURN n.uid AS uid, n.name AS name
-        UNION ALL
-        // Part 2: Return details of `m`
-        MATCH (n:{self._meta.object_name})<-[:EMMO__IS_A*]-(m)
-        WHERE n.uid IN {uids}
-        RETURN DISTINCT m.uid AS uid, m.name AS name
-        """
-        results, meta = self.cypher(prompt)
-        return [(node[0], node[1]) for node in results]
+        """Return (uid, name) of the nodes with the given uids and of all their subclasses."""
+        from ontologymanagement.subsumption import get_subsumption_index
+        return get_subsumption_index(type(self)).subclasses(uids)
 
     def get_superclasses(self, uids):
-        prompt = f"""
-        // Part 1: Return details of `n`
-        MATCH (n:{self._meta.object_name})
-        WHERE n.uid IN {uids}
-        RETURN n.uid AS uid, n.name AS name
-        UNION ALL
-        // Part 2: Return details of `m`
-        MATCH (n:{self._meta.object_name})-[:EMMO__IS_A*]->(m)
-        WHERE n.uid IN {uids}
-        RETURN DISTINCT m.uid AS uid, m.name AS name
-        """
-        results, meta = self.cypher(prompt)
-        return [(node[0], node[1]) for node in results]
+        """Return (uid, name) of the nodes with the given uids and of all their superclasses."""
+        from ontologymanagement.subsumption import get_subsumption_index
+        return get_subsumption_index(type(self)).superclasses(uids)
 
     name = StringProperty()
     uri = StringProperty()
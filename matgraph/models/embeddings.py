@@ -1,5 +1,6 @@
 from neomodel import StringProperty, FloatProperty, ArrayProperty, RelationshipTo, OneOrMore
 
+from graphutils.embeddings import mark_pending
 from graphutils.models import UIDDjangoNode
 
 
@@ -20,6 +21,10 @@ class ModelEmbedding(UIDDjangoNode):
     )
     input = StringProperty(required=True)  # The original input used to generate the vector
 
+    def post_save(self):
+        # Let the in-process vector indices pick up the new vector before their next query
+        mark_pending(self.uid, self.inherited_labels())
+
 
 
 class MatterEmbedding(ModelEmbedding):
@@ -8,6 +8,9 @@ class PhysicalQuantity(CausalObject):
     """
     unit = StringProperty()
     value = FloatProperty()
+    # the value in SI base units and the canonical unit of its dimension, see graphutils.units
+    value_si = FloatProperty()
+    unit_si = StringProperty()
     dataframe_json = JSONProperty()
     class Meta:
         app_label = 'matgraph'
@@ -3,10 +3,8 @@ import os
 import pandas as pd
 from dotenv import load_dotenv
 from neomodel import db
-from pandarallel import pandarallel
 
-from graphutils.config import EMBEDDING_FETCHING_PROCESSES
-from graphutils.embeddings import request_embedding
+from graphutils.embeddings import request_embeddings
 from matgraph.models.ontology import EMMOMatter, EMMOProcess, EMMOQuantity
 
 
@@ -97,19 +95,15 @@ def fetch_embedding_from_db(input_string):
     # If no result was found, return None
     return None
 
-def iterate_over_inputs(input_list):
-    embeddings =[]
-    for input in input_list:
-        if fetch_embedding_from_db(input) == None:
-            embeddings.append(request_embedding(input))
-    return embeddings
+def filter_missing_inputs(input_list):
+    return [input for input in input_list if fetch_embedding_from_db(input) == None]
 
 def apply_embedding(df_all, resume):
-    pandarallel.initialize(nb_workers=EMBEDDING_FETCHING_PROCESSES, progress_bar=True, use_memory_fs=False)
-    if resume:
-        df_all['embedding'] = df_all['combined'].apply(lambda x: iterate_over_inputs(x))
-    else:
-        df_all['embedding'] = df_all.combined.swifter.apply(request_embedding)
+    combined = df_all['combined'].apply(filter_missing_inputs) if resume else df_all['combined']
+    # Embed the inputs of all rows in one batched run and split the vectors back per row
+    inputs = [input for row in combined for input in row]
+    vectors = iter(request_embeddings(inputs)) if inputs else iter([])
+    df_all['embedding'] = [[next(vectors) for _ in row] for row in combined]
     return df_all
 
 def generate_ingest_query(Model, id_property):
@@ -0,0 +1,151 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from neomodel import db
+
+from graphutils.config import LEXICAL_MATCH_THRESHOLD, LEXICAL_INDEX_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_term(text):
+    """
+    Normalizes an ontology name or input string for lexical comparison: case-folded, underscores and hyphens
+    replaced by spaces, whitespace collapsed.
+    """
+    return re.sub(r"\s+", " ", re.sub(r"[_\-]", " ", str(text).casefold())).strip()
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LexicalIndex:
+    """
+    In-memory lexical index over the names and alternative labels of one ontology class.
+
+    Exact matches on the normalized name or alternative label are answered from a dictionary, near-exact
+    matches from a trigram index scored by Jaccard similarity. Only unambiguous hits at or above
+    `LEXICAL_MATCH_THRESHOLD` are returned, everything else is left to the vector search.
+
+    Attributes:
+        Model: The ontology node class (EMMOMatter, EMMOProcess or EMMOQuantity).
+    """
+
+    def __init__(self, Model):
+        self.Model = Model
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded_at = None
+        self._index = None
+
+    def load(self):
+        """Loads all names and alternative labels of the ontology class from the database."""
+        logger.info(f"Loading lexical index for {self.Model.__label__}")
+        query = f"""
+            MATCH (n:{self.Model.__label__})
+            OPTIONAL MATCH (n)-[:HAS_LABEL]->(a:AlternativeLabel)
+            RETURN n, collect(a.label)
+        """
+        results, _ = db.cypher_query(query)
+        # (nodes, exact term -> node, (term, node, trigrams) per term, trigram -> terms), built aside and
+        # swapped in as a whole, lookups read the index without the lock
+        index = ([], {}, [], defaultdict(set))
+        for node, labels in results:
+            self._add(index, node, node.get("name"), labels)
+        with self._lock:
+            self._index = index
+            self._loaded_at = time.monotonic()
+
+    @staticmethod
+    def _add(index, node, name, labels):
+        nodes, exact, terms, postings = index
+        node_index = len(nodes)
+        nodes.append(node)
+        # names take precedence over alternative labels of other nodes
+        for i, text in enumerate([name, *labels]):
+            if not text or not (term := normalize_term(text)):
+                continue
+            if i == 0 or term not in exact:
+                exact[term] = node_index
+            term_index = len(terms)
+            terms.append((term, node_index, trigrams(term)))
+            for trigram in terms[term_index][2]:
+                postings[trigram].add(term_index)
+
+    def add(self, node):
+        """Adds a newly created ontology node to a loaded index."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            nodes, exact, terms, postings = self._index
+            # copied instead of changed in place, only the posting sets of the new terms are copied
+            postings = defaultdict(set, postings)
+            for trigram in trigrams(normalize_term(node.name or "")):
+                postings[trigram] = set(postings[trigram])
+            index = (list(nodes), dict(exact), list(terms), postings)
+            self._add(index, node, node.name, [])
+            self._index = index
+
+    def _inflate(self, nodes, node_index):
+        node = nodes[node_index]
+        return node if isinstance(node, self.Model) else self.Model.inflate(node)
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > LEXICAL_INDEX_MAX_AGE:
+                self.load()
+        with self._lock:
+            return self._index
+
+    def lookup(self, text, threshold=LEXICAL_MATCH_THRESHOLD):
+        """
+        Find the ontology node matching the input lexically.
+
+        Args:
+            text (str): The input string.
+            threshold (float): The minimal trigram similarity for near-exact matches.
+
+        Returns:
+            tuple: (node, score) for exact (score 1.0) or unambiguous near-exact matches, otherwise None.
+        """
+        nodes, exact, terms, postings = self._ensure_loaded()
+        term = normalize_term(text)
+        if not term:
+            return None
+        if (node_index := exact.get(term)) is not None:
+            return self._inflate(nodes, node_index), 1.0
+
+        query_trigrams = trigrams(term)
+        shared = Counter(term_index for trigram in query_trigrams for term_index in postings.get(trigram, ()))
+        best = {}
+        for term_index, count in shared.items():
+            _, node_index, term_trigrams = terms[term_index]
+            score = count / (len(query_trigrams) + len(term_trigrams) - count)
+            if score >= threshold and score > best.get(node_index, 0):
+                best[node_index] = score
+        if not best:
+            return None
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        if len(ranked) > 1 and ranked[0][1] == ranked[1][1]:
+            return None
+        return self._inflate(nodes, ranked[0][0]), ranked[0][1]
+
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_lexical_index(Model):
+    """
+    Return the process-wide lexical index for an ontology class.
+    """
+    if Model not in _indices:
+        with _indices_lock:
+            if Model not in _indices:
+                _indices[Model] = LexicalIndex(Model)
+    return _indices[Model]
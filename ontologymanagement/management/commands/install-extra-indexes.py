@@ -25,3 +25,12 @@ class Command(BaseCommand):
         db.cypher_query('''
             CREATE INDEX skill_level IF NOT EXISTS FOR ()-[r:HAS_SKILL]-() ON (r.level)
         ''')
+
+        # range filters of the workflow matcher seek on (canonical unit, SI value)
+        db.cypher_query('''
+            CREATE RANGE INDEX property_unit_si_value_si IF NOT EXISTS FOR (n:Property) ON (n.unit_si, n.value_si)
+        ''')
+
+        db.cypher_query('''
+            CREATE RANGE INDEX parameter_unit_si_value_si IF NOT EXISTS FOR (n:Parameter) ON (n.unit_si, n.value_si)
+        ''')
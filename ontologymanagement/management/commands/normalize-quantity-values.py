@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from neomodel import db
+
+from graphutils.config import INGESTION_BATCH_SIZE
+from graphutils.units import normalize_quantity
+
+
+# the importer writes value_si/unit_si for new properties and parameters.
+# this command fills them in for nodes imported before, or after the unit table changed.
+
+class Command(BaseCommand):
+    help = 'Write the SI value and canonical unit of all Property and Parameter nodes'
+
+    def handle(self, *args, **options):
+        for label in ("Property", "Parameter"):
+            after, updated = "", 0
+            while True:
+                results, _ = db.cypher_query(f'''
+                    MATCH (n:{label}) WHERE n.uid > $after
+                    RETURN n.uid, n.value, n.unit ORDER BY n.uid LIMIT $limit
+                ''', {"after": after, "limit": INGESTION_BATCH_SIZE})
+                if not results:
+                    break
+                after = results[-1][0]
+                rows = []
+                for uid, value, unit in results:
+                    value_si, unit_si = normalize_quantity(value, unit)
+                    rows.append({"uid": uid, "value_si": value_si, "unit_si": unit_si if value_si is not None else None})
+                db.cypher_query(f'''
+                    UNWIND $rows AS row
+                    MATCH (n:{label} {{uid: row.uid}})
+                    SET n.value_si = row.value_si, n.unit_si = row.unit_si
+                ''', {"rows": rows})
+                updated += sum(row["value_si"] is not None for row in rows)
+            self.stdout.write(f"{label}: {updated} values normalized")
@@ -14,13 +14,15 @@ from owlready2 import get_ontology, Thing
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
 from graphutils.config import CHAT_GPT_MODEL
-from graphutils.embeddings import request_embedding
+from graphutils.embeddings import request_embeddings
+from graphutils.ratelimit import get_http_client
 from graphutils.models import AlternativeLabel
 from matgraph.models.embeddings import MatterEmbedding, ProcessEmbedding, QuantityEmbedding
 from matgraph.models.ontology import EMMOMatter, EMMOQuantity, EMMOProcess
 from ontologymanagement.examples import MATTER_ONTOLOGY_ASSISTANT_EXAMPLES, QUANTITY_ONTOLOGY_ASSISTANT_EXAMPLES, \
     PROCESS_ONTOLOGY_ASSISTANT_EXAMPLES
 from ontologymanagement.schema import OntologyClass
+from ontologymanagement.subsumption import get_subsumption_index
 from ontologymanagement.setupMessages import MATTER_ONTOLOGY_ASSISTANT_MESSAGES, QUANTITY_ONTOLOGY_ASSISTANT_MESSAGES, \
     PROCESS_ONTOLOGY_ASSISTANT_MESSAGES
 
@@ -79,7 +81,7 @@ class OntologyManager:
         """Performs the initial extraction of relationships using GPT-4."""
 
         class_name = str(class_name).lower()
-        llm = ChatOpenAI(model=CHAT_GPT_MODEL, api_key=os.getenv("OPENAI_API_KEY"))
+        llm = ChatOpenAI(model=CHAT_GPT_MODEL, api_key=os.getenv("OPENAI_API_KEY"), http_client=get_http_client())
         llm = llm.bind_tools([OntologyClass])
         setup_message = setup_message
         prompt = ChatPromptTemplate.from_messages(setup_message)
@@ -131,6 +133,18 @@ class OntologyManager:
 
             onto.save(ontology_path1, format="rdfxml")
 
+    def precompute_embeddings(self, onto):
+        """Embeds the names, descriptions and alternative labels of all classes in one batched run."""
+        inputs = []
+        for cls in onto.classes():
+            inputs.append(str(cls.name).lower())
+            if cls.comment:
+                inputs.append(str(cls.description_name).replace("'","").replace("[","").replace("]",""))
+            if cls.alternative_labels:
+                inputs.extend(ast.literal_eval(cls.alternative_labels[0]))
+        inputs = list(dict.fromkeys(inputs))
+        return dict(zip(inputs, request_embeddings(inputs)))
+
     def import_to_neo4j(self, ontology_file):
 
         ontology_path = os.path.join(self.ontology_folder, ontology_file)
@@ -139,6 +153,8 @@ class OntologyManager:
         with onto:
             pass
 
+        vectors = self.precompute_embeddings(onto)
+
         for cls in onto.classes():
 
             class_name = str(cls.name).lower()
@@ -171,13 +187,14 @@ class OntologyManager:
                     cls_instance.model_embedding.connect(secondary_embedding_name)
                     cls_instance.model_embedding.connect(secondary_embedding_description)
             except:
-                vector_name = request_embedding(class_name)
+                vector_name = vectors[class_name]
                 embedding_name = EMBEDDING_MODEL_MAPPER[ontology_file](vector=vector_name, input=class_name).save()
                 cls_instance.model_embedding.connect(embedding_name)
-                vector_description = request_embedding(class_comment)
-                embedding_description = EMBEDDING_MODEL_MAPPER[ontology_file](vector=vector_description,
-                                                                              input=class_comment).save()
-                cls_instance.model_embedding.connect(embedding_description)
+                if class_comment is not None:
+                    vector_description = vectors[class_comment]
+                    embedding_description = EMBEDDING_MODEL_MAPPER[ontology_file](vector=vector_description,
+                                                                                  input=class_comment).save()
+                    cls_instance.model_embedding.connect(embedding_description)
             if cls.alternative_labels:
 
                 for label in ast.literal_eval(cls.alternative_labels[0]):
@@ -198,7 +215,7 @@ class OntologyManager:
                             secondary_embedding_node =EMBEDDING_MODEL_MAPPER[ontology_file](input= embedding_node.input, vector=embedding_node.vector)
                             cls_instance.model_embedding.connect(secondary_embedding_node)
                     except:
-                        vector = request_embedding(label)
+                        vector = vectors[label]
                         embedding_node = EMBEDDING_MODEL_MAPPER[ontology_file](vector=vector, input=alt_label).save()
                         cls_instance.model_embedding.connect(embedding_node)
 
@@ -221,6 +238,9 @@ class OntologyManager:
                     subclass_instance.save()
                     subclass_instance.emmo_subclass.connect(cls_instance)
 
+        # the hierarchy changed in bulk, reload it instead of applying every edge
+        get_subsumption_index(self.file_to_model[ontology_file]).invalidate()
+
     def update_all_ontologies(self):
         ontologies = [f for f in os.listdir(self.ontology_folder) if f.endswith(".owl")]
         for ontology_file in ontologies:
@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+
+from neomodel import db
+
+from graphutils.config import (
+    SUBSUMPTION_INDEX_MAX_AGE,
+    SUBSUMPTION_MISS_RELOAD_INTERVAL,
+    SUBSUMPTION_PERSIST_DESCENDANTS,
+    INGESTION_BATCH_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _bits(bitset):
+    """Yields the positions of the set bits of an integer bitset."""
+    while bitset:
+        lowest = bitset & -bitset
+        yield lowest.bit_length() - 1
+        bitset ^= lowest
+
+
+class SubsumptionIndex:
+    """
+    In-memory transitive closure of the EMMO__IS_A hierarchy of one ontology class.
+
+    Every ontology node gets an integer id, its descendants and ancestors (itself included) are kept as
+    integer bitsets, so subclass and superclass sets are answered by lookup instead of a variable-length
+    traversal. Bitsets instead of interval labels keep the closure exact under multiple inheritance.
+    Nodes and edges added by this process are applied incrementally, changes of other processes are picked
+    up by a full reload after `SUBSUMPTION_INDEX_MAX_AGE` seconds, or earlier when a lookup asks for an
+    unknown node.
+
+    Attributes:
+        Model: The ontology node class (EMMOMatter, EMMOProcess or EMMOQuantity).
+    """
+
+    def __init__(self, Model):
+        self.Model = Model
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+    def load(self):
+        """Loads the hierarchy of the ontology class and computes its closure."""
+        logger.info(f"Loading subsumption index for {self.Model.__label__}")
+        query = f"""
+            MATCH (n:{self.Model.__label__})
+            OPTIONAL MATCH (n)-[:EMMO__IS_A]->(parent:{self.Model.__label__})
+            RETURN n.uid, n.name, collect(parent.uid)
+        """
+        results, _ = db.cypher_query(query)
+        self._ids = {uid: i for i, (uid, _, _) in enumerate(results)}
+        self._uids = [uid for uid, _, _ in results]
+        self._names = [name for _, name, _ in results]
+        children = [[] for _ in results]
+        parents = [[] for _ in results]
+        for uid, _, parent_uids in results:
+            for parent_uid in parent_uids:
+                if parent_uid in self._ids:
+                    children[self._ids[parent_uid]].append(self._ids[uid])
+                    parents[self._ids[uid]].append(self._ids[parent_uid])
+        self._descendants = self._closure(children)
+        self._ancestors = self._closure(parents)
+        self._loaded_at = time.monotonic()
+        if SUBSUMPTION_PERSIST_DESCENDANTS:
+            self.persist(range(len(self._uids)))
+
+    @staticmethod
+    def _closure(edges):
+        """
+        Returns for every node the bitset of the nodes reachable over `edges`, the node itself included.
+
+        Strongly connected components (cycles in the hierarchy) are collapsed with Tarjan's algorithm, which
+        emits every component after all components it reaches, so one pass over them builds the closure.
+        """
+        count = len(edges)
+        closure = [0] * count
+        index, low, on_stack = [None] * count, [0] * count, [False] * count
+        stack, counter = [], 0
+        for root in range(count):
+            if index[root] is not None:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child = work.pop()
+                if child == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                if child < len(edges[node]):
+                    work.append((node, child + 1))
+                    target = edges[node][child]
+                    if index[target] is None:
+                        work.append((target, 0))
+                    elif on_stack[target]:
+                        low[node] = min(low[node], index[target])
+                    continue
+                for target in edges[node]:
+                    if on_stack[target] and index[target] > index[node]:
+                        low[node] = min(low[node], low[target])
+                if low[node] != index[node]:
+                    continue
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                reachable = 0
+                for member in component:
+                    reachable |= 1 << member
+                for member in component:
+                    for target in edges[member]:
+                        reachable |= closure[target]
+                for member in component:
+                    closure[member] = reachable
+        return closure
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > SUBSUMPTION_INDEX_MAX_AGE:
+                self.load()
+
+    def invalidate(self):
+        """Forces a reload on the next lookup, e.g. after a bulk ontology import."""
+        with self._lock:
+            self._loaded_at = None
+
+    def add(self, node):
+        """Adds a newly created ontology node to a loaded index."""
+        with self._lock:
+            if self._loaded_at is None or node.uid in self._ids:
+                return
+            i = len(self._uids)
+            self._ids[node.uid] = i
+            self._uids.append(node.uid)
+            self._names.append(node.name)
+            self._descendants.append(1 << i)
+            self._ancestors.append(1 << i)
+
+    def add_edge(self, child_uid, parent_uid):
+        """Applies a new `(child)-[:EMMO__IS_A]->(parent)` relationship to a loaded index."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if child_uid not in self._ids or parent_uid not in self._ids:
+                # one of the nodes was created by another process
+                self._loaded_at = None
+                return
+            child, parent = self._ids[child_uid], self._ids[parent_uid]
+            descendants, ancestors = self._descendants[child], self._ancestors[parent]
+            changed = list(_bits(ancestors))
+            for i in changed:
+                self._descendants[i] |= descendants
+            for i in _bits(descendants):
+                self._ancestors[i] |= ancestors
+        if SUBSUMPTION_PERSIST_DESCENDANTS:
+            self.persist(changed)
+
+    def persist(self, ids):
+        """Writes the descendant uids of the given nodes to their `descendant_uids` property."""
+        with self._lock:
+            rows = [{"uid": self._uids[i], "descendants": self.descendants([self._uids[i]])} for i in ids]
+        query = f"""
+            UNWIND $rows AS row
+            MATCH (n:{self.Model.__label__} {{uid: row.uid}})
+            SET n.descendant_uids = row.descendants
+        """
+        for start in range(0, len(rows), INGESTION_BATCH_SIZE):
+            db.cypher_query(query, {"rows": rows[start:start + INGESTION_BATCH_SIZE]})
+
+    def _lookup(self, closure, uids):
+        self._ensure_loaded()
+        with self._lock:
+            if any(uid not in self._ids for uid in uids) and \
+                    time.monotonic() - self._loaded_at > SUBSUMPTION_MISS_RELOAD_INTERVAL:
+                # the class may have been created by another process since the last load
+                self.load()
+            closure = getattr(self, closure)
+            reachable = 0
+            for uid in uids:
+                if uid in self._ids:
+                    reachable |= closure[self._ids[uid]]
+            return [(self._uids[i], self._names[i]) for i in _bits(reachable)]
+
+    def _closure_uids(self, closure, uids):
+        found = [uid for uid, _ in self._lookup(closure, uids)]
+        known = set(found)
+        # classes still unknown after a reload at least match themselves, like a *0.. traversal
+        return found + [uid for uid in dict.fromkeys(uids) if uid not in known]
+
+    def descendants(self, uids):
+        """Return the uids of the given nodes and all their (transitive) subclasses."""
+        return self._closure_uids("_descendants", uids)
+
+    def ancestors(self, uids):
+        """Return the uids of the given nodes and all their (transitive) superclasses."""
+        return self._closure_uids("_ancestors", uids)
+
+    def subclasses(self, uids):
+        """Return (uid, name) of the given nodes and all their subclasses."""
+        return self._lookup("_descendants", uids)
+
+    def superclasses(self, uids):
+        """Return (uid, name) of the given nodes and all their superclasses."""
+        return self._lookup("_ancestors", uids)
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_subsumption_index(Model):
+    """
+    Return the process-wide subsumption index for an ontology class.
+    """
+    if Model not in _indices:
+        with _indices_lock:
+            if Model not in _indices:
+                _indices[Model] = SubsumptionIndex(Model)
+    return _indices[Model]
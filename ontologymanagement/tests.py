@@ -0,0 +1,102 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from ontologymanagement.lexicalSearch import LexicalIndex
+from ontologymanagement.subsumption import SubsumptionIndex
+
+
+class OntologyClass:
+    __label__ = "EMMOTest"
+
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def inflate(cls, node):
+        return cls(node["name"])
+
+
+class ClosureTest(SimpleTestCase):
+
+    @staticmethod
+    def members(bitset):
+        return {i for i in range(bitset.bit_length()) if bitset >> i & 1}
+
+    def test_chain(self):
+        closure = SubsumptionIndex._closure([[1], [2], []])
+        self.assertEqual([self.members(bits) for bits in closure], [{0, 1, 2}, {1, 2}, {2}])
+
+    def test_multiple_inheritance(self):
+        # 0 -> 1 -> 3 and 0 -> 2 -> 3
+        closure = SubsumptionIndex._closure([[1, 2], [3], [3], []])
+        self.assertEqual([self.members(bits) for bits in closure], [{0, 1, 2, 3}, {1, 3}, {2, 3}, {3}])
+
+    def test_cycles_share_their_closure(self):
+        # 0 -> 1 -> 2 -> 1, 2 -> 3
+        closure = SubsumptionIndex._closure([[1], [2], [1, 3], []])
+        self.assertEqual([self.members(bits) for bits in closure], [{0, 1, 2, 3}, {1, 2, 3}, {1, 2, 3}, {3}])
+
+
+class SubsumptionIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        # (uid, name, parent uids) per node: child -> parent -> root
+        self.rows = [["root", "Root", []], ["parent", "Parent", ["root"]], ["child", "Child", ["parent"]]]
+        patcher = patch("ontologymanagement.subsumption.db.cypher_query",
+                        side_effect=lambda query, params=None: ([list(row) for row in self.rows], None))
+        self.cypher_query = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = SubsumptionIndex(OntologyClass)
+
+    def test_descendants_and_ancestors(self):
+        self.assertCountEqual(self.index.descendants(["parent"]), ["parent", "child"])
+        self.assertCountEqual(self.index.ancestors(["child"]), ["child", "parent", "root"])
+        self.assertCountEqual(self.index.subclasses(["root"]),
+                              [("root", "Root"), ("parent", "Parent"), ("child", "Child")])
+
+    def test_added_edges_update_the_closure(self):
+        self.index.descendants(["root"])
+        self.index.add(type("Node", (), {"uid": "leaf", "name": "Leaf"}))
+        self.index.add_edge("leaf", "child")
+        self.assertCountEqual(self.index.descendants(["parent"]), ["parent", "child", "leaf"])
+        self.assertEqual(self.cypher_query.call_count, 1)
+
+    @patch("ontologymanagement.subsumption.SUBSUMPTION_MISS_RELOAD_INTERVAL", -1)
+    def test_unknown_uids_reload_the_index(self):
+        self.index.descendants(["root"])
+        self.rows.append(["other", "Other", ["child"]])
+        self.assertCountEqual(self.index.descendants(["child"]), ["child"])
+        self.assertCountEqual(self.index.descendants(["other", "parent"]), ["other", "parent", "child"])
+        self.assertCountEqual(self.index.descendants(["parent"]), ["parent", "child", "other"])
+
+    def test_unknown_uids_match_themselves(self):
+        self.assertCountEqual(self.index.descendants(["missing", "child"]), ["child", "missing"])
+
+
+class LexicalIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        rows = [[{"name": "Carbon Black"}, ["CB"]], [{"name": "Platinum"}, []], [{"name": "Platinium Oxide"}, []]]
+        patcher = patch("ontologymanagement.lexicalSearch.db.cypher_query",
+                        side_effect=lambda query, params=None: ([list(row) for row in rows], None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = LexicalIndex(OntologyClass)
+
+    def test_exact_matches_on_names_and_labels(self):
+        node, score = self.index.lookup("carbon_black")
+        self.assertEqual((node.name, score), ("Carbon Black", 1.0))
+        self.assertEqual(self.index.lookup("cb")[0].name, "Carbon Black")
+
+    def test_near_exact_matches(self):
+        self.assertEqual(self.index.lookup("Platinum Oxide", threshold=0.6)[0].name, "Platinium Oxide")
+        self.assertIsNone(self.index.lookup("Graphite"))
+
+    def test_added_nodes_are_found_without_changing_a_handed_out_index(self):
+        _, _, _, postings = self.index._ensure_loaded()
+        before = {trigram: set(terms) for trigram, terms in postings.items()}
+        self.index.add(OntologyClass("Carbon Paper"))
+        self.assertEqual(self.index.lookup("carbon paper")[0].name, "Carbon Paper")
+        # an index handed to a running lookup is never changed
+        self.assertEqual({trigram: set(terms) for trigram, terms in postings.items()}, before)
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from tasks.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "process_id", "user_id", "func", "kind", "priority", "status", "attempts", "created_at",
+                    "started_at", "finished_at")
+    list_filter = ("status", "kind")
+    search_fields = ("process_id", "user_id")
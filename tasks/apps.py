@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        from graphutils.config import JOB_QUEUE_START_ON_BOOT
+        from tasks.task_manager import should_start_on_boot, start_workers
+
+        # queued and orphaned jobs are picked up without waiting for a new submit
+        if JOB_QUEUE_START_ON_BOOT and should_start_on_boot():
+            start_workers()
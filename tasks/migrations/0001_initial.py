@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process_id', models.CharField(db_index=True, max_length=255)),
+                ('user_id', models.CharField(db_index=True, max_length=255)),
+                ('func', models.CharField(max_length=255)),
+                ('args', models.JSONField(default=list)),
+                ('kind', models.CharField(choices=[('io', 'IO bound'), ('cpu', 'CPU bound')], default='io', max_length=8)),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Ready'), (2, 'Pending'), (3, 'Processing'), (4, 'Completed'), (5, 'Failed'), (6, 'Paused'), (7, 'Cancelled'), (8, 'Skipped'), (9, 'Timed Out')], default=2)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('worker', models.CharField(blank=True, max_length=255, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'tasks_job',
+                'indexes': [models.Index(fields=['status', 'kind', '-priority', 'created_at'], name='tasks_job_queue_idx')],
+            },
+        ),
+    ]
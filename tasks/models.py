@@ -87,3 +87,56 @@ class Process(models.Model):
             logger.warning(f"IntegrityError on {cls.__name__} creation — resetting sequence and retrying...")
             cls.reset_pk_sequence()
             return cls.objects.create(**kwargs)
+
+
+class JobKind:
+    IO = "io"
+    CPU = "cpu"
+
+    DJANGO_CHOICES = [(IO, "IO bound"), (CPU, "CPU bound")]
+
+
+class JobPriority:
+    LOW = -10
+    NORMAL = 0
+    HIGH = 10
+
+
+class Job(models.Model):
+    """
+    A task waiting for or running on the workers of `tasks.task_manager`.
+
+    Jobs are stored so queued work survives restarts. Running jobs send a heartbeat, and a job whose
+    worker went away is queued again or failed once it missed its heartbeats. Jobs that are not
+    `retryable`, e.g. graph ingestion that commits batch by batch, are always failed then.
+    """
+    process_id = models.CharField(max_length=255, db_index=True)
+    user_id = models.CharField(max_length=255, db_index=True)
+    func = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kind = models.CharField(max_length=8, choices=JobKind.DJANGO_CHOICES, default=JobKind.IO)
+    priority = models.SmallIntegerField(default=JobPriority.NORMAL)
+
+    status = models.PositiveSmallIntegerField(
+        choices=ProcessStatus.DJANGO_CHOICES,
+        default=ProcessStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    retryable = models.BooleanField(default=True)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=255, null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "tasks_job"
+        indexes = [
+            models.Index(fields=["status", "kind", "-priority", "created_at"], name="tasks_job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.func}) for {self.process_id}"
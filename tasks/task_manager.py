@@ -1,11 +1,57 @@
-from concurrent.futures import ThreadPoolExecutor
+"""
+Persistent job queue for the background tasks.
+
+`submit_task` stores a job in the database; the worker pools of every server process claim queued jobs,
+highest priority first, and run them. IO-bound jobs (LLM and HTTP calls) and CPU-bound jobs (parsing,
+ingestion, matching) have separate pools, so neither kind can take all workers from the other, and a user
+has at most `JOB_MAX_RUNNING_PER_USER` jobs running at once, so one large import does not starve other users.
+Running jobs send heartbeats; jobs whose process died are queued again or failed, jobs submitted as not
+retryable are always failed, since running them again would repeat writes they already committed.
+
+A task is a function `func(task, *args)`; model instances among the arguments are stored by reference and
+loaded again when the job runs, all other arguments must be JSON serializable.
+"""
+
+import importlib
+import logging
+import os
+import socket
+import sys
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import close_old_connections, connection, models, transaction
+from django.db.models import Avg, Count, F, Min
+from django.utils import timezone
+
+from graphutils.config import (
+    JOB_IO_WORKERS,
+    JOB_CPU_WORKERS,
+    JOB_MAX_RUNNING_PER_USER,
+    JOB_POLL_INTERVAL,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_HEARTBEAT_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+)
+from tasks.models import Job, JobKind, JobPriority, ProcessStatus
 
-executor = ThreadPoolExecutor()
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# jobs running in this process by process id
 running_tasks = {}
+_running_lock = threading.Lock()
+_local = threading.local()
+
 
 class Task:
-    def __init__(self):
+    def __init__(self, job_id=None, process_id=None):
+        self.job_id = job_id
+        self.process_id = process_id
         self.cancelled = threading.Event()
 
     def cancel(self):
@@ -14,17 +60,283 @@ class Task:
     def is_cancelled(self):
         return self.cancelled.is_set()
 
-def submit_task(process_id, func, *args):
-    task = Task()
-    future = executor.submit(func, task, *args)
-    running_tasks[process_id] = (future, task)
-    return future
 
-def cancel_task(upload_id):
-    if upload_id in running_tasks:
-        future, task = running_tasks[upload_id]
-        task.cancel()
-        # Note: future.cancel() will not cancel a running task in ThreadPoolExecutor
-        del running_tasks[upload_id]
+def current_task():
+    """Return the task the calling thread works on, None outside of a job."""
+    return getattr(_local, "task", None)
+
+
+def _encode_args(args):
+    return [
+        {"__model__": arg._meta.label, "pk": arg.pk} if isinstance(arg, models.Model) else arg
+        for arg in args
+    ]
+
+
+def _decode_args(args):
+    return [
+        apps.get_model(arg["__model__"]).objects.get(pk=arg["pk"])
+        if isinstance(arg, dict) and "__model__" in arg else arg
+        for arg in args
+    ]
+
+
+def _resolve(path):
+    module, name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+class WorkerPool:
+    """
+    Threads that claim and run the queued jobs of one kind.
+
+    Attributes:
+        kind (str): The `JobKind` the pool runs.
+        size (int): Maximum number of jobs the pool runs at once.
+    """
+
+    def __init__(self, kind, size):
+        self.kind = kind
+        self.size = size
+        self.active = 0
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"jobs-{kind}")
+        self._wakeup = threading.Condition()
+        self._dispatcher = threading.Thread(target=self._dispatch, name=f"jobs-{kind}-dispatcher", daemon=True)
+
+    def start(self):
+        self._dispatcher.start()
+
+    def notify(self):
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _dispatch(self):
+        while True:
+            job = None
+            try:
+                if self.active < self.size:
+                    job = _claim(self.kind)
+            except Exception as e:
+                logger.exception(f"Claiming a {self.kind} job failed: {e}")
+            finally:
+                connection.close()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(JOB_POLL_INTERVAL)
+                continue
+            task = Task(job.pk, job.process_id)
+            with _running_lock:
+                running_tasks[job.process_id] = (job.pk, task)
+                self.active += 1
+            self._executor.submit(self._run, job, task)
+
+    def _run(self, job, task):
+        close_old_connections()
+        _local.task = task
+        status, error = ProcessStatus.COMPLETED, None
+        try:
+            func = _resolve(job.func)
+            func(task, *_decode_args(job.args))
+            if task.is_cancelled():
+                status = ProcessStatus.CANCELLED
+        except Exception as e:
+            import traceback
+
+            logger.exception(f"Job {job.pk} ({job.func}) failed: {e}", exc_info=True)
+            status, error = ProcessStatus.FAILED, traceback.format_exc()
+        finally:
+            _local.task = None
+            try:
+                Job.objects.filter(pk=job.pk).update(status=status, error_message=error, finished_at=timezone.now())
+            except Exception as e:
+                logger.exception(f"Could not finish job {job.pk}: {e}")
+            with _running_lock:
+                if running_tasks.get(job.process_id, (None,))[0] == job.pk:
+                    del running_tasks[job.process_id]
+                self.active -= 1
+            connection.close()
+            self.notify()
+
+
+def _claim(kind):
+    """
+    Marks the next job of `kind` as running in this process and returns it, None if there is none.
+
+    Jobs of users below their running limit are taken by priority, users with fewer running jobs first,
+    then in submission order. The limit is checked without a lock, concurrent claims of different
+    processes can exceed it by one job each.
+    """
+    with transaction.atomic():
+        running = dict(
+            Job.objects.filter(status=ProcessStatus.PROCESSING)
+            .values_list("user_id")
+            .annotate(count=Count("id"))
+        )
+        candidates = [
+            job for job in Job.objects.select_for_update(skip_locked=True)
+            .filter(status=ProcessStatus.PENDING, kind=kind)
+            .order_by("-priority", "created_at")[:100]
+            if running.get(job.user_id, 0) < JOB_MAX_RUNNING_PER_USER
+        ]
+        if not candidates:
+            return None
+        job = min(candidates, key=lambda job: (-job.priority, running.get(job.user_id, 0), job.created_at))
+        now = timezone.now()
+        job.status = ProcessStatus.PROCESSING
+        job.worker = WORKER_ID
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = now
+        job.save(update_fields=["status", "worker", "attempts", "started_at", "heartbeat_at"])
+        return job
+
+
+def _heartbeat():
+    """
+    Keeps the jobs of this process alive, forwards cancellations made by other processes and recovers
+    jobs whose process stopped sending heartbeats.
+    """
+    while True:
+        try:
+            close_old_connections()
+            with _running_lock:
+                tasks = {job_id: task for job_id, task in running_tasks.values()}
+            if tasks:
+                Job.objects.filter(pk__in=tasks).update(heartbeat_at=timezone.now())
+                for job_id in Job.objects.filter(pk__in=tasks, cancel_requested=True).values_list("pk", flat=True):
+                    tasks[job_id].cancel()
+            _recover_orphans()
+        except Exception as e:
+            logger.exception(f"Job heartbeat failed: {e}")
+        finally:
+            connection.close()
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+
+def _recover_orphans():
+    deadline = timezone.now() - timedelta(seconds=JOB_HEARTBEAT_TIMEOUT)
+    with transaction.atomic():
+        for job in Job.objects.select_for_update(skip_locked=True).filter(
+            status=ProcessStatus.PROCESSING, heartbeat_at__lt=deadline
+        ):
+            if job.retryable and job.attempts < JOB_MAX_ATTEMPTS and not job.cancel_requested:
+                logger.warning(f"Job {job.pk} of worker {job.worker} missed its heartbeats, queueing it again")
+                job.status, job.worker = ProcessStatus.PENDING, None
+                job.save(update_fields=["status", "worker"])
+                continue
+            logger.warning(f"Job {job.pk} of worker {job.worker} missed its heartbeats, giving up")
+            job.status = ProcessStatus.CANCELLED if job.cancel_requested else ProcessStatus.FAILED
+            job.error_message = "The worker running the job stopped."
+            job.finished_at = timezone.now()
+            job.save(update_fields=["status", "error_message", "finished_at"])
+            if job.status == ProcessStatus.FAILED:
+                _fail_processes(job)
+
+
+def _fail_processes(job):
+    for arg in job.args:
+        if isinstance(arg, dict) and "__model__" in arg:
+            apps.get_model(arg["__model__"]).objects.filter(pk=arg["pk"]).update(
+                status=ProcessStatus.FAILED, error_message=job.error_message
+            )
+
+
+_pools = {}
+_start_lock = threading.Lock()
+
+
+def start_workers():
+    """Starts the worker pools and the heartbeat of this process, once."""
+    if _pools:
+        return
+    with _start_lock:
+        if _pools:
+            return
+        pools = {JobKind.IO: WorkerPool(JobKind.IO, JOB_IO_WORKERS),
+                 JobKind.CPU: WorkerPool(JobKind.CPU, JOB_CPU_WORKERS)}
+        for pool in pools.values():
+            pool.start()
+        threading.Thread(target=_heartbeat, name="jobs-heartbeat", daemon=True).start()
+        _pools.update(pools)
+        logger.info(f"Job workers started on {WORKER_ID}")
+
+
+def should_start_on_boot():
+    """Management commands other than the (reloaded) development server do not run jobs."""
+    if os.path.basename(sys.argv[0]) != "manage.py":
         return True
-    return False
\ No newline at end of file
+    if sys.argv[1:2] != ["runserver"]:
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
+def submit_task(process_id, func, *args, kind=JobKind.IO, priority=JobPriority.NORMAL, retryable=True):
+    """
+    Queue `func(task, *args)` as a job.
+
+    Args:
+        process_id (str): The process the job works on, used for cancellation.
+        func: A module-level task function.
+        *args: The arguments after the task; model instances are passed by reference.
+        kind (str): The `JobKind`, selects the worker pool.
+        priority (int): Jobs with a higher priority are started first.
+        retryable (bool): Whether the job may run again after its worker died; False for jobs that are not
+            idempotent, like graph ingestion.
+
+    Returns:
+        Job: The queued job.
+    """
+    user_id = next((arg.user_id for arg in args if hasattr(arg, "user_id")), "")
+    job = Job.objects.create(
+        process_id=process_id,
+        user_id=user_id,
+        func=f"{func.__module__}.{func.__qualname__}",
+        args=_encode_args(args),
+        kind=kind,
+        priority=priority,
+        retryable=retryable,
+    )
+    start_workers()
+    _pools[kind].notify()
+    return job
+
+
+def cancel_task(upload_id):
+    """Cancels the queued and running jobs of a process, returns False if it has none."""
+    active = Job.objects.filter(process_id=upload_id, status__in=[ProcessStatus.PENDING, ProcessStatus.PROCESSING])
+    if not active.update(cancel_requested=True):
+        return False
+    active.filter(status=ProcessStatus.PENDING).update(status=ProcessStatus.CANCELLED, finished_at=timezone.now())
+    with _running_lock:
+        if upload_id in running_tasks:
+            # jobs of other processes see the request with their next heartbeat
+            running_tasks[upload_id][1].cancel()
+    return True
+
+
+def queue_stats():
+    """
+    Return the queue depth, running jobs and wait times of the job queue by kind, plus the per-user load.
+    """
+    now = timezone.now()
+    stats = {}
+    for kind, _ in JobKind.DJANGO_CHOICES:
+        jobs = Job.objects.filter(kind=kind)
+        queued = jobs.filter(status=ProcessStatus.PENDING).aggregate(count=Count("id"), oldest=Min("created_at"))
+        started = jobs.filter(started_at__gte=now - timedelta(hours=1)).aggregate(
+            wait=Avg(F("started_at") - F("created_at")))
+        stats[kind] = {
+            "queued": queued["count"],
+            "running": jobs.filter(status=ProcessStatus.PROCESSING).count(),
+            "longest_wait": (now - queued["oldest"]).total_seconds() if queued["oldest"] else 0,
+            "average_wait_last_hour": started["wait"].total_seconds() if started["wait"] else 0,
+        }
+    users = (
+        Job.objects.filter(status__in=[ProcessStatus.PENDING, ProcessStatus.PROCESSING])
+        .values("user_id", "status")
+        .annotate(count=Count("id"))
+    )
+    stats["users"] = {}
+    for row in users:
+        key = "queued" if row["status"] == ProcessStatus.PENDING else "running"
+        stats["users"].setdefault(row["user_id"], {"queued": 0, "running": 0})[key] = row["count"]
+    return stats
@@ -1,3 +1,87 @@
+from datetime import timedelta
+from unittest.mock import patch
+
 from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import Job, JobKind, JobPriority, ProcessStatus
+from tasks.task_manager import _claim, _decode_args, _encode_args, _recover_orphans
+
+
+class ArgumentsTest(TestCase):
+
+    def test_models_are_passed_by_reference(self):
+        job = Job.objects.create(process_id="p1", user_id="u1", func="tasks.tests.noop")
+        encoded = _encode_args([job, "text", 3])
+        self.assertEqual(encoded, [{"__model__": "tasks.Job", "pk": job.pk}, "text", 3])
+        self.assertEqual(_decode_args(encoded), [job, "text", 3])
+
+
+class ClaimTest(TestCase):
+
+    def create(self, user_id, priority=JobPriority.NORMAL, kind=JobKind.IO, status=ProcessStatus.PENDING):
+        return Job.objects.create(process_id=f"{user_id}-{Job.objects.count()}", user_id=user_id,
+                                  func="tasks.tests.noop", kind=kind, priority=priority, status=status)
+
+    def test_claims_by_priority(self):
+        self.create("u1")
+        high = self.create("u2", priority=JobPriority.HIGH)
+        claimed = _claim(JobKind.IO)
+        self.assertEqual(claimed.pk, high.pk)
+        high.refresh_from_db()
+        self.assertEqual((high.status, high.attempts), (ProcessStatus.PROCESSING, 1))
+
+    def test_claims_only_its_kind(self):
+        self.create("u1", kind=JobKind.CPU)
+        self.assertIsNone(_claim(JobKind.IO))
+
+    @patch("tasks.task_manager.JOB_MAX_RUNNING_PER_USER", 1)
+    def test_users_at_their_limit_wait(self):
+        self.create("u1", status=ProcessStatus.PROCESSING)
+        self.create("u1", priority=JobPriority.HIGH)
+        other = self.create("u2")
+        self.assertEqual(_claim(JobKind.IO).pk, other.pk)
+        self.assertIsNone(_claim(JobKind.IO))
+
+
+class RecoverOrphansTest(TestCase):
+
+    def orphan(self, **kwargs):
+        stale = timezone.now() - timedelta(days=1)
+        return Job.objects.create(process_id="p1", user_id="u1", func="tasks.tests.noop", attempts=1,
+                                  status=ProcessStatus.PROCESSING, worker="gone:1", heartbeat_at=stale, **kwargs)
+
+    def test_retryable_jobs_are_queued_again(self):
+        job = self.orphan()
+        _recover_orphans()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (ProcessStatus.PENDING, None))
+
+    def test_jobs_with_a_heartbeat_are_kept(self):
+        job = self.orphan()
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now())
+        _recover_orphans()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessStatus.PROCESSING)
+
+    def test_not_retryable_jobs_fail_with_their_processes(self):
+        process = Job.objects.create(process_id="p1", user_id="u1", func="tasks.tests.noop")
+        job = self.orphan(retryable=False, args=_encode_args([process]))
+        _recover_orphans()
+        job.refresh_from_db()
+        process.refresh_from_db()
+        self.assertEqual(job.status, ProcessStatus.FAILED)
+        self.assertEqual(process.status, ProcessStatus.FAILED)
+
+    @patch("tasks.task_manager.JOB_MAX_ATTEMPTS", 1)
+    def test_jobs_out_of_attempts_fail(self):
+        job = self.orphan()
+        _recover_orphans()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessStatus.FAILED)
 
-# Create your tests here.
+    def test_cancelled_jobs_are_cancelled(self):
+        job = self.orphan(cancel_requested=True)
+        _recover_orphans()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessStatus.CANCELLED)
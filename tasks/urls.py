@@ -0,0 +1,7 @@
+from django.urls import path
+
+from tasks.views import JobQueueView
+
+urlpatterns = [
+    path('api/tasks/queue', JobQueueView.as_view(), name='job-queue'),
+]
@@ -1,3 +1,29 @@
-from django.shortcuts import render
+import logging
 
-# Create your views here.
+from django.db import connection, close_old_connections
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from tasks.models import ProcessStatus
+from tasks.task_manager import queue_stats
+
+logger = logging.getLogger(__name__)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class JobQueueView(APIView):
+    def get(self, request):
+        close_old_connections()
+        try:
+            return Response(queue_stats(), status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.exception("Exception occurred while reading the job queue: %s", e, exc_info=True)
+            return Response(
+                {"status": ProcessStatus.FAILED, "message": "Internal server error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        finally:
+            connection.close()